@@ -1,46 +1,145 @@
-"""LLM enrichment: summary, key ideas, takeaways, quotes, wikilinks. Greek → English. Supports OpenAI or Gemini."""
+"""
+LLM enrichment: summary, key ideas, takeaways, quotes, wikilinks. Greek → English (or any OUTPUT_LANGUAGE, and
+several at once), plus optional extra sections. Supports OpenAI or Gemini.
+"""
+import asyncio
 import json
 import os
 import re
+import statistics
 import time
 from pathlib import Path
+from typing import Callable
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from utils import corpus
+from utils.chunking import chunk_transcript, estimate_tokens
+from utils.deps import digest, plan_stage, source_hash
+from utils.llm_batch import get_batch_backend, run_batch
+from utils.llm_cache import LLMCache, cache_key, open_llm_cache
+from utils.llm_providers import LLMProvider, get_provider
+from utils.llm_usage import BATCH_PRICE_FACTOR, Budget, BudgetExhausted, cost_usd, estimate_job, get_run_usage
 from utils.logger import setup_logger, log_failure
+from utils.near_dup import get_near_dup_index
+from utils.rate_limit import AIMDConcurrency
+from utils.run_stats import append_stat, get_run_stats, increment_stat, record_stats
+from utils.state_store import get_state_store, record_status
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-TRANSCRIPTS_DIR = DATA_DIR / "transcripts"
 ENRICHED_DIR = DATA_DIR / "enriched"
 MANIFEST_PATH = DATA_DIR / "manifest.json"
 
-PROMPT_TEMPLATE = '''The following is a transcript from a Greek YouTube video titled: "{title}"
-The transcript is in Greek. Please respond entirely in English.
+# Prompts are laid out for provider prefix caching (OpenAI and Gemini bill a repeated prompt prefix at a
+# discount): the instructions and the transcript come first, and only the short request at the end
+# (REQUEST_TEMPLATE) differs between the outputs of one video, so every output after the first re-sends a
+# prefix the provider already holds.
+PROMPT_TEMPLATE = '''You write study notes for an Obsidian vault from transcripts of Greek YouTube videos.
+The transcript is in Greek. Answer only with the "## " sections requested after the transcript.
 
-## Summary
-Write 3-5 sentences capturing the core message.
+Video title: "{title}"
 
-## Key Ideas
-List the 5-8 most important concepts or arguments. Each item 1-2 sentences.
-
-## Takeaways & Action Items
-List 3-5 practical things to remember or do.
+TRANSCRIPT:
+{transcript}
+'''
 
-## Notable Quotes
-Extract 2-4 important moments from the transcript (translate to English).
+# Map step of chunked enrichment: the same notes, scoped to one window of a long transcript.
+MAP_PROMPT_TEMPLATE = '''You write study notes for an Obsidian vault from transcripts of Greek YouTube videos.
+The transcript is in Greek. Answer only with the "## " sections requested after the transcript.
 
-## Related Concepts
-List 8-12 concepts as [[wikilinks]] that could connect to other Obsidian notes.
+Video title: "{title}"
+This is part {part} of {parts} of the transcript. Cover only what is said in this part.
 
-TRANSCRIPT:
+TRANSCRIPT PART {part}/{parts}:
 {transcript}
 '''
 
-# Max chars per transcript (only used for small-context models like gpt-3.5-turbo; gpt-4o-mini 128k can take full)
+# Reduce step: merge per-part notes back into the single-video schema (gemini_sections).
+REDUCE_PROMPT_TEMPLATE = '''You write study notes for an Obsidian vault from transcripts of Greek YouTube videos.
+Below are notes on consecutive parts of one video. Merge them into notes for the whole video, removing
+repetition. Answer only with the "## " sections requested after the notes.
+
+Video title: "{title}"
+
+PART NOTES:
+{part_notes}
+'''
+
+# The variable suffix: output language and the sections wanted. Headings stay in English whatever the
+# language, so parse_llm_response and everything reading gemini_sections see the same keys.
+REQUEST_TEMPLATE = '''
+---
+Respond entirely in {language}. Write exactly these sections, with the headings as given:
+
+{sections}
+'''
+
+SECTIONS = {
+    "Summary": "Write 3-5 sentences capturing the core message.",
+    "Key Ideas": "List the 5-8 most important concepts or arguments. Each item 1-2 sentences.",
+    "Takeaways & Action Items": "List 3-5 practical things to remember or do.",
+    "Notable Quotes": "Extract 2-4 important moments from the transcript (translate to {language}).",
+    "Related Concepts": "List 8-12 concepts as [[wikilinks]] that could connect to other Obsidian notes.",
+}
+MAP_SECTIONS = {
+    "Summary": "Write 2-3 sentences capturing what this part covers.",
+    "Key Ideas": "List the most important concepts or arguments in this part. Each item 1-2 sentences.",
+    "Takeaways & Action Items": "List practical things to remember or do from this part.",
+    "Notable Quotes": "Extract 1-2 important moments from this part (translate to {language}).",
+    "Related Concepts": "List up to 8 concepts as [[wikilinks]] that could connect to other Obsidian notes.",
+}
+REDUCE_SECTIONS = {**SECTIONS, "Notable Quotes": "Keep the 2-4 most important quotes from the part notes."}
+# Further languages (OUTPUT_LANGUAGE=english,greek) repeat the notes without wikilinks: the concept notes
+# are built from the first language's Related Concepts only.
+TRANSLATED_SECTIONS = {k: v for k, v in SECTIONS.items() if k != "Related Concepts"}
+# Optional sections (ENRICHMENT_EXTRA_SECTIONS=glossary,questions), requested in a separate call on the
+# same cached prefix, so turning one on does not change (or re-bill) the main notes' prompt.
+EXTRA_SECTIONS = {
+    "glossary": (
+        "Glossary", "List 5-10 key Greek terms from the video, each with a short explanation in {language}."
+    ),
+    "questions": (
+        "Review Questions", "Write 3-5 questions that test understanding of the video, each with a short answer."
+    ),
+    "outline": ("Outline", "List the topics in the order the video covers them, one line each."),
+}
+
+# Appended to a prompt whose streamed answer was cut off: the model picks up after the checkpointed sections.
+CONTINUE_TEMPLATE = '''
+YOUR ANSWER SO FAR (cut off after its last complete section):
+
+{partial}
+
+---
+Continue the answer with exactly these remaining sections, with the headings as given:
+
+{sections}
+'''
+
+# Max chars per transcript when chunking is off (only for small-context models like gpt-3.5-turbo)
 MAX_TRANSCRIPT_CHARS = 50_000
 
+# Transcript tokens per map chunk; the longest matching model-name prefix wins.
+# ENRICHMENT_CHUNK_TOKENS overrides for every model.
+CHUNK_TOKENS_BY_MODEL = {
+    "gpt-3.5": 10_000,
+    "gpt-4o": 30_000,
+    "gpt-4.1": 60_000,
+    "gemini": 100_000,
+}
+DEFAULT_CHUNK_TOKENS = 30_000
+
+MAX_RETRIES = 4
+DEFAULT_RATE_LIMIT_WAIT = 60  # seconds, when the provider gives no Retry-After / "retry in Xs" hint
+TRANSIENT_RETRY_BACKOFF = 2  # seconds before retrying a timeout, dropped connection or 5xx; doubles each retry
+MAX_RATE_LIMIT_WAIT = 300
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_NEAR_DUP_THRESHOLD = 0.8  # estimated Jaccard similarity of word 5-gram shingles
+# Order of the pending queue: a budget (--budget-usd / --max-tokens) covers a prefix of it.
+QUEUE_ORDERS = ("playlist", "shortest", "newest")
+
 
 def parse_llm_response(text: str) -> dict:
     """Parse Gemini markdown response into sections."""
@@ -55,53 +154,997 @@ def parse_llm_response(text: str) -> dict:
     return {k: "\n".join(v) for k, v in sections.items()}
 
 
-def _call_openai(prompt: str, model: str) -> str:
-    from openai import OpenAI
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    r = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
+class _SectionStream:
+    """
+    parse_llm_response for a response that is still arriving: a "## " section is complete once the next
+    heading starts, or the stream ends. `done` is the text of the complete sections so far.
+    """
+
+    def __init__(self, done: str = ""):
+        self.done = done.strip()
+        self._buffer = ""
+
+    def _complete(self, section: str) -> str | None:
+        section = section.strip()
+        if not section.startswith("## "):
+            return None  # anything before the first heading is dropped, as parse_llm_response does
+        self.done = f"{self.done}\n\n{section}".strip()
+        return section.split("\n", 1)[0][3:].strip()
+
+    def feed(self, delta: str) -> list[str]:
+        """Add streamed text; returns the headings of the sections it completed."""
+        self._buffer += delta
+        completed = []
+        while (match := re.search(r"\n## ", self._buffer)) is not None:
+            heading = self._complete(self._buffer[:match.start()])
+            self._buffer = self._buffer[match.start() + 1:]
+            if heading is not None:
+                completed.append(heading)
+        return completed
+
+    def finish(self) -> list[str]:
+        """End of stream: the section in progress is complete."""
+        heading = self._complete(self._buffer)
+        self._buffer = ""
+        return [heading] if heading is not None else []
+
+
+def _continuation_prompt(prompt: str, partial: str) -> str | None:
+    """
+    `prompt` plus CONTINUE_TEMPLATE asking only for the sections its request names that `partial` lacks
+    (None if there are none). The original prompt stays in front, so the provider's prefix cache still applies.
+    """
+    requested = parse_llm_response(prompt.rsplit("\n---\n", 1)[-1])
+    written = parse_llm_response(partial)
+    remaining = "\n\n".join(f"## {h}\n{text}" for h, text in requested.items() if h not in written)
+    if not remaining:
+        return None
+    return prompt + CONTINUE_TEMPLATE.format(partial=partial, sections=remaining)
+
+
+def _streaming_enabled() -> bool:
+    """ENRICHMENT_STREAMING=on: stream responses, checkpointing each complete section."""
+    return os.environ.get("ENRICHMENT_STREAMING", "off").strip().lower() in ("1", "on", "true", "yes")
+
+
+def _languages() -> list[str]:
+    """Output languages from OUTPUT_LANGUAGE (comma-separated, default english); the first fills gemini_sections."""
+    raw = os.environ.get("OUTPUT_LANGUAGE", "english")
+    languages = [part.strip().capitalize() for part in raw.split(",") if part.strip()]
+    return list(dict.fromkeys(languages)) or ["English"]
+
+
+def _extra_sections() -> dict[str, str]:
+    """{heading: instruction} of the sections named in ENRICHMENT_EXTRA_SECTIONS (see EXTRA_SECTIONS)."""
+    names = [n.strip().lower() for n in os.environ.get("ENRICHMENT_EXTRA_SECTIONS", "").split(",") if n.strip()]
+    unknown = [n for n in names if n not in EXTRA_SECTIONS]
+    if unknown:
+        raise ValueError(
+            f"Unknown ENRICHMENT_EXTRA_SECTIONS {', '.join(unknown)}; choose from: {', '.join(EXTRA_SECTIONS)}"
+        )
+    return dict(EXTRA_SECTIONS[n] for n in dict.fromkeys(names))
+
+
+def _request(language: str, sections: dict[str, str]) -> str:
+    """The variable end of a prompt: which sections to write, in which language."""
+    body = "\n\n".join(f"## {heading}\n{text.format(language=language)}" for heading, text in sections.items())
+    return REQUEST_TEMPLATE.format(language=language, sections=body)
+
+
+def _output_requests() -> list[tuple[str, str, str]]:
+    """
+    [(kind, language, request)] of the outputs a video gets after its main notes, each sent as the main
+    notes' prefix plus this request: "sections" (the extra sections) and one "translation" per further language.
+    """
+    languages = _languages()
+    requests = []
+    extra = _extra_sections()
+    if extra:
+        requests.append(("sections", languages[0], _request(languages[0], extra)))
+    for language in languages[1:]:
+        requests.append(("translation", language, _request(language, TRANSLATED_SECTIONS)))
+    return requests
+
+
+def _is_rate_limit_error(err: Exception) -> bool:
+    err_str = str(err)
+    return (
+        "429" in err_str or "RESOURCE_EXHAUSTED" in err_str
+        or "quota" in err_str.lower()
+        or "rate_limit" in err_str.lower()
+        or getattr(err, "status_code", None) == 429
+        or getattr(err, "code", None) == 429
     )
-    return (r.choices[0].message.content or "").strip()
 
 
-def _call_gemini(prompt: str, client, model_name: str) -> str:
-    response = client.models.generate_content(model=model_name, contents=prompt)
-    text = getattr(response, "text", None) or ""
-    if not text and getattr(response, "candidates", None):
-        c = response.candidates[0]
-        if getattr(c, "content", None) and c.content.parts:
-            text = getattr(c.content.parts[0], "text", None) or ""
-    return text.strip()
+# Exception class names (any class in the MRO) of timeouts and dropped connections in httpx, openai and
+# google-genai, plus the builtins.
+_TRANSIENT_ERROR_NAMES = ("Timeout", "Connect", "Connection", "NetworkError", "RemoteProtocolError", "ServerError")
+
 
+def _is_transient_error(err: Exception) -> bool:
+    """A timeout, dropped connection or 5xx: worth retrying (a stream resumes from its last checkpoint)."""
+    if isinstance(err, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(err, "status_code", None) or getattr(err, "code", None)
+    if status is None:
+        status = getattr(getattr(err, "response", None), "status_code", None)
+    if isinstance(status, int) and 500 <= status < 600:
+        return True
+    return any(marker in cls.__name__ for cls in type(err).__mro__ for marker in _TRANSIENT_ERROR_NAMES)
+
+
+def _retry_after_seconds(err: Exception) -> float | None:
+    """Server back-off hint: Retry-After / retry-after-ms headers, or "retry in Xs" / retryDelay in the message."""
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    err_str = str(err)
+    match = re.search(r"retry in (\d+(?:\.\d+)?)\s*s", err_str, re.I) or re.search(
+        r"retryDelay['\"]?\s*:\s*['\"](\d+(?:\.\d+)?)s", err_str
+    )
+    if match:
+        return float(match.group(1))
+    return None
 
-def run_gemini_agent(manifest: dict | None = None, resume: bool = False) -> dict:
+
+def _chunk_tokens_for_model(model_name: str) -> int:
+    override = os.environ.get("ENRICHMENT_CHUNK_TOKENS", "").strip()
+    if override:
+        return int(override)
+    matches = [prefix for prefix in CHUNK_TOKENS_BY_MODEL if model_name.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CHUNK_TOKENS
+    return CHUNK_TOKENS_BY_MODEL[max(matches, key=len)]
+
+
+class _Engine:
     """
-    Enrich each transcript with an LLM (OpenAI or Gemini). Save to data/enriched/{video_id}.json.
-    If OPENAI_API_KEY is set, uses OpenAI; else uses GEMINI_API_KEY. If resume=True, skips already-enriched videos.
+    One enrichment run's shared machinery: the LLM provider, the AIMD limiter and the response cache.
+    With streaming, responses are read as they are generated and checkpointed section by section into
+    the state store (independently of the response cache, which LLM_CACHE=off disables).
     """
-    logger = setup_logger()
-    openai_key = os.environ.get("OPENAI_API_KEY", "").strip()
-    gemini_key = os.environ.get("GEMINI_API_KEY", "").strip()
-    # Prefer OpenAI (default); fall back to Gemini if no OpenAI key.
-    if openai_key:
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        limiter: AIMDConcurrency,
+        cache: LLMCache | None,
+        logger,
+        recipe_hash: str | None = None,
+        budget: Budget | None = None,
+        streaming: bool = False,
+    ):
+        self.provider = provider
+        self.limiter = limiter
+        self.cache = cache
+        self.logger = logger
+        self.recipe_hash = recipe_hash
+        self.budget = budget
+        self.streaming = streaming
+
+    async def _stream(
+        self, prompt: str, video_id: str, on_section: Callable[[], None] | None
+    ) -> tuple[str, tuple[int, int, int] | None, str]:
+        """
+        Stream the response to `prompt`, checkpointing it into the state store each time a section completes.
+        If an earlier attempt (or run) was cut off, only the missing sections are asked for, with a
+        continuation prompt. Returns (whole response, usage of this call, prompt actually sent).
+        A stream that fails is charged to the video and the budget at the local estimate of what it
+        sent and received, since the provider's usage never arrives.
+        """
+        store = get_state_store()
+        key = cache_key(self.provider.name, self.provider.model, prompt)
+        partial = store.get_partial(key)
+        sent = prompt
+        if partial:
+            sent = _continuation_prompt(prompt, partial)
+            if sent is None:
+                return partial, (0, 0, 0), prompt
+            increment_stat("enrichment", "stream_resumed_calls")
+        sections = _SectionStream(partial or "")
+        received = []
+
+        def on_delta(delta: str) -> None:
+            received.append(delta)
+            if sections.feed(delta):
+                store.put_partial(key, sections.done)
+                if on_section:
+                    on_section()
+
         try:
-            import openai  # noqa: F401
-        except ImportError:
-            raise ImportError("OpenAI is set but the 'openai' package is missing. Run: pip install openai")
-        provider = "openai"
-        model_name = os.environ.get("OPENAI_MODEL", "gpt-4o-mini").strip()
-        llm_client = None
-    elif gemini_key:
-        provider = "gemini"
-        from google import genai
-        llm_client = genai.Client(api_key=gemini_key)
-        model_name = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash").strip()
+            text, usage = await self.provider.astream(sent, on_delta)
+        except Exception as e:
+            if received or not _is_rate_limit_error(e):  # a request refused with a 429 is not billed
+                _record_usage(video_id, self.provider.model, sent, "".join(received), None, self.budget)
+            raise
+        if sections.finish() and on_section:
+            on_section()
+        return sections.done or text, usage, sent
+
+    async def complete(self, prompt: str, video_id: str, on_section: Callable[[], None] | None = None) -> str:
+        """
+        Return the model's response to `prompt`, from the cache if possible, otherwise via the API
+        under the AIMD limiter. Rate limits, timeouts, dropped connections and 5xx errors are retried (a
+        stream continues from its last complete section). Raises the provider error on failure, and
+        BudgetExhausted instead of calling the API once the run's budget is spent. With streaming,
+        `on_section` is called whenever a "## " section of the response is complete.
+        """
+        if self.cache:
+            cached = self.cache.get(self.provider.name, self.provider.model, prompt)
+            if cached is not None:
+                return cached
+        for attempt in range(MAX_RETRIES):
+            if self.budget is not None and self.budget.exhausted():
+                raise BudgetExhausted("LLM budget exhausted")
+            await self.limiter.acquire()
+            sent = prompt
+            try:
+                if self.streaming:
+                    text, usage, sent = await self._stream(prompt, video_id, on_section)
+                else:
+                    text, usage = await self.provider.acomplete(prompt)
+            except Exception as e:
+                if _is_rate_limit_error(e) and attempt < MAX_RETRIES - 1:
+                    hint = _retry_after_seconds(e)
+                    wait_s = min(MAX_RATE_LIMIT_WAIT, hint if hint is not None else DEFAULT_RATE_LIMIT_WAIT)
+                    await self.limiter.release(rate_limited=True, retry_after=wait_s)
+                    increment_stat("enrichment", "rate_limit_hits")
+                    self.logger.warning(
+                        "%s rate limit for %s, pausing %.0fs, concurrency now %d (retry %s/%s)",
+                        self.provider.name, video_id, wait_s, int(self.limiter.limit), attempt + 1, MAX_RETRIES - 1,
+                    )
+                    continue
+                await self.limiter.release(success=False)
+                if _is_transient_error(e) and attempt < MAX_RETRIES - 1:
+                    wait_s = TRANSIENT_RETRY_BACKOFF * 2 ** attempt
+                    increment_stat("enrichment", "transient_retries")
+                    self.logger.warning(
+                        "%s call for %s failed (%s), retrying in %.0fs%s (retry %s/%s)",
+                        self.provider.name, video_id, str(e) or type(e).__name__, wait_s,
+                        " from the last complete section" if self.streaming else "", attempt + 1, MAX_RETRIES - 1,
+                    )
+                    await asyncio.sleep(wait_s)
+                    continue
+                raise
+            await self.limiter.release()
+            increment_stat("enrichment", "llm_requests")
+            _record_usage(video_id, self.provider.model, sent, text, usage, self.budget)
+            if self.cache and text:
+                self.cache.put(self.provider.name, self.provider.model, prompt, text)
+            if self.streaming:
+                get_state_store().drop_partial(cache_key(self.provider.name, self.provider.model, prompt))
+            return text
+        return ""
+
+
+def _record_usage(
+    video_id: str,
+    model_name: str,
+    prompt: str,
+    text: str,
+    usage: tuple[int, int, int] | None,
+    budget: Budget | None = None,
+    price_factor: float = 1.0,
+) -> None:
+    """
+    Account one LLM call's tokens and cost to its video (state store), the run (report) and the budget.
+    When the provider reported no usage, the local estimate stands in for it.
+    """
+    if usage is None:
+        usage = (estimate_tokens(prompt), estimate_tokens(text), 0)
+        increment_stat("enrichment", "usage_estimated_calls")
+    prompt_tokens, completion_tokens, cached_tokens = usage
+    cost = cost_usd(model_name, prompt_tokens, completion_tokens, cached_tokens)
+    if cost is not None:
+        cost *= price_factor
+    get_run_usage().add(video_id, prompt_tokens, completion_tokens, cached_tokens, cost)
+    get_state_store().add_usage(video_id, "enrichment", prompt_tokens, completion_tokens, cost, cached_tokens)
+    if budget is not None:
+        budget.charge(estimate_tokens(prompt), prompt_tokens, completion_tokens, cost)
+
+
+def _record_usage_stats(budget: Budget | None) -> None:
+    """Run totals (tokens, prefix-cache hits, cost) and the budget outcome into the enrichment stage stats."""
+    totals = get_run_usage().totals()
+    record_stats(
+        "enrichment",
+        prompt_tokens=totals["prompt_tokens"],
+        completion_tokens=totals["completion_tokens"],
+        cached_tokens=totals["cached_tokens"],
+        cached_ratio=totals["cached_ratio"],
+        cost_usd=totals["cost_usd"],
+    )
+    if budget is not None:
+        record_stats("enrichment", **budget.stats())
+    first_sections = [seconds for _, seconds in get_run_stats().get("enrichment", {}).get("first_section_seconds", [])]
+    if first_sections:
+        record_stats(
+            "enrichment",
+            time_to_first_section_p50=round(statistics.median(first_sections), 2),
+            time_to_first_section_max=round(max(first_sections), 2),
+        )
+
+
+def _record_first_section(video_id: str, seconds: float) -> None:
+    """Seconds from the start of a video's enrichment until the first section of its notes was complete."""
+    append_stat("enrichment", "first_section_seconds", [video_id, round(seconds, 2)])
+
+
+async def _gather_all(*aws) -> list[str]:
+    """Await concurrently; raise the first failure only after every call has finished (and been cached)."""
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def _map_prompts(title: str, chunks: list[str]) -> list[str]:
+    language = _languages()[0]
+    return [
+        MAP_PROMPT_TEMPLATE.format(part=i, parts=len(chunks), title=title, transcript=chunk)
+        + _request(language, MAP_SECTIONS)
+        for i, chunk in enumerate(chunks, 1)
+    ]
+
+
+def _main_request(n_chunks: int) -> str:
+    """Request for a video's main notes: straight from the transcript, or merged from part notes."""
+    return _request(_languages()[0], SECTIONS if n_chunks == 1 else REDUCE_SECTIONS)
+
+
+async def _enrich_outputs(
+    prefix: str, n_chunks: int, engine: _Engine, video_id: str, on_section: Callable[[], None] | None = None
+) -> tuple[str, list]:
+    """
+    The main notes, then every further output on the same prefix: (main text, [(kind, language, text)]).
+    The main call goes first so the provider has cached the prefix by the time the others arrive.
+    """
+    text = await engine.complete(prefix + _main_request(n_chunks), video_id, on_section)
+    if not text:
+        return text, []
+    requests = _output_requests()
+    texts = await _gather_all(*(engine.complete(prefix + request, video_id) for _, _, request in requests))
+    return text, [(kind, language, out) for (kind, language, _), out in zip(requests, texts)]
+
+
+def _reduce_prompt(title: str, part_texts: list[str]) -> str:
+    """The reduce step's prefix (without its request): the part notes, merged under one header."""
+    # Demote the part headings so the reduce prompt's own "## " sections stay unambiguous.
+    part_notes = "\n\n".join(
+        f"### Part {i}\n" + re.sub(r"^## ", "#### ", text, flags=re.M) for i, text in enumerate(part_texts, 1)
+    )
+    return REDUCE_PROMPT_TEMPLATE.format(title=title, part_notes=part_notes)
+
+
+def _write_enriched(
+    v: dict,
+    data: dict,
+    text: str,
+    n_chunks: int,
+    logger,
+    recipe_hash: str | None = None,
+    sections: dict | None = None,
+    duplicate_of: dict | None = None,
+    outputs: list[tuple[str, str, str]] | None = None,
+    translations: dict | None = None,
+) -> None:
+    """
+    Parse an LLM response into sections and save data/enriched/{video_id}.json; updates the manifest entry
+    and records the transcript hash and recipe it was built from. The transcript itself is not copied:
+    `transcript_ref` points at it (see utils.corpus.load_transcript). `outputs` are the further responses
+    (see _output_requests): extra sections join gemini_sections, other languages go under `translations`.
+    `sections` and `translations` (with `duplicate_of`) are reused from a near-duplicate video instead.
+    """
+    video_id = v.get("id")
+    if sections is None:
+        sections = parse_llm_response(text)
+    translations = dict(translations or {})
+    for kind, language, output in outputs or []:
+        if kind == "translation":
+            translations[language] = parse_llm_response(output)
+        else:
+            sections = {**sections, **parse_llm_response(output)}
+    llm_notes = "\n\n".join(f"## {k}\n{v}" for k, v in sections.items() if v)
+    for language, translated in translations.items():
+        llm_notes += f"\n\n## In {language}\n\n" + "\n\n".join(f"### {k}\n{v}" for k, v in translated.items() if v)
+
+    out = {k: val for k, val in data.items() if k not in ("transcript", "segments")}
+    out["transcript_ref"] = str(v.get("transcript_path") or corpus.transcript_path(video_id))
+    out["gemini_sections"] = sections
+    out["gemini_notes"] = llm_notes
+    if translations:
+        out["translations"] = translations
+    if n_chunks > 1:
+        out["enrichment_chunks"] = n_chunks
+    if duplicate_of:
+        out["duplicate_of"] = duplicate_of
+    try:
+        enriched_path, output_hash = corpus.save_enriched(video_id, out)
+        transcript_row = get_state_store().get_status(video_id, "transcripts") or {}
+        record_status(
+            v, "enrichment", "ok",
+            input_hash=transcript_row.get("output_hash"),
+            output_hash=output_hash,
+            recipe_hash=recipe_hash,
+            output_path=str(enriched_path),
+        )
+    except Exception as e:
+        log_failure(logger, video_id, str(e))
+        record_status(v, "enrichment", "failed", str(e))
+
+
+async def _enrich_video(v: dict, data: dict, chunks: list[str], engine: _Engine, logger) -> None:
+    """
+    Enrich one video (single prompt, or map-reduce over several chunks: each chunk concurrently, then one
+    reduce call over the part notes) and write the enriched JSON. Every response is cached, so a retry after
+    one failed call only re-sends that call.
+    """
+    video_id = v.get("id")
+    title = data.get("title", "Unknown")
+    get_state_store().begin(video_id, "enrichment")
+    started = time.monotonic()
+    first_section = []
+
+    def on_section() -> None:
+        if not first_section:
+            first_section.append(time.monotonic() - started)
+
+    try:
+        if len(chunks) == 1:
+            prefix = PROMPT_TEMPLATE.format(title=title, transcript=chunks[0])
+        else:
+            parts = await _gather_all(*(engine.complete(p, video_id) for p in _map_prompts(title, chunks)))
+            prefix = _reduce_prompt(title, parts)
+        text, outputs = await _enrich_outputs(prefix, len(chunks), engine, video_id, on_section)
+    except Exception as e:
+        err_str = str(e)
+        log_failure(logger, video_id, err_str)
+        record_status(v, "enrichment", "failed", err_str[:200])
+        return
+    if first_section:
+        _record_first_section(video_id, first_section[0])
+    if text:
+        _write_enriched(v, data, text, len(chunks), logger, engine.recipe_hash, outputs=outputs)
+
+
+def _batch_with_cache(
+    prompts: dict[str, str],
+    label: str,
+    provider: str,
+    model_name: str,
+    cache: LLMCache | None,
+    logger,
+    budget: Budget | None = None,
+) -> dict[str, str | None]:
+    """Answer cached prompts locally and send only the rest as one batch job; new answers go into the cache."""
+    answers: dict[str, str | None] = {}
+    pending = {}
+    for custom_id, prompt in prompts.items():
+        cached = cache.get(provider, model_name, prompt) if cache else None
+        if cached is not None:
+            answers[custom_id] = cached
+        else:
+            pending[custom_id] = prompt
+    if not pending:
+        return answers
+    poll_seconds = float(os.environ.get("BATCH_POLL_SECONDS", "60"))
+    usage = {}
+    results = run_batch(get_batch_backend(), pending, model_name, label, poll_seconds, logger, usage)
+    increment_stat("enrichment", "batch_requests", len(pending))
+    for custom_id, prompt in pending.items():
+        text = results.get(custom_id)
+        answers[custom_id] = text
+        if text:
+            video_id = custom_id.split("#")[0]
+            _record_usage(video_id, model_name, prompt, text, usage.get(custom_id), budget, BATCH_PRICE_FACTOR)
+        if cache and text:
+            cache.put(provider, model_name, prompt, text)
+    return answers
+
+
+def _enrich_in_batches(
+    jobs: list,
+    provider: str,
+    model_name: str,
+    cache: LLMCache | None,
+    logger,
+    recipe_hash: str | None = None,
+    budget: Budget | None = None,
+) -> None:
+    """
+    Offline path: every pending prompt goes into one batch job (round 1: whole videos and map chunks;
+    round 2: reduce prompts for chunked videos; round 3: further outputs on each video's prefix),
+    then results fan back out to data/enriched/.
+    """
+    round1, prefixes = {}, {}
+    for v, data, chunks in jobs:
+        video_id, title = v["id"], data.get("title", "Unknown")
+        if len(chunks) == 1:
+            prefixes[video_id] = PROMPT_TEMPLATE.format(title=title, transcript=chunks[0])
+            round1[video_id] = prefixes[video_id] + _main_request(1)
+        else:
+            for i, prompt in enumerate(_map_prompts(title, chunks), 1):
+                round1[f"{video_id}#part{i}"] = prompt
+    answers = _batch_with_cache(round1, "enrichment_map", provider, model_name, cache, logger, budget)
+
+    round2 = {}
+    for v, data, chunks in jobs:
+        if len(chunks) == 1:
+            continue
+        parts = [answers.get(f"{v['id']}#part{i}") for i in range(1, len(chunks) + 1)]
+        if all(parts):
+            prefixes[v["id"]] = _reduce_prompt(data.get("title", "Unknown"), parts)
+            round2[v["id"]] = prefixes[v["id"]] + _main_request(len(chunks))
+    if round2:
+        answers.update(_batch_with_cache(round2, "enrichment_reduce", provider, model_name, cache, logger, budget))
+
+    requests = _output_requests()
+    round3 = {
+        f"{video_id}#out{j}": prefix + request
+        for video_id, prefix in prefixes.items() if answers.get(video_id)
+        for j, (_, _, request) in enumerate(requests)
+    }
+    if round3:
+        answers.update(_batch_with_cache(round3, "enrichment_outputs", provider, model_name, cache, logger, budget))
+
+    for v, data, chunks in jobs:
+        text = answers.get(v["id"])
+        outputs = [
+            (kind, language, answers.get(f"{v['id']}#out{j}")) for j, (kind, language, _) in enumerate(requests)
+        ]
+        if text and all(out for _, _, out in outputs):
+            _write_enriched(v, data, text, len(chunks), logger, recipe_hash, outputs=outputs)
+        else:
+            log_failure(logger, v["id"], "batch request failed")
+            record_status(v, "enrichment", "failed", "batch_failed")
+
+
+def enrichment_recipe(provider: str, model_name: str) -> str:
+    """
+    Hash of everything besides the transcript that shapes an enriched JSON: prompts, output languages and
+    extra sections, model, chunking.
+    """
+    return digest(
+        provider,
+        model_name,
+        PROMPT_TEMPLATE,
+        MAP_PROMPT_TEMPLATE,
+        REDUCE_PROMPT_TEMPLATE,
+        REQUEST_TEMPLATE,
+        json.dumps([SECTIONS, MAP_SECTIONS, REDUCE_SECTIONS, TRANSLATED_SECTIONS], sort_keys=True),
+        _languages(),
+        _extra_sections(),
+        *_chunk_settings(model_name),
+        MAX_TRANSCRIPT_CHARS,
+        source_hash(parse_llm_response),
+        source_hash(_reduce_prompt),
+    )
+
+
+def _engine_settings(provider: str, concurrency: int | None) -> tuple[int, int, float]:
+    """(starting concurrency, max concurrency, min seconds between request starts) for a provider."""
+    # OpenAI paid tier needs no spacing; Gemini free tier still wants requests spread out (~10 RPM).
+    min_interval = float(os.environ.get("API_DELAY_SECONDS", "6" if provider == "gemini" else "0"))
+    if concurrency is None:
+        concurrency = int(os.environ.get("ENRICHMENT_CONCURRENCY", "1" if provider == "gemini" else "4"))
+    max_concurrency = int(os.environ.get("ENRICHMENT_MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY)))
+    return concurrency, max_concurrency, min_interval
+
+
+def _chunk_settings(model_name: str) -> tuple[str, int]:
+    # Long transcripts are map-reduced over sentence-aligned chunks instead of sent whole or truncated.
+    # ENRICHMENT_CHUNKING: auto (only when over the model's chunk budget), on (always), off (legacy).
+    chunking = os.environ.get("ENRICHMENT_CHUNKING", "auto").strip().lower()
+    return chunking, _chunk_tokens_for_model(model_name)
+
+
+def _prepare_job(v: dict, model_name: str, chunking: str, chunk_tokens: int, logger) -> tuple[dict, list[str]] | None:
+    """
+    Read a video's transcript and split it into prompt-sized chunks.
+    Returns (transcript data, chunks), or None after marking the manifest entry failed.
+    """
+    video_id = v.get("id")
+    try:
+        data = corpus.load_transcript(v)
+    except Exception as e:
+        log_failure(logger, video_id, f"read transcript: {e}")
+        record_status(v, "enrichment", "failed", str(e))
+        return None
+
+    transcript = data.get("transcript", "")
+    if not transcript.strip():
+        log_failure(logger, video_id, "empty transcript")
+        record_status(v, "enrichment", "failed", "empty_transcript")
+        return None
+
+    chunks = _split_transcript(transcript, model_name, chunking, chunk_tokens)
+    if len(chunks) > 1:
+        increment_stat("enrichment", "chunked_videos")
+        increment_stat("enrichment", "chunks", len(chunks))
+    elif len(chunks[0]) != len(transcript):
+        logger.debug("Truncated transcript for %s to %s chars", video_id, MAX_TRANSCRIPT_CHARS)
+    return data, chunks
+
+
+def _split_transcript(transcript: str, model_name: str, chunking: str, chunk_tokens: int) -> list[str]:
+    """Prompt-sized chunks of a transcript: one, unless chunking is on or it is over the model's chunk budget."""
+    if chunking != "off" and (chunking == "on" or estimate_tokens(transcript) > chunk_tokens):
+        return chunk_transcript(transcript, chunk_tokens)
+    # Truncate only for small-context models (e.g. gpt-3.5-turbo 16k); gpt-4o-mini 128k can take full
+    if "3.5" in model_name and len(transcript) > MAX_TRANSCRIPT_CHARS:
+        transcript = transcript[:MAX_TRANSCRIPT_CHARS] + "\n\n[Transcript truncated for length.]"
+    return [transcript]
+
+
+def _job_estimate(data: dict, chunks: list[str]) -> tuple[int, int]:
+    """Local (input, output) token estimate of enriching one video, from the prompts it would send."""
+    title = data.get("title", "Unknown")
+    if len(chunks) == 1:
+        prompts = [PROMPT_TEMPLATE.format(title=title, transcript=chunks[0]) + _main_request(1)]
     else:
-        raise ValueError("Set OPENAI_API_KEY (recommended) or GEMINI_API_KEY in .env")
+        prompts = _map_prompts(title, chunks)
+    return estimate_job(prompts, REDUCE_PROMPT_TEMPLATE + _main_request(len(chunks)), len(_output_requests()))
+
+
+def estimate_enrichment(videos: list[dict], model_name: str) -> dict:
+    """
+    Pre-estimate, without calling anything, what enriching these manifest entries would send and cost:
+    {videos, prompt_tokens, completion_tokens, cost_usd (None for an unpriced model)}.
+    """
+    chunking, chunk_tokens = _chunk_settings(model_name)
+    estimate = {"videos": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    for v in videos:
+        try:
+            data = corpus.load_transcript(v)
+        except Exception:
+            continue
+        transcript = data.get("transcript", "")
+        if not transcript.strip():
+            continue
+        prompt_tokens, completion_tokens = _job_estimate(
+            data, _split_transcript(transcript, model_name, chunking, chunk_tokens)
+        )
+        estimate["videos"] += 1
+        estimate["prompt_tokens"] += prompt_tokens
+        estimate["completion_tokens"] += completion_tokens
+    estimate["cost_usd"] = cost_usd(model_name, estimate["prompt_tokens"], estimate["completion_tokens"])
+    return estimate
+
+
+def _queue_order(order: str | None) -> str:
+    order = (order or os.environ.get("ENRICHMENT_QUEUE_ORDER", "playlist")).strip().lower()
+    if order not in QUEUE_ORDERS:
+        raise ValueError(f"Unknown enrichment queue order {order!r}; choose one of: {', '.join(QUEUE_ORDERS)}")
+    return order
+
 
-    # OpenAI paid tier can go faster; Gemini free needs throttle.
-    delay_seconds = float(os.environ.get("API_DELAY_SECONDS", "2" if provider == "openai" else "6"))
+def _order_jobs(jobs: list, order: str) -> list:
+    """Pending (v, data, chunks) jobs in queue order: playlist order, shortest transcript first, or newest upload."""
+    if order == "shortest":
+        return sorted(jobs, key=lambda job: sum(len(c) for c in job[2]))
+    if order == "newest":
+        return sorted(jobs, key=lambda job: job[1].get("upload_date") or "", reverse=True)
+    return jobs
+
+
+def _make_budget(model_name: str, budget_usd: float | None, max_tokens: int | None) -> Budget | None:
+    if budget_usd is None and max_tokens is None:
+        return None
+    return Budget(model_name, max_usd=budget_usd, max_tokens=max_tokens)
+
+
+def _admit(queue: list, budget: Budget) -> list[tuple]:
+    """Pop the longest prefix of the queue whose estimates fit the budget: [(job, reservation)]."""
+    admitted = []
+    while queue:
+        reservation = budget.reserve(_job_estimate(queue[0][1], queue[0][2]))
+        if reservation is None:
+            break
+        admitted.append((queue.pop(0), reservation))
+    return admitted
+
+
+def _admit_batch(jobs: list, budget: Budget) -> tuple[list, list]:
+    """
+    (jobs admitted, jobs left) for one batch submission. Reservations only matter within one admission:
+    the batch's actual usage is charged before anything else is admitted.
+    """
+    queue = list(jobs)
+    admitted = _admit(queue, budget)
+    for _, reservation in admitted:
+        budget.settle(reservation)
+    return [job for job, _ in admitted], queue
+
+
+def _report_budget_left(left: int, logger) -> None:
+    if left:
+        logger.warning("Enrichment budget reached: %d video(s) left for a later --resume run", left)
+        record_stats("enrichment", budget_videos_left=left)
+
+
+async def _run_within_budget(jobs: list, run_one, budget: Budget | None) -> list:
+    """
+    Run (v, data, chunks) jobs concurrently through `run_one`. With a budget, jobs go in waves: each wave is
+    the longest prefix of the queue that still fits, and the next one is admitted once the wave's actual usage
+    is known. The queue order is never skipped over. Returns the jobs left for a later run.
+    """
+    if budget is None:
+        await asyncio.gather(*(run_one(*job) for job in jobs))
+        return []
+    queue = list(jobs)
+    while queue:
+        wave = _admit(queue, budget)
+        if not wave:
+            break
+        await asyncio.gather(*(run_one(*job) for job, _ in wave))
+        for _, reservation in wave:
+            budget.settle(reservation)
+    return queue
+
+
+def _near_dup_threshold() -> float | None:
+    """NEAR_DUP_THRESHOLD (default 0.8): reuse a near-duplicate's enrichment at or above it; "off" or <= 0 disables."""
+    raw = os.environ.get("NEAR_DUP_THRESHOLD", str(DEFAULT_NEAR_DUP_THRESHOLD)).strip().lower()
+    if raw in ("", "off"):
+        return None
+    try:
+        threshold = float(raw)
+    except ValueError:
+        raise ValueError(f"NEAR_DUP_THRESHOLD must be a similarity between 0 and 1 or 'off', not {raw!r}")
+    if threshold > 1:
+        raise ValueError(f"NEAR_DUP_THRESHOLD must be a similarity between 0 and 1 or 'off', not {raw!r}")
+    return threshold if threshold > 0 else None
+
+
+def _near_duplicates(v: dict, data: dict, threshold: float) -> list[tuple[str, float]]:
+    """[(video id, similarity)] of indexed transcripts near this one; fingerprints it first if it is new."""
+    video_id = v.get("id")
+    index = get_near_dup_index()
+    source = corpus.get_corpus().sha256("transcript", video_id) or digest(data.get("transcript", ""))
+    index.add(video_id, source, data.get("transcript", ""))
+    return index.similar(video_id, threshold)
+
+
+def _reusable_duplicate(
+    similar: list[tuple[str, float]], recipe_hash: str, exclude=frozenset()
+) -> tuple[str, float, dict] | None:
+    """
+    The most similar near-duplicate whose enrichment is ok under the same recipe (prompts, model, chunking):
+    (video id, similarity, enriched record), or None.
+    """
+    store, pack = get_state_store(), corpus.get_corpus()
+    for other, score in similar:
+        if other in exclude:
+            continue
+        row = store.get_status(other, "enrichment") or {}
+        if row.get("status") != "ok" or row.get("recipe_hash") != recipe_hash:
+            continue
+        record = pack.get("enriched", other, row.get("output_hash"))
+        if record and record.get("gemini_sections"):
+            return other, score, record
+    return None
+
+
+def _reuse_duplicate(
+    v: dict, data: dict, chunks: list[str], duplicate: tuple[str, float, dict], logger, recipe_hash: str
+) -> None:
+    """Write a video's enrichment from its near-duplicate's sections instead of calling the LLM; count the savings."""
+    other, score, record = duplicate
+    _write_enriched(
+        v, data, "", 1, logger, recipe_hash,
+        sections=dict(record["gemini_sections"]),
+        duplicate_of={"video_id": other, "title": record.get("title", ""), "similarity": score},
+        translations=record.get("translations"),
+    )
+    # Map calls, the reduce call and the further outputs.
+    calls = len(chunks) + (1 if len(chunks) > 1 else 0) + len(_output_requests())
+    tokens = sum(estimate_tokens(c) for c in chunks)
+    increment_stat("near_duplicates", "reused")
+    increment_stat("near_duplicates", "llm_calls_saved", calls)
+    increment_stat("near_duplicates", "est_prompt_tokens_saved", tokens)
+    pairs = get_run_stats().get("near_duplicates", {}).get("pairs", [])
+    record_stats("near_duplicates", pairs=pairs + [
+        {"video_id": v.get("id"), "title": data.get("title", ""), "duplicate_of": other,
+         "duplicate_title": record.get("title", ""), "similarity": score, "est_prompt_tokens": tokens}
+    ])
+    logger.info("Reused enrichment of %s for near-duplicate %s (similarity %.2f)", other, v.get("id"), score)
+
+
+def _reuse_near_duplicates(jobs: list, threshold: float, recipe_hash: str, logger) -> tuple[list, list]:
+    """
+    Reuse an already-enriched near-duplicate for every job that has one. A job whose only near-duplicate is
+    another job of this run waits for it instead of paying for a second LLM call.
+    Returns (jobs to enrich, deferred jobs).
+    """
+    pending = {v.get("id") for v, _, _ in jobs}
+    remaining, deferred, representatives = [], [], set()
+    for job in jobs:
+        v, data, chunks = job
+        similar = _near_duplicates(v, data, threshold)
+        duplicate = _reusable_duplicate(similar, recipe_hash, exclude=pending)
+        if duplicate:
+            _reuse_duplicate(v, data, chunks, duplicate, logger, recipe_hash)
+        elif any(other in representatives for other, _ in similar):
+            deferred.append(job)
+        else:
+            representatives.add(v.get("id"))
+            remaining.append(job)
+    return remaining, deferred
+
+
+def _reuse_deferred(deferred: list, threshold: float, recipe_hash: str, logger) -> list:
+    """Reuse the now-enriched representative of each deferred job; returns those still to enrich (it failed)."""
+    leftover = []
+    for v, data, chunks in deferred:
+        duplicate = _reusable_duplicate(get_near_dup_index().similar(v.get("id"), threshold), recipe_hash)
+        if duplicate:
+            _reuse_duplicate(v, data, chunks, duplicate, logger, recipe_hash)
+        else:
+            leftover.append((v, data, chunks))
+    return leftover
+
+
+def _record_engine_stats(
+    llm: LLMProvider,
+    limiter: AIMDConcurrency,
+    cache: LLMCache | None,
+    concurrency: int,
+    elapsed: float,
+    budget: Budget | None = None,
+) -> None:
+    """Record the async engine's throughput, limiter, usage and cache stats, then close the cache and provider."""
+    requests_done = get_run_stats().get("enrichment", {}).get("llm_requests", 0)
+    record_stats(
+        "enrichment",
+        provider=llm.name,
+        model=llm.model,
+        elapsed_seconds=round(elapsed, 1),
+        requests_per_minute=round(requests_done / (elapsed / 60), 1) if elapsed > 0 else 0,
+        initial_concurrency=concurrency,
+        peak_in_flight=limiter.peak,
+        final_concurrency=int(limiter.limit),
+        concurrency_halvings=limiter.decreases,
+        **llm.latency_stats(),
+    )
+    _record_usage_stats(budget)
+    if cache:
+        record_stats(
+            "enrichment",
+            cache_hits=cache.hits,
+            cache_misses=cache.misses,
+            cache_evictions=cache.evictions,
+        )
+        cache.close()
+    llm.close()
+
+
+async def enrich_from_queue(
+    get_next: Callable[[], tuple[int, dict] | None],
+    on_done: Callable[[int, dict], None],
+    resume: bool = False,
+    concurrency: int | None = None,
+    logger=None,
+    budget_usd: float | None = None,
+    max_tokens: int | None = None,
+) -> None:
+    """
+    Streaming enrichment: pull (index, manifest entry) items from the blocking `get_next` until it returns
+    None, enrich each as soon as it arrives and hand it to `on_done` (called from this event loop's thread).
+    Entries whose transcript failed, or (with resume) whose enrichment is still fresh, are passed straight
+    through. Uses the same provider, cache and AIMD limiter as run_gemini_agent; at most ~2x ENRICHMENT_MAX_CONCURRENCY videos are held at once, so a slow
+    LLM pushes back on the producer instead of buffering the whole playlist.
+    With a budget, videos are admitted in arrival order while their estimates fit; once one does not fit even
+    with nothing in flight, the rest are passed through un-enriched (a later --resume picks them up).
+    """
+    logger = logger or setup_logger()
+    llm = get_provider()
+    concurrency, max_concurrency, min_interval = _engine_settings(llm.name, concurrency)
+    chunking, chunk_tokens = _chunk_settings(llm.model)
+    ENRICHED_DIR.mkdir(parents=True, exist_ok=True)
+
+    cache = open_llm_cache()
+    limiter = AIMDConcurrency(concurrency, max_concurrency, min_interval=min_interval)
+    recipe = enrichment_recipe(llm.name, llm.model)
+    budget = _make_budget(llm.model, budget_usd, max_tokens)
+    engine = _Engine(llm, limiter, cache, logger, recipe, budget, _streaming_enabled())
+    threshold = _near_dup_threshold()
+    store = get_state_store()
+    if resume:
+        store.adopt("enrichment", recipe, after="transcripts")
+    slots = asyncio.Semaphore(max_concurrency * 2)
+    tasks = set()
+
+    async def _one(i: int, v: dict, data: dict, chunks: list[str], reservation=None) -> None:
+        try:
+            await _enrich_video(v, data, chunks, engine, logger)
+        finally:
+            slots.release()
+            if reservation is not None:
+                budget.settle(reservation)
+        on_done(i, v)
+
+    over_budget = 0
+
+    started = time.monotonic()
+    try:
+        while True:
+            await slots.acquire()
+            item = await asyncio.to_thread(get_next)
+            if item is None:
+                slots.release()
+                break
+            i, v = item
+            prepared = None
+            # Checked on arrival: a transcript that was just re-fetched with new text makes its enrichment stale.
+            already_done = resume and not plan_stage(store.stage_view("enrichment", "transcripts", v.get("id")), recipe)
+            if v.get("status") != "failed" and not already_done:
+                prepared = _prepare_job(v, llm.model, chunking, chunk_tokens, logger)
+            if prepared is not None and threshold is not None:
+                # Only already-enriched videos can be reused here; a duplicate still in flight is enriched twice.
+                duplicate = _reusable_duplicate(_near_duplicates(v, prepared[0], threshold), recipe)
+                if duplicate:
+                    _reuse_duplicate(v, *prepared, duplicate, logger, recipe)
+                    prepared = None
+            reservation = None
+            if prepared is not None and budget is not None:
+                reservation = None if over_budget else budget.reserve(_job_estimate(*prepared))
+                if reservation is None and tasks and not over_budget:
+                    # Wait for what is in flight: its actual usage may leave room for this video.
+                    await asyncio.gather(*list(tasks))
+                    reservation = budget.reserve(_job_estimate(*prepared))
+                if reservation is None:
+                    over_budget += 1
+                    prepared = None
+            if prepared is None:
+                slots.release()
+                on_done(i, v)
+                continue
+            task = asyncio.create_task(_one(i, v, *prepared, reservation))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        await llm.aclose()
+    _report_budget_left(over_budget, logger)
+    _record_engine_stats(llm, limiter, cache, concurrency, time.monotonic() - started, budget)
+
+
+def run_gemini_agent(
+    manifest: dict | None = None,
+    resume: bool = False,
+    concurrency: int | None = None,
+    batch: bool = False,
+    sync: bool = False,
+    budget_usd: float | None = None,
+    max_tokens: int | None = None,
+    order: str | None = None,
+) -> dict:
+    """
+    Enrich each transcript with an LLM (OpenAI or Gemini). Save to data/enriched/{video_id}.json.
+    The provider comes from LLM_PROVIDER, else OpenAI if OPENAI_API_KEY is set, else Gemini (see utils/llm_providers).
+    If resume=True, skips videos whose enrichment is fresh (see utils/deps.py).
+    Requests run concurrently: `concurrency` (default ENRICHMENT_CONCURRENCY) is the starting in-flight window,
+    which grows on success up to ENRICHMENT_MAX_CONCURRENCY and halves on 429/RESOURCE_EXHAUSTED.
+    With batch=True all pending prompts are submitted as one batch job (BATCH_BACKEND) and polled instead.
+    sync=True behaves like resume (the playlist diff already happened in the transcript stage).
+    Pending videos are queued in `order` (ENRICHMENT_QUEUE_ORDER: playlist, shortest or newest). With
+    budget_usd and/or max_tokens, only the prefix of that queue that fits is enriched; the rest stay pending.
+    Every call's tokens and cost are added to its video's enrichment row (see utils/llm_usage.py).
+    """
+    logger = setup_logger()
+    llm = get_provider()
+    provider, model_name = llm.name, llm.model
+    concurrency, max_concurrency, min_interval = _engine_settings(provider, concurrency)
+    order = _queue_order(order)
+    budget = _make_budget(model_name, budget_usd, max_tokens)
 
     if manifest is None:
         if not MANIFEST_PATH.exists():
@@ -109,24 +1152,104 @@ def run_gemini_agent(manifest: dict | None = None, resume: bool = False) -> dict
         manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
 
     ENRICHED_DIR.mkdir(parents=True, exist_ok=True)
+    # Status updates are committed per video; make sure a hand-passed manifest's videos exist in the store.
+    store = get_state_store()
+    store.add_videos(manifest.get("videos", []))
+    recipe = enrichment_recipe(provider, model_name)
+    rebuild = None
+    if resume or sync:
+        store.adopt("enrichment", recipe, after="transcripts")
+        rebuild = plan_stage(store.stage_view("enrichment", after="transcripts"), recipe)
 
-    # Include any video that has a transcript; skip only if resume and already enriched.
+    # Include any video that has a transcript; with resume/sync, only those whose enrichment is stale
+    # (new, failed, transcript changed, prompt/model/chunking changed, or output missing).
     # (Don't filter by manifest "status" — it gets set to "failed" by Gemini, so we'd process 0 on retry.)
     videos = []
     for v in manifest.get("videos", []):
         vid = v.get("id")
-        if not vid:
+        if not vid or (rebuild is not None and vid not in rebuild):
             continue
-        tp = v.get("transcript_path") or TRANSCRIPTS_DIR / f"{vid}.json"
+        tp = v.get("transcript_path") or corpus.transcript_path(vid)
         if not Path(tp).exists():
             continue
-        if resume and (ENRICHED_DIR / f"{vid}.json").exists():
-            continue
         videos.append(v)
+
+    chunking, chunk_tokens = _chunk_settings(model_name)
+
+    # Split transcripts up front (cheap, local); only videos with a usable transcript go to the engine.
+    jobs = []
+    for v in videos:
+        prepared = _prepare_job(v, model_name, chunking, chunk_tokens, logger)
+        if prepared is not None:
+            jobs.append((v, *prepared))
+    jobs = _order_jobs(jobs, order)
+
+    # Near-duplicates (reuploads, mirrors) reuse an existing enrichment instead of calling the LLM again.
+    threshold = _near_dup_threshold()
+    deferred = []
+    if threshold is not None:
+        jobs, deferred = _reuse_near_duplicates(jobs, threshold, recipe, logger)
+
+    cache = open_llm_cache()
+    if batch:
+        if provider != "openai" and os.environ.get("BATCH_BACKEND", "openai").strip().lower() == "openai":
+            raise ValueError("Batch mode uses the OpenAI Batch API; set OPENAI_API_KEY or BATCH_BACKEND=local")
+        started = time.monotonic()
+        left = []
+        if budget is not None:
+            # A batch is priced up front: admit the prefix of the queue whose estimates fit, at batch rates.
+            budget.price_factor = BATCH_PRICE_FACTOR
+            jobs, left = _admit_batch(jobs, budget)
+        _enrich_in_batches(jobs, provider, model_name, cache, logger, recipe, budget)
+        leftover = _reuse_deferred(deferred, threshold, recipe, logger) if deferred else []
+        if leftover and budget is not None:
+            if left:  # the budget already stopped the queue ahead of them
+                left, leftover = left + leftover, []
+            else:
+                leftover, left = _admit_batch(leftover, budget)
+        if leftover:
+            _enrich_in_batches(leftover, provider, model_name, cache, logger, recipe, budget)
+        _report_budget_left(len(left), logger)
+        record_stats("enrichment", provider=provider, model=model_name, mode="batch",
+                     elapsed_seconds=round(time.monotonic() - started, 1))
+        _record_usage_stats(budget)
+        if cache:
+            record_stats("enrichment", cache_hits=cache.hits, cache_misses=cache.misses)
+            cache.close()
+        llm.close()
+        manifest = store.export_manifest(MANIFEST_PATH)
+        logger.info("Enrichment agent (%s, batch) finished. Enriched files in %s", provider, ENRICHED_DIR)
+        return manifest
+
     from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
     from rich.console import Console
     console = Console()
 
+    async def _run_engine(progress, task) -> AIMDConcurrency:
+        limiter = AIMDConcurrency(concurrency, max_concurrency, min_interval=min_interval)
+        engine = _Engine(llm, limiter, cache, logger, recipe, budget, _streaming_enabled())
+
+        async def _one(v, data, chunks):
+            await _enrich_video(v, data, chunks, engine, logger)
+            progress.advance(task)
+
+        try:
+            left = await _run_within_budget(jobs, _one, budget)
+            if deferred:
+                # Deferred near-duplicates reuse what was just enriched; any whose representative failed go to the LLM.
+                leftover = _reuse_deferred(deferred, threshold, recipe, logger)
+                progress.advance(task, len(deferred) - len(leftover))
+                if left:
+                    left += leftover  # the budget already stopped the queue ahead of them
+                else:
+                    left = await _run_within_budget(leftover, _one, budget)
+        finally:
+            await llm.aclose()  # its async connections belong to this event loop
+        _report_budget_left(len(left), logger)
+        progress.advance(task, len(left))
+        return limiter
+
+    started = time.monotonic()
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
@@ -135,91 +1258,11 @@ def run_gemini_agent(manifest: dict | None = None, resume: bool = False) -> dict
         console=console,
     ) as progress:
         task = progress.add_task(f"Enriching with {provider}...", total=len(videos))
-        for v in videos:
-            video_id = v.get("id")
-            transcript_path = v.get("transcript_path") or str(TRANSCRIPTS_DIR / f"{video_id}.json")
-            enriched_path = ENRICHED_DIR / f"{video_id}.json"
-
-            if resume and enriched_path.exists():
-                progress.advance(task)
-                continue
-
-            try:
-                data = json.loads(Path(transcript_path).read_text(encoding="utf-8"))
-            except Exception as e:
-                log_failure(logger, video_id, f"read transcript: {e}")
-                v["status"] = "failed"
-                v["reason"] = str(e)
-                progress.advance(task)
-                continue
+        progress.advance(task, len(videos) - len(jobs) - len(deferred))
+        limiter = asyncio.run(_run_engine(progress, task))
 
-            title = data.get("title", "Unknown")
-            transcript = data.get("transcript", "")
-            if not transcript.strip():
-                log_failure(logger, video_id, "empty transcript")
-                v["status"] = "failed"
-                v["reason"] = "empty_transcript"
-                progress.advance(task)
-                continue
-
-            # Truncate only for small-context models (e.g. gpt-3.5-turbo 16k); gpt-4o-mini 128k can take full
-            if "3.5" in model_name and len(transcript) > MAX_TRANSCRIPT_CHARS:
-                transcript = transcript[:MAX_TRANSCRIPT_CHARS] + "\n\n[Transcript truncated for length.]"
-                logger.debug("Truncated transcript for %s to %s chars", video_id, MAX_TRANSCRIPT_CHARS)
-
-            prompt = PROMPT_TEMPLATE.format(title=title, transcript=transcript)
-            text = ""
-            max_retries = 4
-            for attempt in range(max_retries):
-                try:
-                    if provider == "openai":
-                        text = _call_openai(prompt, model_name)
-                    else:
-                        text = _call_gemini(prompt, llm_client, model_name)
-                    break
-                except Exception as e:
-                    err_str = str(e)
-                    is_rate_limit = (
-                        "429" in err_str or "RESOURCE_EXHAUSTED" in err_str
-                        or "quota" in err_str.lower()
-                        or "rate_limit" in err_str.lower()
-                    )
-                    if is_rate_limit and attempt < max_retries - 1:
-                        wait_s = 60
-                        match = re.search(r"retry in (\d+(?:\.\d+)?)\s*s", err_str, re.I)
-                        if match:
-                            wait_s = max(30, min(120, float(match.group(1))))
-                        logger.warning("%s rate limit for %s, waiting %.0fs then retry (%s/%s)", provider, video_id, wait_s, attempt + 1, max_retries - 1)
-                        time.sleep(wait_s)
-                        continue
-                    log_failure(logger, video_id, err_str)
-                    v["status"] = "failed"
-                    v["reason"] = err_str[:200]
-                    break
-            if not text:
-                progress.advance(task)
-                time.sleep(delay_seconds)
-                continue
-
-            sections = parse_llm_response(text)
-            llm_notes = "\n\n".join(f"## {k}\n{v}" for k, v in sections.items() if v)
-
-            out = {
-                **data,
-                "gemini_sections": sections,
-                "gemini_notes": llm_notes,
-            }
-            try:
-                enriched_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-                v["status"] = "ok"
-            except Exception as e:
-                log_failure(logger, video_id, str(e))
-                v["status"] = "failed"
-                v["reason"] = str(e)
-
-            progress.advance(task)
-            time.sleep(delay_seconds)
+    _record_engine_stats(llm, limiter, cache, concurrency, time.monotonic() - started, budget)
 
-    MANIFEST_PATH.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    manifest = store.export_manifest(MANIFEST_PATH)
     logger.info("Enrichment agent (%s) finished. Enriched files in %s", provider, ENRICHED_DIR)
     return manifest
@@ -1,42 +1,391 @@
-"""NotebookLM: create notebook, add YouTube sources (with delay), generate audio/mindmap/quiz/flashcards."""
+"""
+NotebookLM: create notebook, add YouTube sources (submitted concurrently, then polled together until
+NotebookLM has processed them), generate audio/mindmap/quiz/flashcards (all at once, each with its own
+timeout and retries). Talks to NotebookLM through utils/notebooklm_client.py (NOTEBOOKLM_BACKEND).
+Reruns against an existing notebook only add the videos it is missing, and only regenerate artifacts
+whose source set changed since they were downloaded.
+"""
 import asyncio
 import json
 import os
+import re
+import statistics
+import time
 from pathlib import Path
 
 from dotenv import load_dotenv
+from utils.deps import digest, source_hash
 from utils.logger import setup_logger, log_failure
+from utils.notebooklm_client import ARTIFACTS, SOURCE_ERROR, SOURCE_READY, UnsupportedArtifact, get_notebooklm_backend
+from utils.rate_limit import AIMDConcurrency
+from utils.run_stats import increment_stat, record_stats
+from utils.state_store import get_state_store
 
 load_dotenv()
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 MANIFEST_PATH = DATA_DIR / "manifest.json"
 NOTEBOOKLM_OUTPUTS = DATA_DIR / "notebooklm_outputs"
+# In NOTEBOOKLM_OUTPUTS: {artifact: {"fingerprint", "file", "generated_at"}} of what is there; delete to regenerate
+FINGERPRINTS_FILE = "fingerprints.json"
 
-NOTEBOOKLM_SOURCE_DELAY = 3  # seconds between source additions
+NOTEBOOKLM_SOURCE_DELAY = 3  # minimum seconds between source submissions
+DEFAULT_SOURCE_CONCURRENCY = 4  # source submissions in flight
+DEFAULT_SOURCE_TIMEOUT = 900  # seconds for a submitted source to become ready
+DEFAULT_SOURCE_RETRIES = 3
+SOURCE_POLL_SECONDS = 5  # one notebook listing per tick covers every pending source
+SOURCE_RETRY_BACKOFF = 30  # seconds before the first retry round; doubles each round
+DEFAULT_RATE_LIMIT_WAIT = 60
 
+# Artifact -> (file in NOTEBOOKLM_OUTPUTS, timeout env var, default seconds). An Audio Overview of
+# 50 sources often takes 15-20+ min on NotebookLM's side; the others finish in a few minutes.
+ARTIFACT_FILES = {
+    "audio": ("podcast.mp3", "NOTEBOOKLM_AUDIO_TIMEOUT", 1200),
+    "mindmap": ("mindmap.json", "NOTEBOOKLM_ARTIFACT_TIMEOUT", 600),
+    "quiz": ("quiz.json", "NOTEBOOKLM_ARTIFACT_TIMEOUT", 600),
+    "flashcards": ("flashcards.json", "NOTEBOOKLM_ARTIFACT_TIMEOUT", 600),
+}
+DEFAULT_ARTIFACT_RETRIES = 2
+ARTIFACT_RETRY_BACKOFF = 60  # seconds before an artifact's second attempt; doubles each attempt
+MAX_ARTIFACT_RATE_LIMIT_WAITS = 5  # rate-limit pauses per artifact before they count as failed attempts
 
-async def _add_sources_batch(client, notebook_id: str, video_urls: list[str], delay: int) -> list[str]:
-    """Add YouTube URLs as sources with retry; return list of failed URLs."""
-    failed = []
-    for i, url in enumerate(video_urls, 1):
+_YOUTUBE_ID = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([\w-]{11})")
+
+
+def _source_settings() -> tuple[int, float, float, int]:
+    """(concurrency, seconds between submissions, ready timeout, attempts) from NOTEBOOKLM_SOURCE_* env vars."""
+    return (
+        max(1, int(os.environ.get("NOTEBOOKLM_SOURCE_CONCURRENCY", str(DEFAULT_SOURCE_CONCURRENCY)))),
+        float(os.environ.get("NOTEBOOKLM_SOURCE_DELAY", str(NOTEBOOKLM_SOURCE_DELAY))),
+        float(os.environ.get("NOTEBOOKLM_SOURCE_TIMEOUT", str(DEFAULT_SOURCE_TIMEOUT))),
+        max(1, int(os.environ.get("NOTEBOOKLM_SOURCE_RETRIES", str(DEFAULT_SOURCE_RETRIES)))),
+    )
+
+
+def _video_key(url: str | None) -> str:
+    """YouTube video id of a URL (watch, youtu.be, shorts, embed or live form), else the URL itself."""
+    match = _YOUTUBE_ID.search(url or "")
+    return match.group(1) if match else (url or "")
+
+
+def _is_rate_limited(err: Exception) -> bool:
+    return type(err).__name__ == "RateLimitError" or "429" in str(err) or "RESOURCE_EXHAUSTED" in str(err)
+
+
+async def _submit_source(client, notebook_id: str, url: str, limiter: AIMDConcurrency, logger) -> str:
+    """add_url without waiting for processing; returns the source id. Rate limits pause every submitter."""
+    while True:
+        await limiter.acquire()
         try:
-            await client.sources.add_url(notebook_id, url, wait=True)
+            source_id = await client.add_source(notebook_id, url)
         except Exception as e:
-            setup_logger().warning("Failed to add source %s: %s", url, e)
-            failed.append(url)
-        await asyncio.sleep(delay)
+            if _is_rate_limited(e):
+                wait_s = getattr(e, "retry_after", None) or DEFAULT_RATE_LIMIT_WAIT
+                await limiter.release(rate_limited=True, retry_after=wait_s)
+                increment_stat("notebooklm", "rate_limit_hits")
+                logger.warning("NotebookLM rate limit adding %s, pausing %.0fs", url, wait_s)
+                continue
+            await limiter.release(success=False)
+            raise
+        await limiter.release()
+        return source_id
+
+
+async def _poll_sources(
+    client, notebook_id: str, waiting: dict[str, str], timeout: float, on_done
+) -> dict[str, str]:
+    """
+    Poll one notebook listing per tick until every source in `waiting` ({source id: url}) is ready or
+    failed, or `timeout` passes. Calls on_done(url, source id, error or None) as each one settles;
+    returns {url: error} of those that failed or timed out.
+    """
+    failed = {}
+    deadline = time.monotonic() + timeout
+    waiting = dict(waiting)
+    while waiting:
+        try:
+            listed = {source_id: status for source_id, _, status in await client.list_sources(notebook_id)}
+        except Exception as e:
+            if not _is_rate_limited(e):
+                raise
+            listed = {}
+        increment_stat("notebooklm", "source_polls")
+        for source_id, url in list(waiting.items()):
+            status = listed.get(source_id)
+            if status == SOURCE_READY:
+                del waiting[source_id]
+                on_done(url, source_id, None)
+            elif status == SOURCE_ERROR:
+                del waiting[source_id]
+                failed[url] = "processing_error"
+                on_done(url, source_id, failed[url])
+        if waiting and time.monotonic() >= deadline:
+            for source_id, url in waiting.items():
+                failed[url] = "timeout"
+                on_done(url, source_id, failed[url])
+            break
+        if waiting:
+            await asyncio.sleep(SOURCE_POLL_SECONDS)
     return failed
 
 
-def run_notebooklm_agent(manifest: dict | None = None) -> dict:
+async def _ingest_sources(client, notebook_id: str, url_to_id: dict[str, str], logger, advance) -> None:
+    """
+    Add YouTube URLs as sources: submit them concurrently with wait=False (bounded and spaced by an AIMD
+    limiter), then poll all pending ones together. Failed or timed-out sources are removed and resubmitted
+    with backoff, up to NOTEBOOKLM_SOURCE_RETRIES rounds. Each video's notebooklm stage row records the
+    outcome (attempts, start and finish times); its manifest entry gets `notebooklm_source` with the
+    source id and the seconds from submission to ready.
+    """
+    concurrency, delay, timeout, attempts = _source_settings()
+    store = get_state_store()
+    limiter = AIMDConcurrency(concurrency, concurrency, min_interval=delay)
+    ready_seconds = []
+    submitted_at: dict[str, float] = {}
+    todo = list(url_to_id)
+    for attempt in range(attempts):
+        if attempt:
+            backoff = SOURCE_RETRY_BACKOFF * 2 ** (attempt - 1)
+            logger.info("Retrying %d NotebookLM source(s) in %ds", len(todo), backoff)
+            increment_stat("notebooklm", "source_retries", len(todo))
+            await asyncio.sleep(backoff)
+        last_round = attempt == attempts - 1
+
+        def finish(url: str, source_id: str | None, error: str | None) -> None:
+            video_id = url_to_id[url]
+            if error is None:
+                seconds = round(time.monotonic() - submitted_at[url], 1)
+                ready_seconds.append(seconds)
+                store.finish(video_id, "notebooklm", "ok", output_hash=source_id)
+                store.upsert_video(video_id, notebooklm_source={"id": source_id, "ready_seconds": seconds})
+                advance()
+            elif last_round:
+                logger.warning("Failed to add %s: %s", url, error)
+                store.finish(video_id, "notebooklm", "failed", error[:200])
+                advance()
+
+        async def submit(url: str) -> tuple[str, str | None, str | None]:
+            store.begin(url_to_id[url], "notebooklm")
+            submitted_at[url] = time.monotonic()
+            try:
+                return url, await _submit_source(client, notebook_id, url, limiter, logger), None
+            except Exception as e:
+                return url, None, str(e) or type(e).__name__
+
+        submissions = await asyncio.gather(*(submit(url) for url in todo))
+        retry = []
+        for url, source_id, error in submissions:
+            if error is not None:
+                finish(url, None, error)
+                retry.append(url)
+        waiting = {source_id: url for url, source_id, error in submissions if error is None}
+        failed = await _poll_sources(client, notebook_id, waiting, timeout, finish)
+        for source_id, url in waiting.items():
+            if url in failed and not last_round:
+                try:
+                    await client.delete_source(notebook_id, source_id)  # resubmitted below; avoid a duplicate
+                except Exception as e:
+                    logger.debug("Could not remove failed source %s: %s", source_id, e)
+        todo = retry + list(failed)
+        if not todo:
+            break
+    record_stats(
+        "notebooklm",
+        sources_added=len(ready_seconds),
+        sources_failed=len(todo),
+        peak_sources_in_flight=limiter.peak,
+    )
+    if ready_seconds:
+        record_stats(
+            "notebooklm",
+            source_ready_p50_seconds=round(statistics.median(ready_seconds), 1),
+            source_ready_max_seconds=max(ready_seconds),
+        )
+
+
+async def _missing_sources(client, notebook_id: str, url_to_id: dict[str, str], logger) -> list[str]:
+    """
+    URLs of an existing notebook that are not among its sources yet (matched by YouTube video id, so a
+    youtu.be and a watch?v= URL of the same video count as one). Sources NotebookLM failed to process are
+    removed and their URLs returned, to be added again. Videos already present get their notebooklm stage
+    row marked ok with the source id.
+    """
+    store = get_state_store()
+    present: dict[str, list[tuple[str, str]]] = {}
+    for source_id, url, status in await client.list_sources(notebook_id):
+        present.setdefault(_video_key(url), []).append((source_id, status))
+    missing = []
+    for url, video_id in url_to_id.items():
+        sources = present.get(_video_key(url), [])
+        usable = [source_id for source_id, status in sources if status != SOURCE_ERROR]
+        if usable:
+            row = store.get_status(video_id, "notebooklm")
+            if not row or row["status"] != "ok" or row["output_hash"] != usable[0]:
+                store.finish(video_id, "notebooklm", "ok", output_hash=usable[0])
+            continue
+        for source_id, _ in sources:
+            try:
+                await client.delete_source(notebook_id, source_id)
+            except Exception as e:
+                logger.debug("Could not remove failed source %s: %s", source_id, e)
+        missing.append(url)
+    record_stats("notebooklm", sources_existing=len(url_to_id) - len(missing), sources_missing=len(missing))
+    return missing
+
+
+async def _source_fingerprint(client, notebook_id: str) -> str:
+    """Hash of the notebook and its ready sources: what every artifact is generated from."""
+    listed = await client.list_sources(notebook_id)
+    return digest(notebook_id, *sorted(source_id for source_id, _, status in listed if status == SOURCE_READY))
+
+
+def _load_fingerprints() -> dict[str, dict]:
+    path = NOTEBOOKLM_OUTPUTS / FINGERPRINTS_FILE
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_fingerprints(fingerprints: dict[str, dict]) -> None:
+    path = NOTEBOOKLM_OUTPUTS / FINGERPRINTS_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(fingerprints, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def selected_artifacts(artifacts: list[str] | str | None = None) -> list[str]:
+    """
+    Artifacts to generate: `artifacts` (a list, or a comma list as given to --artifacts), else
+    NOTEBOOKLM_ARTIFACTS, else all of them. Raises ValueError for an unknown name.
+    """
+    if artifacts is None:
+        artifacts = os.environ.get("NOTEBOOKLM_ARTIFACTS", "").strip() or list(ARTIFACTS)
+    if isinstance(artifacts, str):
+        artifacts = [a.strip().lower() for a in artifacts.split(",") if a.strip()]
+    unknown = [a for a in artifacts if a not in ARTIFACT_FILES]
+    if unknown:
+        raise ValueError(f"Unknown NotebookLM artifact(s) {', '.join(unknown)}; choose from: {', '.join(ARTIFACTS)}")
+    return [a for a in ARTIFACTS if a in artifacts]
+
+
+async def _generate_artifact(client, notebook_id: str, kind: str, logger) -> dict:
+    """
+    Generate one artifact, wait for it under its own timeout and download it (to a temp file, renamed into
+    place once complete, so a failed download never replaces the previous run's file). Failures are retried
+    with backoff up to NOTEBOOKLM_ARTIFACT_RETRIES attempts; the first MAX_ARTIFACT_RATE_LIMIT_WAITS rate
+    limits wait without using up an attempt, later ones count as failures.
+    Returns {"artifact", "status", "attempts", "seconds", "bytes", "error"}.
+    """
+    filename, timeout_env, default_timeout = ARTIFACT_FILES[kind]
+    timeout = float(os.environ.get(timeout_env, str(default_timeout)))
+    attempts = max(1, int(os.environ.get("NOTEBOOKLM_ARTIFACT_RETRIES", str(DEFAULT_ARTIFACT_RETRIES))))
+    out_path = NOTEBOOKLM_OUTPUTS / filename
+    tmp_path = out_path.with_name(out_path.name + ".part")
+    result = {"artifact": kind, "status": "failed", "attempts": 0, "seconds": 0.0, "bytes": 0, "error": None}
+    rate_limit_waits = 0
+    started = time.monotonic()
+    while result["attempts"] < attempts:
+        result["attempts"] += 1
+        try:
+            task_id = await client.generate(notebook_id, kind)
+            if task_id is not None:
+                await client.wait(notebook_id, task_id, timeout)
+            await client.download(notebook_id, kind, tmp_path)
+            os.replace(tmp_path, out_path)
+        except UnsupportedArtifact as e:
+            result["error"] = str(e)
+            break
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            result["error"] = str(e) or type(e).__name__
+            if _is_rate_limited(e) and rate_limit_waits < MAX_ARTIFACT_RATE_LIMIT_WAITS:
+                rate_limit_waits += 1
+                result["attempts"] -= 1
+                wait_s = getattr(e, "retry_after", None) or DEFAULT_RATE_LIMIT_WAIT
+                increment_stat("notebooklm", "rate_limit_hits")
+                logger.warning("NotebookLM rate limit generating %s, pausing %.0fs", kind, wait_s)
+                await asyncio.sleep(wait_s)
+            elif result["attempts"] < attempts:
+                backoff = ARTIFACT_RETRY_BACKOFF * 2 ** (result["attempts"] - 1)
+                logger.warning("%s generation failed (%s), retrying in %ds", kind, result["error"], backoff)
+                increment_stat("notebooklm", "artifact_retries")
+                await asyncio.sleep(backoff)
+            continue
+        result.update(status="ok", error=None, bytes=out_path.stat().st_size)
+        break
+    result["seconds"] = round(time.monotonic() - started, 1)
+    if result["status"] == "ok":
+        logger.info("NotebookLM %s ready in %.1fs: %s", kind, result["seconds"], out_path)
+    else:
+        logger.warning("NotebookLM %s failed after %d attempt(s): %s", kind, result["attempts"], result["error"])
+    return result
+
+
+async def _generate_artifacts(
+    client, notebook_id: str, artifacts: list[str], logger, sources_fingerprint: str | None = None
+) -> list[dict]:
+    """
+    Start every selected artifact at once and wait for all of them; one failing does not stop the others.
+    With `sources_fingerprint`, an artifact whose file exists and was generated from the same sources (and
+    generation code) is skipped with status "unchanged", and each new download records its fingerprint.
+    """
+    NOTEBOOKLM_OUTPUTS.mkdir(parents=True, exist_ok=True)
+    fingerprints = _load_fingerprints() if sources_fingerprint else {}
+    wanted = {kind: digest(sources_fingerprint, kind, source_hash(type(client).generate)) for kind in artifacts}
+    unchanged = [
+        kind for kind in artifacts
+        if sources_fingerprint
+        and fingerprints.get(kind, {}).get("fingerprint") == wanted[kind]
+        and (NOTEBOOKLM_OUTPUTS / ARTIFACT_FILES[kind][0]).exists()
+    ]
+    todo = [kind for kind in artifacts if kind not in unchanged]
+    if unchanged:
+        logger.info("NotebookLM sources unchanged, keeping: %s", ", ".join(unchanged))
+    if todo:
+        logger.info("Generating NotebookLM artifacts concurrently: %s", ", ".join(todo))
+
+    async def one(kind: str) -> dict:
+        result = await _generate_artifact(client, notebook_id, kind, logger)
+        if sources_fingerprint and result["status"] == "ok":
+            fingerprints[kind] = {
+                "fingerprint": wanted[kind], "file": ARTIFACT_FILES[kind][0], "generated_at": round(time.time()),
+            }
+            _save_fingerprints(fingerprints)  # per artifact: a crash later in the run keeps what finished
+        return result
+
+    started = time.monotonic()
+    generated = dict(zip(todo, await asyncio.gather(*(one(kind) for kind in todo))))
+    results = [
+        generated.get(kind) or {
+            "artifact": kind, "status": "unchanged", "attempts": 0, "seconds": 0.0,
+            "bytes": (NOTEBOOKLM_OUTPUTS / ARTIFACT_FILES[kind][0]).stat().st_size, "error": None,
+        }
+        for kind in artifacts
+    ]
+    record_stats(
+        "notebooklm",
+        artifacts=results,
+        artifacts_ok=sum(r["status"] == "ok" for r in results),
+        artifacts_unchanged=len(unchanged),
+        artifacts_failed=sum(r["status"] == "failed" for r in results),
+        artifacts_elapsed_seconds=round(time.monotonic() - started, 1),
+    )
+    return results
+
+
+def run_notebooklm_agent(manifest: dict | None = None, artifacts: list[str] | str | None = None) -> dict:
     """
-    Create NotebookLM notebook, add all video URLs, generate artifacts, download to data/notebooklm_outputs/.
-    Uses asyncio for notebooklm-py. Returns manifest (unchanged) and saves notebook id to env hint.
+    Create NotebookLM notebook (or reuse the existing one and add only the videos it is missing), generate
+    artifacts whose sources changed, download to data/notebooklm_outputs/. `artifacts` picks which ones
+    (see selected_artifacts). Uses asyncio for the NotebookLM backend.
+    Returns the manifest, with the notebook id saved as notebooklm_notebook_id.
     """
     logger = setup_logger()
     notebook_name = os.environ.get("NOTEBOOKLM_NOTEBOOK_NAME", "Greek Playlist Research").strip()
-    source_delay = int(os.environ.get("NOTEBOOKLM_SOURCE_DELAY", str(NOTEBOOKLM_SOURCE_DELAY)))
+    artifacts = selected_artifacts(artifacts)
 
     if manifest is None:
         if not MANIFEST_PATH.exists():
@@ -44,101 +393,53 @@ def run_notebooklm_agent(manifest: dict | None = None) -> dict:
         manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
 
     video_urls = [v["url"] for v in manifest.get("videos", []) if v.get("status") == "ok" and v.get("url")]
+    url_to_id = {v["url"]: v["id"] for v in manifest.get("videos", []) if v.get("url") and v.get("id")}
+    store = get_state_store()
     # Reuse existing notebook: env override, or last run's id from manifest
     existing_id = (os.environ.get("NOTEBOOKLM_NOTEBOOK_ID") or "").strip() or manifest.get("notebooklm_notebook_id")
     if not video_urls and not existing_id:
         logger.warning("No video URLs to add to NotebookLM and no existing notebook id")
         return manifest
 
-    try:
-        from notebooklm import NotebookLMClient, QuizDifficulty, QuizQuantity
-    except ImportError:
-        raise ImportError("notebooklm-py is required. Install with: pip install 'notebooklm-py[browser]'")
-
     async def _run() -> str | None:
-        async with await NotebookLMClient.from_storage() as client:
+        async with get_notebooklm_backend() as client:
             if existing_id:
                 notebook_id = existing_id
                 logger.info("Using existing notebook: %s", notebook_id)
             else:
-                nb = await client.notebooks.create(notebook_name)
-                notebook_id = nb.id
+                notebook_id = await client.create_notebook(notebook_name)
                 logger.info("Created notebook: %s (id=%s)", notebook_name, notebook_id)
 
-                # Add sources with delay (only when we just created the notebook)
-                if video_urls:
-                    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
-                    from rich.console import Console
-                    console = Console()
-                    with Progress(
-                        SpinnerColumn(),
-                        TextColumn("[progress.description]{task.description}"),
-                        BarColumn(),
-                        TextColumn("{task.completed}/{task.total}"),
-                        console=console,
-                    ) as progress:
-                        task = progress.add_task("Adding sources to NotebookLM...", total=len(video_urls))
-                        for url in video_urls:
-                            try:
-                                await client.sources.add_url(notebook_id, url, wait=True)
-                            except Exception as e:
-                                logger.warning("Failed to add %s: %s", url, e)
-                            progress.advance(task)
-                            await asyncio.sleep(source_delay)
-
-            NOTEBOOKLM_OUTPUTS.mkdir(parents=True, exist_ok=True)
-
-            # 1. Audio Overview (50 sources often take 15–20+ min on NotebookLM's side)
-            audio_timeout = float(os.environ.get("NOTEBOOKLM_AUDIO_TIMEOUT", "1200"))
-            logger.info("Generating Audio Overview... (timeout=%ss)", audio_timeout)
-            try:
-                status = await client.artifacts.generate_audio(
-                    notebook_id,
-                    instructions="Create an engaging overview in English",
-                )
-                await client.artifacts.wait_for_completion(
-                    notebook_id, status.task_id, timeout=audio_timeout
+            # Add sources: all of them to a new notebook, only the missing ones to an existing one
+            pending = video_urls
+            if existing_id and video_urls:
+                pending = await _missing_sources(
+                    client, notebook_id, {url: url_to_id[url] for url in video_urls}, logger
                 )
-                out_audio = NOTEBOOKLM_OUTPUTS / "podcast.mp3"
-                await client.artifacts.download_audio(notebook_id, str(out_audio))
-            except Exception as e:
-                logger.warning("Audio overview failed: %s", e)
-
-            # 2. Mind Map
-            logger.info("Generating Mind Map...")
-            try:
-                await client.artifacts.generate_mind_map(notebook_id)
-                # Wait and download if API supports it
-                out_mindmap = NOTEBOOKLM_OUTPUTS / "mindmap.json"
-                if hasattr(client.artifacts, "download_mind_map"):
-                    await client.artifacts.download_mind_map(notebook_id, str(out_mindmap))
-            except Exception as e:
-                logger.warning("Mind map failed: %s", e)
-
-            # 3. Quiz (use library enums: QuizDifficulty.HARD, not string "hard")
-            logger.info("Generating Quiz...")
-            try:
-                status = await client.artifacts.generate_quiz(
-                    notebook_id, difficulty=QuizDifficulty.HARD
-                )
-                await client.artifacts.wait_for_completion(notebook_id, status.task_id)
-                out_quiz = NOTEBOOKLM_OUTPUTS / "quiz.json"
-                await client.artifacts.download_quiz(notebook_id, str(out_quiz), output_format="json")
-            except Exception as e:
-                logger.warning("Quiz failed: %s", e)
-
-            # 4. Flashcards (use QuizQuantity.MORE enum)
-            logger.info("Generating Flashcards...")
-            try:
-                status = await client.artifacts.generate_flashcards(
-                    notebook_id, quantity=QuizQuantity.MORE
-                )
-                await client.artifacts.wait_for_completion(notebook_id, status.task_id)
-                out_cards = NOTEBOOKLM_OUTPUTS / "flashcards.json"
-                await client.artifacts.download_flashcards(notebook_id, str(out_cards), output_format="json")
-            except Exception as e:
-                logger.warning("Flashcards failed: %s", e)
+                logger.info("Notebook has %d of %d videos; adding %d", len(video_urls) - len(pending),
+                            len(video_urls), len(pending))
+            if pending:
+                from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
+                from rich.console import Console
+                console = Console()
+                with Progress(
+                    SpinnerColumn(),
+                    TextColumn("[progress.description]{task.description}"),
+                    BarColumn(),
+                    TextColumn("{task.completed}/{task.total}"),
+                    console=console,
+                ) as progress:
+                    task = progress.add_task("Adding sources to NotebookLM...", total=len(pending))
+                    started = time.monotonic()
+                    await _ingest_sources(
+                        client, notebook_id, {url: url_to_id[url] for url in pending}, logger,
+                        lambda: progress.advance(task),
+                    )
+                    record_stats("notebooklm", sources_elapsed_seconds=round(time.monotonic() - started, 1))
 
+            if artifacts:
+                fingerprint = await _source_fingerprint(client, notebook_id)
+                await _generate_artifacts(client, notebook_id, artifacts, logger, fingerprint)
             return notebook_id
 
     try:
@@ -148,8 +449,8 @@ def run_notebooklm_agent(manifest: dict | None = None) -> dict:
         raise
 
     if notebook_id:
-        manifest["notebooklm_notebook_id"] = notebook_id
-        MANIFEST_PATH.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        store.set_meta("notebooklm_notebook_id", notebook_id)
+        manifest = store.export_manifest(MANIFEST_PATH)
         logger.info("NotebookLM notebook id saved to manifest: %s", notebook_id)
 
     return manifest
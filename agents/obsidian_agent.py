@@ -1,20 +1,30 @@
 """Obsidian vault writer: one note per video + MOC index + NotebookLM artifacts reference."""
+import hashlib
 import json
 import os
 import re
+from datetime import date
 from pathlib import Path
 
 from dotenv import load_dotenv
 from utils.logger import setup_logger
+from agents.related_agent import related_links
+from utils import corpus, note_formatter
+from utils.concept_index import WIKILINK, concept_key, extract_links, get_concept_index, links_digest
+from utils.deps import digest, plan_stage, source_hash
+from utils.file_publish import publish_bytes, publish_file
+from utils.run_stats import mark_event, record_stats
+from utils.state_store import get_state_store
 
 load_dotenv()
-from utils.note_formatter import format_note, safe_filename
+from utils.note_formatter import format_note, note_names, safe_filename
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 ENRICHED_DIR = DATA_DIR / "enriched"
 MANIFEST_PATH = DATA_DIR / "manifest.json"
 NOTEBOOKLM_OUTPUTS = DATA_DIR / "notebooklm_outputs"
 LOCAL_EXPORT_DIR = DATA_DIR / "obsidian_export"  # used when no Obsidian vault configured
+CONCEPTS_SUBFOLDER = "Concepts"  # one note per concept, inside the notes folder
 
 
 def _playlist_slug(playlist_title: str) -> str:
@@ -44,13 +54,8 @@ def _is_vault_configured(vault_path: str) -> bool:
     return True
 
 
-def run_obsidian_agent(manifest: dict | None = None) -> dict:
-    """
-    Write Obsidian notes for each enriched video and a MOC index.
-    If OBSIDIAN_VAULT_PATH is set to a real path, writes there; otherwise writes to ./data/obsidian_export/
-    so you get all markdown files without needing Obsidian. You can open that folder in Obsidian later if you want.
-    """
-    logger = setup_logger()
+def resolve_out_dir(logger) -> Path:
+    """Notes folder: OBSIDIAN_VAULT_PATH/OBSIDIAN_SUBFOLDER if a real vault is set, else data/obsidian_export/."""
     vault_path = os.environ.get("OBSIDIAN_VAULT_PATH", "").strip()
     subfolder = os.environ.get("OBSIDIAN_SUBFOLDER", "YouTube Playlists").strip()
 
@@ -63,6 +68,190 @@ def run_obsidian_agent(manifest: dict | None = None) -> dict:
             "OBSIDIAN_VAULT_PATH not set or still the example path — writing notes to %s (no Obsidian needed)",
             out_dir,
         )
+    return out_dir
+
+
+def _format_duration(duration_raw) -> str:
+    duration = str(duration_raw) if isinstance(duration_raw, (int, float)) else duration_raw
+    if isinstance(duration_raw, (int, float)) and duration_raw:
+        m, s = divmod(int(duration_raw), 60)
+        duration = f"{m}:{s:02d}"
+    return duration
+
+
+def canonical_links(text: str, concepts: dict[str, str]) -> str:
+    """
+    Point every [[wikilink]] at its concept note: `[[inflation rates]]` → `[[Inflation|inflation rates]]`.
+    An explicit alias or heading is kept; links with no known concept are left alone.
+    """
+    def _link(match: re.Match) -> str:
+        target, rest = match.group(1).strip(), match.group(2) or ""
+        name = concepts.get(concept_key(target))
+        if not name or name == target:
+            return match.group(0)
+        return f"[[{name}{rest}]]" if rest.startswith("|") else f"[[{name}{rest}|{target}]]"
+
+    return WIKILINK.sub(_link, text)
+
+
+def note_recipe(playlist_title: str, notebook_id: str) -> str:
+    """Hash of the code/config besides the enriched JSON that shapes a note: formatter, playlist, notebook id."""
+    return digest(
+        source_hash(note_formatter),
+        source_hash(write_video_note),
+        source_hash(_format_duration),
+        source_hash(canonical_links),
+        playlist_title,
+        notebook_id,
+    )
+
+
+def write_video_note(
+    data: dict,
+    index: int,
+    out_dir: Path,
+    playlist_title: str,
+    notebook_id: str = "",
+    playlist_slug: str | None = None,
+    related_videos: list[tuple[str, str]] | None = None,
+    concepts: dict[str, str] | None = None,
+) -> Path:
+    """
+    Write one enriched video as `{index:02d} - {title}.md` in out_dir; returns the note path.
+    related_videos: (note name, title) of similar videos, from agents.related_agent.related_links().
+    concepts: {link key: concept name} from the concept index; wikilinks are rewritten to those names.
+    """
+    title = data.get("title", "Unknown")
+    video_id = data.get("video_id", "")
+    notes = data.get("gemini_notes", "")
+    if concepts:
+        notes = canonical_links(notes, concepts)
+    body = format_note(
+        title=title,
+        playlist_title=playlist_title,
+        url=data.get("url", f"https://www.youtube.com/watch?v={video_id}"),
+        video_id=video_id,
+        uploader=data.get("uploader", ""),
+        upload_date=data.get("upload_date", ""),
+        duration=_format_duration(data.get("duration", 0)),
+        notebook_id=notebook_id,
+        gemini_notes=notes,
+        playlist_slug=playlist_slug or _playlist_slug(playlist_title),
+        related_videos=related_videos,
+    )
+    note_path = out_dir / safe_filename(index, title)
+    note_path.write_text(body, encoding="utf-8")
+    if video_id:
+        store = get_state_store()
+        # Built from the related-videos row (enriched hash + neighbour list) once that stage has run.
+        upstream = store.get_status(video_id, "related") or store.get_status(video_id, "enrichment") or {}
+        store.finish(
+            video_id, "obsidian", "ok",
+            input_hash=upstream.get("output_hash"),
+            output_hash=hashlib.sha256(body.encode("utf-8")).hexdigest(),
+            recipe_hash=note_recipe(playlist_title, notebook_id),
+            output_path=str(note_path),
+        )
+        links_hash = links_digest(extract_links(data), concepts) if concepts is not None else None
+        get_concept_index().mark_rendered(video_id, links_hash)
+    mark_event("first_note")
+    return note_path
+
+
+def write_search_note(query: str, results: list[dict], out_dir: Path | None = None) -> Path:
+    """
+    Write `Search results - {query}.md` into the notes folder: each hit links to its video note
+    (when one was written) with the field that matched and a snippet.
+    """
+    from utils.search_index import MATCH_END, MATCH_START
+
+    out_dir = out_dir or resolve_out_dir(setup_logger())
+    out_dir.mkdir(parents=True, exist_ok=True)
+    store = get_state_store()
+    lines = [f"# Search results: {query}", "", f"> {len(results)} video(s) · searched {date.today().isoformat()}", ""]
+    for n, hit in enumerate(results, 1):
+        note = (store.get_status(hit["video_id"], "obsidian") or {}).get("output_path")
+        link = f"[[{Path(note).stem}|{hit['title']}]]" if note else f"{hit['title']} (`{hit['video_id']}`)"
+        snippet = hit["snippet"].replace(MATCH_START, "**").replace(MATCH_END, "**")
+        if hit.get("start") is not None:
+            at = int(hit["start"])
+            watch = f"https://www.youtube.com/watch?v={hit['video_id']}&t={at}s"
+            snippet = f"[▶ {_format_duration(at)}]({watch}) {snippet}"
+        lines.extend([f"{n}. {link} — *{', '.join(hit['fields'])}*", f"    > {snippet}", ""])
+    safe_query = re.sub(r"\s+", " ", re.sub(r'[\\/*?:"<>|#^\[\]]', "", query)).strip()[:80] or "query"
+    note_path = out_dir / f"Search results - {safe_query}.md"
+    note_path.write_text("\n".join(lines), encoding="utf-8")
+    return note_path
+
+
+def write_concept_notes(
+    out_dir: Path, concepts: dict[int, dict], notes: dict[str, tuple[str, str]], playlist_title: str, index
+) -> dict:
+    """
+    One note per concept in out_dir/Concepts, listing the videos that link to it; the concept's other
+    spellings become Obsidian aliases. Only notes whose content changed are written; a renamed concept's
+    old note and notes of concepts no video links to any more are removed.
+    """
+    folder = out_dir / CONCEPTS_SUBFOLDER
+    folder.mkdir(parents=True, exist_ok=True)
+    previous = index.concept_notes()
+    playlist_slug = _playlist_slug(playlist_title)
+    written, counts = {}, {"concept_notes_written": 0, "concept_notes_fresh": 0, "concept_notes_removed": 0}
+    for concept_id, concept in concepts.items():
+        videos = [notes[v] for v in concept["videos"] if v in notes]
+        if not videos:
+            continue
+        lines = ["---", "type: concept"]
+        if concept["aliases"]:
+            lines += ["aliases:"] + [f"  - {json.dumps(a, ensure_ascii=False)}" for a in concept["aliases"]]
+        lines += ["tags:", "  - concept", f"  - {playlist_slug}", "---", "", f"# {concept['name']}", ""]
+        lines += [f"Mentioned in {len(videos)} video(s) of *{playlist_title}*.", "", "## Videos", ""]
+        lines += [f"- [[{name}|{title}]]" for name, title in videos]
+        body = "\n".join(lines) + "\n"
+        note_hash = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        path = folder / f"{concept['name']}.md"
+        old_name, old_hash = previous.pop(concept_id, (None, None))
+        if old_name and old_name != concept["name"]:
+            (folder / f"{old_name}.md").unlink(missing_ok=True)
+        if old_hash == note_hash and old_name == concept["name"] and path.exists():
+            counts["concept_notes_fresh"] += 1
+            continue
+        path.write_text(body, encoding="utf-8")
+        written[concept_id] = (concept["name"], note_hash)
+        counts["concept_notes_written"] += 1
+    for old_name, _ in previous.values():
+        (folder / f"{old_name}.md").unlink(missing_ok=True)
+        counts["concept_notes_removed"] += 1
+    index.set_concept_notes(written, previous.keys())
+    return counts
+
+
+def _numbered_enriched_files(manifest: dict) -> list[tuple[int, Path]]:
+    """
+    (note number, enriched JSON) pairs. Videos are numbered by playlist position, so a note keeps its
+    filename however many other videos failed or were enriched in a different order (streaming mode writes
+    the same names); enriched files not in the manifest are numbered after the playlist.
+    """
+    numbered, seen = [], set()
+    videos = manifest.get("videos", [])
+    for i, v in enumerate(videos, 1):
+        path = ENRICHED_DIR / f"{v.get('id')}.json"
+        if v.get("id") and path.exists():
+            numbered.append((i, path))
+            seen.add(path.name)
+    extra = [p for p in sorted(ENRICHED_DIR.glob("*.json")) if p.name not in seen]
+    numbered.extend((len(videos) + n, p) for n, p in enumerate(extra, 1))
+    return numbered
+
+
+def run_obsidian_agent(manifest: dict | None = None) -> dict:
+    """
+    Write Obsidian notes for each enriched video and a MOC index.
+    If OBSIDIAN_VAULT_PATH is set to a real path, writes there; otherwise writes to ./data/obsidian_export/
+    so you get all markdown files without needing Obsidian. You can open that folder in Obsidian later if you want.
+    """
+    logger = setup_logger()
+    out_dir = resolve_out_dir(logger)
 
     if manifest is None:
         if not MANIFEST_PATH.exists():
@@ -77,15 +266,28 @@ def run_obsidian_agent(manifest: dict | None = None) -> dict:
     notebooklm_subdir = out_dir / "notebooklm"
     notebooklm_subdir.mkdir(parents=True, exist_ok=True)
 
-    # Copy NotebookLM artifacts into vault subfolder if they exist
+    # Copy NotebookLM artifacts into vault subfolder if they exist (unchanged files are left untouched)
+    publish = {"artifacts_written": 0, "artifacts_unchanged": 0, "artifact_bytes_written": 0,
+               "artifact_bytes_skipped": 0}
+    hardlink = os.environ.get("OBSIDIAN_ARTIFACT_HARDLINK", "").strip().lower() in ("1", "true", "yes")
     for name in ["podcast.mp3", "mindmap.json", "quiz.json", "flashcards.json"]:
         src = NOTEBOOKLM_OUTPUTS / name
         if src.exists():
             dest = notebooklm_subdir / name
             try:
-                dest.write_bytes(src.read_bytes())
+                method, size = publish_file(src, dest, hardlink=hardlink)
             except Exception as e:
                 logger.warning("Could not copy %s: %s", name, e)
+                continue
+            if method == "unchanged":
+                publish["artifacts_unchanged"] += 1
+                publish["artifact_bytes_skipped"] += size
+            else:
+                publish["artifacts_written"] += 1
+                publish["artifact_bytes_written"] += size
+                publish[f"artifacts_via_{method}"] = publish.get(f"artifacts_via_{method}", 0) + 1
+                logger.info("Published %s (%d bytes, %s)", name, size, method)
+    record_stats("obsidian", **publish)
 
     # Write a readable "NotebookLM Artifacts" note explaining how to use each file + mind map outline
     try:
@@ -119,13 +321,30 @@ def run_obsidian_agent(manifest: dict | None = None) -> dict:
                 artifact_note_lines.append("*Could not parse mindmap.json.*")
         else:
             artifact_note_lines.append("*Run the NotebookLM step to generate the mind map.*")
-        (notebooklm_subdir / "NotebookLM Artifacts.md").write_text(
-            "\n".join(artifact_note_lines), encoding="utf-8"
-        )
+        publish_bytes("\n".join(artifact_note_lines).encode("utf-8"), notebooklm_subdir / "NotebookLM Artifacts.md")
     except Exception as e:
         logger.warning("Could not write NotebookLM Artifacts note: %s", e)
 
-    enriched_files = list(ENRICHED_DIR.glob("*.json"))
+    enriched_files = _numbered_enriched_files(manifest)
+    # Only rewrite notes that are stale: enriched JSON or related videos changed, formatter/playlist/notebook
+    # id changed, note renumbered, or the file is gone.
+    store = get_state_store()
+    recipe = note_recipe(playlist_title, notebook_id)
+    store.adopt("obsidian", recipe, after="related")
+    view = store.stage_view("obsidian", after="related")
+    links = related_links(manifest)
+    rows = {r["video_id"]: r for r in view}
+    stale = plan_stage(view, recipe)
+    # Concept index: re-read only enriched records that changed; a note is also stale when one of its
+    # wikilinks now resolves to a different concept name.
+    concept_index = get_concept_index()
+    concept_stats = concept_index.update(corpus.get_corpus())
+    concepts = concept_index.concepts()
+    canonical = concept_index.canonical_map(concepts)
+    relinked = {v for v, (now, written) in concept_index.note_digests(canonical).items() if now != written}
+    notes_written = notes_fresh = 0
+    unreadable = set()
+
     from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
     from rich.console import Console
     console = Console()
@@ -138,43 +357,35 @@ def run_obsidian_agent(manifest: dict | None = None) -> dict:
         console=console,
     ) as progress:
         task = progress.add_task("Writing Obsidian notes...", total=len(enriched_files))
-        for i, path in enumerate(sorted(enriched_files), 1):
+        for i, path in enriched_files:
+            row = rows.get(path.stem)
+            if (
+                row and path.stem not in stale and path.stem not in relinked
+                and row["output_path"] == str(out_dir / safe_filename(i, row["title"] or "Unknown"))
+            ):
+                notes_fresh += 1
+                progress.advance(task)
+                continue
             try:
-                data = json.loads(path.read_text(encoding="utf-8"))
+                # From the packed corpus when it holds the enriched version the state store expects.
+                data = corpus.load_enriched(path.stem, row["expected_input"] if row else None, path)
             except Exception as e:
                 logger.warning("Skip %s: %s", path.name, e)
+                unreadable.add(path.stem)
                 progress.advance(task)
                 continue
 
-            title = data.get("title", "Unknown")
-            video_id = data.get("video_id", "")
-            url = data.get("url", f"https://www.youtube.com/watch?v={video_id}")
-            uploader = data.get("uploader", "")
-            duration_raw = data.get("duration", 0)
-            duration = str(duration_raw) if isinstance(duration_raw, (int, float)) else duration_raw
-            if isinstance(duration_raw, (int, float)) and duration_raw:
-                m, s = divmod(int(duration_raw), 60)
-                duration = f"{m}:{s:02d}"
-            upload_date = data.get("upload_date", "")
-            gemini_notes = data.get("gemini_notes", "")
-
-            body = format_note(
-                title=title,
-                playlist_title=playlist_title,
-                url=url,
-                video_id=video_id,
-                uploader=uploader,
-                upload_date=upload_date,
-                duration=duration,
-                notebook_id=notebook_id,
-                gemini_notes=gemini_notes,
-                playlist_slug=playlist_slug,
+            write_video_note(
+                data, i, out_dir, playlist_title, notebook_id, playlist_slug, links.get(path.stem), canonical
             )
-            filename = safe_filename(i, title)
-            note_path = out_dir / filename
-            note_path.write_text(body, encoding="utf-8")
+            notes_written += 1
             progress.advance(task)
 
+    record_stats("obsidian", notes_written=notes_written, notes_fresh=notes_fresh)
+    names = note_names(manifest.get("videos", []))
+    concept_stats.update(write_concept_notes(out_dir, concepts, names, playlist_title, concept_index))
+    record_stats("concepts", concepts=len(concepts), **concept_stats)
+
     # MOC index note
     index_lines = [
         "# " + playlist_title + " — Index",
@@ -184,14 +395,16 @@ def run_obsidian_agent(manifest: dict | None = None) -> dict:
         "## Videos",
         "",
     ]
-    for i, path in enumerate(sorted(enriched_files), 1):
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-            title = data.get("title", "Unknown")
-            filename = safe_filename(i, title)
-            index_lines.append(f"- ✅ [[{filename.replace('.md', '')}|{i}. {title}]]")
-        except Exception:
+    # Titles from the state store (the manifest for videos it does not know), not by re-reading every record.
+    titles = {v.get("id"): v.get("title") for v in manifest.get("videos", [])}
+    titles.update((video_id, row["title"]) for video_id, row in rows.items() if row["title"])
+    for i, path in enriched_files:
+        if path.stem in unreadable:
             index_lines.append(f"- ❌ {i}. (read error)")
+            continue
+        title = titles.get(path.stem) or "Unknown"
+        filename = safe_filename(i, title)
+        index_lines.append(f"- ✅ [[{filename.replace('.md', '')}|{i}. {title}]]")
     index_lines.extend([
         "",
         "## NotebookLM Artifacts",
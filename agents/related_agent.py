@@ -0,0 +1,105 @@
+"""
+Related videos: after enrichment, find each video's most similar videos (transcript + enriched sections,
+see utils/related.py) so its note can link to them under "## Related Videos".
+"""
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils import corpus, related
+from utils.deps import digest, source_hash
+from utils.logger import setup_logger
+from utils.note_formatter import note_names
+from utils.run_stats import record_stats
+from utils.state_store import get_state_store
+
+MANIFEST_PATH = corpus.DATA_DIR / "manifest.json"
+
+DEFAULT_RELATED_VIDEOS = 5
+DEFAULT_RELATED_MIN_SCORE = 0.1
+
+
+def _settings() -> tuple[int, float]:
+    """(neighbours per note, minimum cosine similarity) from RELATED_VIDEOS / RELATED_MIN_SCORE."""
+    k = max(1, int(os.environ.get("RELATED_VIDEOS", str(DEFAULT_RELATED_VIDEOS))))
+    return k, float(os.environ.get("RELATED_MIN_SCORE", str(DEFAULT_RELATED_MIN_SCORE)))
+
+
+def related_recipe() -> str:
+    """Hash of the similarity code and settings: changing either re-links every note."""
+    return digest(source_hash(related), source_hash(_video_text), *_settings())
+
+
+def _video_text(pack: corpus.CorpusPack, video_id: str) -> str:
+    """What a video is compared on: its title, transcript and enriched sections."""
+    enriched = pack.get("enriched", video_id) or {}
+    transcript = pack.get("transcript", video_id) or {}
+    sections = enriched.get("gemini_sections") or {}
+    return " ".join([enriched.get("title", ""), transcript.get("transcript", ""), *sections.values()])
+
+
+def related_links(manifest: dict, index: related.RelatedIndex | None = None) -> dict[str, list[tuple[str, str]]]:
+    """
+    {video id: [(note name, title)]} of each video's related notes, best first. Notes are named by
+    playlist position as in obsidian_agent, so the links match the files written there.
+    """
+    k, min_score = _settings()
+    notes = note_names(manifest.get("videos", []))
+    return {
+        video_id: [notes[other] for other, _ in neighbours if other in notes]
+        for video_id, neighbours in (index or related.RelatedIndex(k=k)).all_neighbours(min_score).items()
+    }
+
+
+def run_related_agent(manifest: dict | None = None) -> dict:
+    """
+    Update the related-videos index for every enriched playlist video and record, per video, a hash of
+    its neighbour list: a note is rewritten when its related videos change, not only when its own content does.
+    """
+    logger = setup_logger()
+    started = time.monotonic()
+    if manifest is None:
+        if not MANIFEST_PATH.exists():
+            raise FileNotFoundError(f"Manifest not found: {MANIFEST_PATH}. Run transcript agent first.")
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+
+    store = get_state_store()
+    pack = corpus.get_corpus()
+    hashes = pack.hashes()
+    view = [
+        row for row in store.stage_view("related", after="enrichment")
+        if row["upstream_status"] == "ok" and ("enriched", row["video_id"]) in hashes
+    ]
+    docs = {
+        row["video_id"]: (
+            digest(hashes.get(("transcript", row["video_id"])), hashes[("enriched", row["video_id"])]),
+            lambda video_id=row["video_id"]: _video_text(pack, video_id),
+        )
+        for row in view
+    }
+    k, _ = _settings()
+    index = related.RelatedIndex(k=k)
+    stats = index.update(docs)
+
+    links = related_links(manifest, index)
+    recipe = related_recipe()
+    relinked = 0
+    for row in view:
+        output_hash = digest(row["expected_input"], *links.get(row["video_id"], []))
+        if row["status"] == "ok" and row["recipe_hash"] == recipe and row["output_hash"] == output_hash:
+            continue
+        store.finish(
+            row["video_id"], "related", "ok",
+            input_hash=row["expected_input"], output_hash=output_hash, recipe_hash=recipe,
+        )
+        relinked += 1
+
+    record_stats("related", **stats, notes_relinked=relinked, elapsed_seconds=round(time.monotonic() - started, 2))
+    logger.info(
+        "Related videos: %d indexed, %d vectorized, %d note(s) to relink", len(docs), stats["vectorized"], relinked
+    )
+    return manifest
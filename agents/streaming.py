@@ -0,0 +1,198 @@
+"""
+Streaming mode: each video goes transcript → enrichment → note as soon as it is ready.
+Stages are connected by bounded queues, so a slow stage holds back the one before it instead of
+buffering the whole playlist. Related-video linking and NotebookLM need the whole playlist, so they are
+not part of the stream; pipeline.py runs them afterwards.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from agents.gemini_agent import ENRICHED_DIR, enrich_from_queue, enrichment_recipe
+from agents.obsidian_agent import _playlist_slug, note_recipe, resolve_out_dir, write_video_note
+from agents.related_agent import related_links, related_recipe
+from agents.transcript_agent import DATA_DIR, MANIFEST_PATH, iter_transcripts, load_playlist, pending_entries
+from utils import corpus
+from utils.concept_index import get_concept_index
+from utils.deps import plan_stage
+from utils.llm_providers import configured_provider
+from utils.logger import setup_logger
+from utils.run_stats import record_stats
+from utils.state_store import get_state_store
+
+DEFAULT_STREAM_QUEUE_SIZE = 8
+
+_DONE = None  # end-of-stream marker on both queues
+
+
+def _downstream_stale(store, playlist_title: str, notebook_id: str) -> set[str]:
+    """Videos whose enrichment or note would be rebuilt, judged without building an LLM client."""
+    provider, model = configured_provider()
+    recipe = enrichment_recipe(provider, model)
+    store.adopt("enrichment", recipe, after="transcripts")
+    enrich = plan_stage(store.stage_view("enrichment", "transcripts"), recipe)
+    relink = plan_stage(store.stage_view("related", "enrichment"), related_recipe(), set(enrich))
+    notes = plan_stage(store.stage_view("obsidian", "related"), note_recipe(playlist_title, notebook_id), set(relink))
+    return set(enrich) | set(notes)
+
+
+def run_streaming_pipeline(
+    resume: bool = False,
+    transcript_workers: int | None = None,
+    enrichment_concurrency: int | None = None,
+    sync: bool = False,
+    budget_usd: float | None = None,
+    max_tokens: int | None = None,
+) -> dict:
+    """
+    Run transcripts, enrichment and note writing concurrently:
+    a transcript thread feeds queue 1, an asyncio enrichment engine drains it into queue 2, and this
+    thread writes each enriched video's note. Both queues hold at most STREAM_QUEUE_SIZE videos.
+    With resume or sync, only videos with a stale artifact enter the stream (see utils/deps.py): stale
+    transcripts are re-fetched, and videos whose transcript is fresh but whose enrichment or note is stale
+    join the stream at the enrichment stage. A budget (budget_usd / max_tokens) caps enrichment in arrival order.
+    Writes data/manifest.json (in playlist order) at the end and returns it.
+    """
+    logger = setup_logger()
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+
+    _, entries, playlist_title = load_playlist()
+    store = get_state_store()
+    notebook_id = store.get_meta("notebooklm_notebook_id") or ""
+    incremental = resume or sync
+    fetch = list(enumerate(entries))
+    ready: list[tuple[int, dict]] = []  # (playlist position, record) that skip the transcript stage
+    if incremental:
+        fetch = pending_entries(entries)
+        fetch_ids = {e["id"] for _, e in fetch}
+        downstream = _downstream_stale(store, playlist_title, notebook_id)
+        records = {v["id"]: v for v in store.to_manifest()["videos"]}
+        ready = [
+            (i, {**records[e["id"]], "status": "ok"})
+            for i, e in enumerate(entries)
+            if e.get("id") in downstream and e["id"] not in fetch_ids and e["id"] in records
+        ]
+        logger.info("%d video(s) need transcripts, %d more need enrichment or notes", len(fetch), len(ready))
+    positions = [i for i, _ in fetch]
+    fetch_entries = [e for _, e in fetch]
+    note_recipe_hash = note_recipe(playlist_title, notebook_id)
+    related_recipe_hash = related_recipe()
+    # Streamed notes use the related videos and concept names known so far; the obsidian stage after the
+    # stream rewrites the ones that changed.
+    links = related_links(store.to_manifest())
+    canonical = get_concept_index().canonical_map()
+
+    queue_size = max(1, int(os.environ.get("STREAM_QUEUE_SIZE", str(DEFAULT_STREAM_QUEUE_SIZE))))
+    transcripts_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    enriched_q: queue.Queue = queue.Queue(maxsize=queue_size)
+    errors: list[BaseException] = []
+    transcripts_done = threading.Event()
+
+    def _next_transcript():
+        item = transcripts_q.get()
+        if item is _DONE:
+            transcripts_done.set()
+        return item
+
+    def _transcripts() -> None:
+        try:
+            for item in ready:
+                transcripts_q.put(item)
+            # Anything left to fetch is stale, so an old transcript file must not short-circuit it.
+            for i, record in iter_transcripts(fetch_entries, playlist_title, False, transcript_workers, logger):
+                transcripts_q.put((positions[i], record))
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            transcripts_q.put(_DONE)
+
+    def _enrichment() -> None:
+        try:
+            asyncio.run(
+                enrich_from_queue(
+                    _next_transcript,
+                    lambda i, v: enriched_q.put((i, v)),
+                    resume=incremental,
+                    concurrency=enrichment_concurrency,
+                    logger=logger,
+                    budget_usd=budget_usd,
+                    max_tokens=max_tokens,
+                )
+            )
+        except BaseException as e:
+            errors.append(e)
+            # Keep draining so the transcript thread is never left blocked on a full queue.
+            while not transcripts_done.is_set():
+                _next_transcript()
+        finally:
+            enriched_q.put(_DONE)
+
+    threads = [
+        threading.Thread(target=_transcripts, name="stream-transcripts", daemon=True),
+        threading.Thread(target=_enrichment, name="stream-enrichment", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    out_dir = resolve_out_dir(logger)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    playlist_slug = _playlist_slug(playlist_title)
+    notes_written = 0
+    first_note = None
+
+    from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
+    from rich.console import Console
+    console = Console()
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total}"),
+        console=console,
+    ) as progress:
+        task = progress.add_task("Streaming videos to notes...", total=len(fetch) + len(ready))
+        while (item := enriched_q.get()) is not _DONE:
+            i, v = item
+            enriched_path = ENRICHED_DIR / f"{v.get('id')}.json"
+            relink = plan_stage(store.stage_view("related", "enrichment", v.get("id")), related_recipe_hash)
+            fresh = incremental and not plan_stage(
+                store.stage_view("obsidian", "related", v.get("id")), note_recipe_hash, set(relink)
+            )
+            if v.get("status") != "failed" and enriched_path.exists() and not fresh:
+                try:
+                    enriched_row = store.get_status(v["id"], "enrichment") or {}
+                    data = corpus.load_enriched(v["id"], enriched_row.get("output_hash"), enriched_path)
+                    write_video_note(
+                        data, i + 1, out_dir, playlist_title, notebook_id, playlist_slug, links.get(v["id"]), canonical
+                    )
+                    notes_written += 1
+                    first_note = first_note or time.monotonic()
+                except Exception as e:
+                    logger.warning("Could not write note for %s: %s", v.get("id"), e)
+            progress.advance(task)
+
+    for t in threads:
+        t.join()
+
+    # Statuses were committed per video as they happened; the manifest is just the exported view.
+    manifest = store.export_manifest(MANIFEST_PATH)
+
+    record_stats(
+        "stream",
+        queue_size=queue_size,
+        notes_written=notes_written,
+        time_to_first_note_seconds=round(first_note - started, 1) if first_note else None,
+        elapsed_seconds=round(time.monotonic() - started, 1),
+    )
+    if errors:
+        raise errors[0]
+    logger.info("Streaming pipeline finished. Manifest: %s", MANIFEST_PATH)
+    return manifest
@@ -1,17 +1,27 @@
 """YouTube playlist transcript extraction using yt-dlp. Greek (el) first, then en fallback."""
+import hashlib
 import json
 import os
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 from dotenv import load_dotenv
+import httpx
 import yt_dlp
 
 load_dotenv()
 
-from utils.vtt_cleaner import clean_vtt
+from utils import corpus, vtt_cleaner
+from utils.deps import digest, plan_stage, source_hash
+from utils.vtt_cleaner import parse_vtt
 from utils.logger import setup_logger, log_failure
+from utils.near_dup import get_near_dup_index
+from utils.rate_limit import TokenBucket
+from utils.run_stats import get_run_stats, increment_stat, record_stats
+from utils.state_store import file_sha256, get_state_store
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 TRANSCRIPTS_DIR = DATA_DIR / "transcripts"
@@ -20,6 +30,62 @@ MANIFEST_PATH = DATA_DIR / "manifest.json"
 # One language per request to avoid 429 (YouTube rate-limits multi-lang subtitle fetches)
 SUBTITLE_LANGS_ORDER = ["el", "en", "en-US"]
 
+# "memory": stream the chosen caption track over a pooled HTTP client straight into parse_vtt.
+# "tempfile": let yt-dlp write the .vtt to a temp dir and read it back (also the fallback for "memory").
+DEFAULT_FETCH_MODE = "memory"
+
+DEFAULT_TRANSCRIPT_WORKERS = 4
+RATE_LIMIT_PAUSE_SECONDS = 90  # whole pool backs off this long after a YouTube 429
+
+
+def _is_rate_limited(err: Exception) -> bool:
+    err_msg = str(err).lower()
+    return "429" in err_msg or "too many requests" in err_msg
+
+
+def _make_limiter() -> TokenBucket:
+    """
+    One limiter for the whole transcript stage. TRANSCRIPT_RPS is requests/second across all workers;
+    if unset, it is derived from the legacy TRANSCRIPT_DELAY_SECONDS (one request per delay).
+    """
+    rps_env = os.environ.get("TRANSCRIPT_RPS", "").strip()
+    if rps_env:
+        rps = float(rps_env)
+    else:
+        delay = float(os.environ.get("TRANSCRIPT_DELAY_SECONDS", "3"))
+        rps = 1.0 / delay if delay > 0 else 0.0
+    burst = int(os.environ.get("TRANSCRIPT_BURST", "2"))
+    return TokenBucket(rps, burst)
+
+
+_http_client: httpx.Client | None = None
+_http_client_lock = threading.Lock()
+
+
+def _get_http_client() -> httpx.Client:
+    """Process-wide pooled client so caption downloads reuse connections across videos and workers."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=httpx.Timeout(30.0),
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+                follow_redirects=True,
+            )
+        return _http_client
+
+
+def _fetch_subtitle_in_memory(
+    track: dict, http_headers: dict | None, auto_captions: bool
+) -> tuple[str, list[dict]]:
+    """Download a resolved caption track and parse it cue by cue as it streams in; nothing touches disk."""
+    if track.get("data"):
+        return parse_vtt(track["data"], auto_captions)
+    headers = {**(http_headers or {}), **(track.get("http_headers") or {})}
+    with _get_http_client().stream("GET", track["url"], headers=headers) as response:
+        response.raise_for_status()
+        return parse_vtt(response.iter_lines(), auto_captions)
+
 
 def _get_playlist_info(playlist_url: str) -> tuple[list[dict], str]:
     """Fetch playlist metadata and video list (no download). Use in_playlist so entries is a list."""
@@ -36,76 +102,371 @@ def _get_playlist_info(playlist_url: str) -> tuple[list[dict], str]:
     return entries, playlist_title
 
 
-def _download_subs_for_video(video_id: str, video_url: str, out_dir: Path, logger=None) -> str | None:
-    """Try one language at a time (el then en) to reduce 429. Retries once on 429."""
+# Flat-listing fields that change when a video is re-uploaded or edited; view counts etc. are left out
+# so a daily sync does not see every video as changed.
+FINGERPRINT_FIELDS = ("title", "duration", "timestamp", "release_timestamp", "live_status", "availability")
+
+
+def playlist_fingerprint(entry: dict) -> str:
+    """Etag-like fingerprint of a flat playlist entry."""
+    values = [entry.get(k) for k in FINGERPRINT_FIELDS]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _keep_segments() -> bool:
+    """TRANSCRIPT_SEGMENTS=1 also stores timestamped caption segments in each transcript JSON."""
+    return os.environ.get("TRANSCRIPT_SEGMENTS", "").strip().lower() in ("1", "true", "yes")
+
+
+def transcript_recipe() -> str:
+    """Hash of the code/config that turns a caption track into transcript text."""
+    return digest(source_hash(vtt_cleaner), SUBTITLE_LANGS_ORDER, _keep_segments())
+
+
+def _pick_subtitle_lang(info: dict) -> str | None:
+    """
+    Choose the caption language from a probe result, walking SUBTITLE_LANGS_ORDER.
+    Within a language yt-dlp itself prefers uploaded subtitles over automatic captions.
+    """
+    available = set(info.get("subtitles") or {}) | set(info.get("automatic_captions") or {})
+    for lang in SUBTITLE_LANGS_ORDER:
+        if lang in available:
+            return lang
+    return None
+
+
+def _youtube_request(fn, video_id: str, limiter: TokenBucket | None, logger, counter: dict):
+    """Run one YouTube request under the shared limiter. On 429, pause the whole pool and retry once."""
+    for attempt in range(2):
+        if limiter is not None:
+            limiter.acquire()
+        counter["requests"] += 1
+        try:
+            return fn()
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == 1:
+                raise
+            increment_stat("transcripts", "rate_limit_hits")
+            if limiter is None:
+                time.sleep(RATE_LIMIT_PAUSE_SECONDS)
+            elif limiter.pause(RATE_LIMIT_PAUSE_SECONDS):
+                increment_stat("transcripts", "pool_pauses")
+                if logger:
+                    logger.warning(
+                        "Rate limited (429) on %s, pausing all workers for %ss",
+                        video_id, RATE_LIMIT_PAUSE_SECONDS,
+                    )
+
+
+def _download_subs_for_video(
+    video_id: str, video_url: str, out_dir: Path, logger=None, limiter: TokenBucket | None = None
+) -> tuple[str | None, list[dict], dict, int]:
+    """
+    One metadata probe (extract_info without processing) picks the best caption language from
+    `subtitles`/`automatic_captions`; the same YoutubeDL then fetches only that track, in memory by
+    default (TRANSCRIPT_FETCH_MODE=memory) with yt-dlp's temp-file download as the fallback.
+    Returns (transcript text or None, its timestamped segments, video info for metadata,
+    number of YouTube requests made).
+    """
     out_dir.mkdir(parents=True, exist_ok=True)
     out_tmpl = str(out_dir / video_id)
+    counter = {"requests": 0}
+    opts = {
+        "quiet": True,
+        "skip_download": True,
+        "ignore_no_formats_error": True,
+        "writeautomaticsub": True,
+        "writesubtitles": True,
+        "subtitlesformat": "vtt",
+        "outtmpl": out_tmpl,
+    }
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        try:
+            info = _youtube_request(
+                lambda: ydl.extract_info(video_url, download=False, process=False),
+                video_id, limiter, logger, counter,
+            ) or {}
+        except Exception as e:
+            if logger:
+                logger.warning("Probe failed for %s: %s", video_id, e)
+            return None, [], {}, counter["requests"]
 
-    def try_one_lang(lang: str) -> bool:
-        opts = {
-            "quiet": True,
-            "skip_download": True,
-            "writeautomaticsub": True,
-            "writesubtitles": True,
-            "subtitleslangs": [lang],
-            "subtitlesformat": "vtt",
-            "outtmpl": out_tmpl,
-        }
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            ydl.download([video_url])
-        return Path(out_tmpl + f".{lang}.vtt").exists() or Path(out_tmpl + ".vtt").exists()
+        lang = _pick_subtitle_lang(info)
+        if lang is None:
+            return None, [], info, counter["requests"]
 
-    got_subs = False
-    for lang in SUBTITLE_LANGS_ORDER:
-        for attempt in range(2):
+        # yt-dlp takes uploaded subtitles over automatic captions for the same language; only the
+        # latter roll over from cue to cue and need their overlaps collapsed.
+        auto_captions = lang not in (info.get("subtitles") or {})
+        ydl.params["subtitleslangs"] = [lang]
+        fetch_mode = os.environ.get("TRANSCRIPT_FETCH_MODE", DEFAULT_FETCH_MODE).strip().lower()
+        if fetch_mode == "memory":
             try:
-                if try_one_lang(lang):
-                    got_subs = True
-                    break
-                break  # no subs for this lang, try next
+                # download=False only selects the track and resolves its URL; no network here.
+                resolved = ydl.process_ie_result(dict(info), download=False) or info
+                track = (resolved.get("requested_subtitles") or {}).get(lang) or {}
+                if track.get("url") or track.get("data"):
+                    text, segments = _youtube_request(
+                        lambda: _fetch_subtitle_in_memory(track, resolved.get("http_headers"), auto_captions),
+                        video_id, limiter, logger, counter,
+                    )
+                    resolved["subtitle_lang"] = lang
+                    resolved["subtitle_kind"] = "auto" if auto_captions else "manual"
+                    increment_stat("transcripts", "in_memory_fetches")
+                    return text, segments, resolved, counter["requests"]
             except Exception as e:
-                err_msg = str(e).lower()
-                if "429" in err_msg or "too many requests" in err_msg:
-                    if attempt == 0 and logger:
-                        logger.warning("Rate limited (429), waiting 90s then retrying for %s", video_id)
-                    time.sleep(90)
-                    continue
-                break
-        else:
-            continue
-        if got_subs:
-            break
-    if not got_subs:
-        return None
-
-    for ext in [".el.vtt", ".en.vtt", ".en-US.vtt", ".vtt"]:
+                if logger:
+                    logger.warning("In-memory subtitle fetch failed for %s, using temp file: %s", video_id, e)
+
+        try:
+            # Processing fills derived fields (e.g. upload_date from timestamp) on top of the probe.
+            info = _youtube_request(
+                lambda: ydl.process_ie_result(dict(info), download=True),
+                video_id, limiter, logger, counter,
+            ) or info
+        except Exception as e:
+            if logger:
+                logger.warning("Subtitle fetch failed for %s (%s): %s", video_id, lang, e)
+            return None, [], info, counter["requests"]
+        increment_stat("transcripts", "tempfile_fetches")
+
+    info["subtitle_lang"] = lang
+    info["subtitle_kind"] = "auto" if auto_captions else "manual"
+    for ext in [f".{lang}.vtt", ".vtt"]:
         vtt_path = Path(out_tmpl + ext)
         if vtt_path.exists():
-            return clean_vtt(vtt_path.read_text(encoding="utf-8", errors="replace"))
-    return None
+            text, segments = parse_vtt(vtt_path.read_text(encoding="utf-8", errors="replace"), auto_captions)
+            vtt_path.unlink(missing_ok=True)  # don't let .vtt files pile up on long playlists
+            return text, segments, info, counter["requests"]
+    return None, [], info, counter["requests"]
 
 
-def run_transcript_agent(resume: bool = False) -> dict:
-    """
-    Extract transcripts for all playlist videos. Save JSON per video and manifest.
-    If resume=True, skip videos that already have a transcript JSON.
-    Returns manifest dict (videos, playlist_title, status per video).
-    """
-    logger = setup_logger()
+def _process_entry(
+    entry: dict,
+    playlist_title: str,
+    resume: bool,
+    tmp_dir: Path,
+    limiter: TokenBucket,
+    logger,
+) -> dict:
+    """Extract one playlist entry's transcript and return its manifest record. Safe to run in a worker thread."""
+    video_id = entry.get("id") or entry.get("url", "").split("?v=")[-1].split("&")[0]
+    if not video_id:
+        return {"id": None, "title": "?", "status": "failed", "reason": "no_id"}
+
+    title = entry.get("title") or "Unknown"
+    video_url = entry.get("url") or f"https://www.youtube.com/watch?v={video_id}"
+    transcript_path = corpus.transcript_path(video_id)
+
+    if resume and transcript_path.exists():
+        try:
+            corpus.read_record(transcript_path)
+            return {
+                "id": video_id,
+                "title": title,
+                "url": video_url,
+                "status": "ok",
+                "transcript_path": str(transcript_path),
+            }
+        except Exception:
+            return {
+                "id": video_id,
+                "title": title,
+                "url": video_url,
+                "status": "failed",
+                "reason": "resume_read_error",
+            }
+
+    get_state_store().begin(video_id, "transcripts")
+    transcript_text, segments, full_info, yt_requests = _download_subs_for_video(
+        video_id, video_url, tmp_dir, logger, limiter
+    )
+    increment_stat("transcripts", "youtube_requests", yt_requests)
+    increment_stat("transcripts", "videos_fetched")
+    if transcript_text is None or not transcript_text.strip():
+        log_failure(logger, video_id, "no subtitles available")
+        return {
+            "id": video_id,
+            "title": title,
+            "url": video_url,
+            "status": "failed",
+            "reason": "no_subtitles",
+            "youtube_requests": yt_requests,
+        }
+
+    payload = {
+        "video_id": video_id,
+        "title": title,
+        "url": video_url,
+        "transcript": transcript_text,
+        "playlist_title": playlist_title,
+        "uploader": full_info.get("uploader") or "",
+        "duration": full_info.get("duration") or 0,
+        "upload_date": full_info.get("upload_date") or "",
+        "subtitle_lang": full_info.get("subtitle_lang") or "",
+        "subtitle_kind": full_info.get("subtitle_kind") or "",
+    }
+    if _keep_segments():
+        payload["segments"] = segments
+    try:
+        transcript_path = corpus.save_transcript(video_id, payload)
+        return {
+            "id": video_id,
+            "title": title,
+            "url": video_url,
+            "status": "ok",
+            "transcript_path": str(transcript_path),
+            "youtube_requests": yt_requests,
+        }
+    except Exception as e:
+        log_failure(logger, video_id, str(e))
+        return {
+            "id": video_id,
+            "title": title,
+            "url": video_url,
+            "status": "failed",
+            "reason": str(e),
+        }
+
+
+def load_playlist() -> tuple[str, list[dict], str]:
+    """(PLAYLIST_URL, flat playlist entries, playlist title) — one request, no per-video work."""
     playlist_url = os.environ.get("PLAYLIST_URL", "").strip()
     if not playlist_url:
         raise ValueError("PLAYLIST_URL is not set in environment")
+    entries, playlist_title = _get_playlist_info(playlist_url)
+    fingerprints = {e["id"]: playlist_fingerprint(e) for e in entries if e.get("id")}
+    diff = get_state_store().sync_playlist(playlist_url, playlist_title, entries, fingerprints)
+    record_stats("playlist", **{k: len(ids) for k, ids in diff.items()})
+    if diff["removed"]:
+        setup_logger().info("%d video(s) left the playlist: %s", len(diff["removed"]), ", ".join(diff["removed"]))
+    return playlist_url, entries, playlist_title
+
+
+def pending_entries(entries: list[dict]) -> list[tuple[int, dict]]:
+    """
+    (playlist position, entry) for videos whose transcript must be (re)built: newly added, changed since
+    the last snapshot, never successfully fetched, made by different cleaning code, or missing on disk.
+    """
+    store = get_state_store()
+    recipe = transcript_recipe()
+    store.adopt("transcripts", recipe)
+    stale = plan_stage(store.stage_view("transcripts"), recipe)
+    return [(i, e) for i, e in enumerate(entries) if e.get("id") in stale]
+
+
+def _save_record(record: dict, entry: dict) -> None:
+    """Persist one finished manifest record as its video row + "transcripts" stage row (with its dependencies)."""
+    video_id = record.get("id")
+    if not video_id:
+        return
+    store = get_state_store()
+    fields = {k: v for k, v in record.items() if k in ("transcript_path", "youtube_requests")}
+    store.upsert_video(video_id, record.get("title"), record.get("url"), **fields)
+    transcript_path = record.get("transcript_path")
+    store.finish(
+        video_id, "transcripts", record["status"], record.get("reason"),
+        input_hash=playlist_fingerprint(entry),
+        output_hash=file_sha256(transcript_path) if transcript_path else None,
+        recipe_hash=transcript_recipe(),
+        output_path=transcript_path,
+    )
 
+
+def iter_transcripts(
+    entries: list[dict],
+    playlist_title: str,
+    resume: bool = False,
+    workers: int | None = None,
+    logger=None,
+):
+    """
+    Yield (playlist index, manifest record) for each entry as soon as its transcript is done.
+    At most `workers` videos are in flight (default TRANSCRIPT_WORKERS or 4), all sharing one token-bucket
+    limiter (TRANSCRIPT_RPS). New videos are only started as results are consumed, so a slow consumer
+    applies backpressure instead of letting finished transcripts pile up.
+    """
+    logger = logger or setup_logger()
+    if workers is None:
+        workers = int(os.environ.get("TRANSCRIPT_WORKERS", str(DEFAULT_TRANSCRIPT_WORKERS)))
+    workers = max(1, workers)
     TRANSCRIPTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp())
+    limiter = _make_limiter()
+    started = time.monotonic()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+            queue = iter(enumerate(entries))
+
+            def submit_next() -> None:
+                for i, entry in queue:
+                    pending[pool.submit(_process_entry, entry, playlist_title, resume, tmp_dir, limiter, logger)] = i
+                    return
+
+            for _ in range(workers):
+                submit_next()
+            while pending:
+                future = next(as_completed(pending))
+                i = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    entry = entries[i]
+                    video_id = entry.get("id")
+                    log_failure(logger, video_id or "?", str(e))
+                    record = {
+                        "id": video_id,
+                        "title": entry.get("title") or "Unknown",
+                        "url": entry.get("url") or "",
+                        "status": "failed",
+                        "reason": str(e),
+                    }
+                _save_record(record, entries[i])
+                yield i, record
+                submit_next()
+    finally:
+        # Cleanup temp dir
+        try:
+            for f in tmp_dir.glob("*"):
+                f.unlink(missing_ok=True)
+            tmp_dir.rmdir()
+        except Exception:
+            pass
+
+    fetched = get_run_stats().get("transcripts", {})
+    if fetched.get("videos_fetched"):
+        record_stats(
+            "transcripts",
+            youtube_requests_per_video=round(fetched["youtube_requests"] / fetched["videos_fetched"], 2),
+        )
+    record_stats(
+        "transcripts",
+        workers=workers,
+        requests_per_second_limit=limiter.rate,
+        elapsed_seconds=round(time.monotonic() - started, 1),
+    )
+
+
+def run_transcript_agent(resume: bool = False, workers: int | None = None, sync: bool = False) -> dict:
+    """
+    Extract transcripts for all playlist videos. Save JSON per video and manifest.
+    If resume=True, only videos whose transcript is stale are fetched (see pending_entries).
+    Videos are fetched by a pool of `workers` threads (default TRANSCRIPT_WORKERS or 4) sharing one
+    token-bucket limiter (TRANSCRIPT_RPS); manifest order always follows the playlist.
+    Each video's status is committed to the state store as soon as it finishes; data/manifest.json is
+    exported from the store at the end.
+    With sync=True the same applies; either way, fresh transcripts are left untouched, not even re-read.
+    Returns manifest dict (videos, playlist_title, status per video).
+    """
+    logger = setup_logger()
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-    entries, playlist_title = _get_playlist_info(playlist_url)
-    manifest = {
-        "playlist_url": playlist_url,
-        "playlist_title": playlist_title,
-        "videos": [],
-    }
-    tmp_dir = Path(tempfile.mkdtemp())
+    _, entries, playlist_title = load_playlist()
+    if resume or sync:
+        entries = [e for _, e in pending_entries(entries)]
+        logger.info("%d video(s) need transcripts", len(entries))
 
     from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
     from rich.console import Console
@@ -119,104 +480,14 @@ def run_transcript_agent(resume: bool = False) -> dict:
         console=console,
     ) as progress:
         task = progress.add_task("Extracting transcripts...", total=len(entries))
-        for i, entry in enumerate(entries):
-            video_id = entry.get("id") or entry.get("url", "").split("?v=")[-1].split("&")[0]
-            if not video_id:
-                manifest["videos"].append({"id": None, "title": "?", "status": "failed", "reason": "no_id"})
-                progress.advance(task)
-                continue
-
-            title = entry.get("title") or "Unknown"
-            video_url = entry.get("url") or f"https://www.youtube.com/watch?v={video_id}"
-            transcript_path = TRANSCRIPTS_DIR / f"{video_id}.json"
-
-            if resume and transcript_path.exists():
-                try:
-                    data = json.loads(transcript_path.read_text(encoding="utf-8"))
-                    manifest["videos"].append({
-                        "id": video_id,
-                        "title": title,
-                        "url": video_url,
-                        "status": "ok",
-                        "transcript_path": str(transcript_path),
-                    })
-                except Exception:
-                    manifest["videos"].append({
-                        "id": video_id,
-                        "title": title,
-                        "url": video_url,
-                        "status": "failed",
-                        "reason": "resume_read_error",
-                    })
-                progress.advance(task)
-                continue
-
-            transcript_text = _download_subs_for_video(video_id, video_url, tmp_dir, logger)
-            if transcript_text is None or not transcript_text.strip():
-                log_failure(logger, video_id, "no subtitles available")
-                manifest["videos"].append({
-                    "id": video_id,
-                    "title": title,
-                    "url": video_url,
-                    "status": "failed",
-                    "reason": "no_subtitles",
-                })
-                progress.advance(task)
-                delay = float(os.environ.get("TRANSCRIPT_DELAY_SECONDS", "3"))
-                if delay > 0:
-                    time.sleep(delay)
-                continue
-
-            # Get full metadata for this video for duration, uploader, etc.
-            try:
-                ydl_opts = {"quiet": True}
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    full_info = ydl.extract_info(video_url, download=False)
-            except Exception:
-                full_info = {}
-
-            payload = {
-                "video_id": video_id,
-                "title": title,
-                "url": video_url,
-                "transcript": transcript_text,
-                "playlist_title": playlist_title,
-                "uploader": full_info.get("uploader") or "",
-                "duration": full_info.get("duration") or 0,
-                "upload_date": full_info.get("upload_date") or "",
-            }
-            try:
-                transcript_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
-                manifest["videos"].append({
-                    "id": video_id,
-                    "title": title,
-                    "url": video_url,
-                    "status": "ok",
-                    "transcript_path": str(transcript_path),
-                })
-            except Exception as e:
-                log_failure(logger, video_id, str(e))
-                manifest["videos"].append({
-                    "id": video_id,
-                    "title": title,
-                    "url": video_url,
-                    "status": "failed",
-                    "reason": str(e),
-                })
+        # Only stale videos are left at this point; those must be re-fetched even if an old file is there.
+        for _ in iter_transcripts(entries, playlist_title, False, workers, logger):
             progress.advance(task)
-            # Delay between videos to avoid YouTube 429 rate limit
-            delay = float(os.environ.get("TRANSCRIPT_DELAY_SECONDS", "3"))
-            if delay > 0:
-                time.sleep(delay)
 
-    # Cleanup temp dir
-    try:
-        for f in tmp_dir.glob("*"):
-            f.unlink(missing_ok=True)
-        tmp_dir.rmdir()
-    except Exception:
-        pass
+    # Fingerprint new and changed transcripts so enrichment can reuse work for reuploads and mirrors.
+    record_stats("near_duplicates", **get_near_dup_index().update(corpus.get_corpus()))
 
-    MANIFEST_PATH.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    # The store orders videos by playlist position, so manifest order is deterministic regardless of worker timing.
+    manifest = get_state_store().export_manifest(MANIFEST_PATH)
     logger.info("Transcript agent finished. Manifest: %s", MANIFEST_PATH)
     return manifest
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Per-request latency and throughput of an LLM provider through the pooled async path.
+Defaults to the local mock provider, so it runs without keys or network:
+
+    python benchmarks/bench_llm_providers.py --provider mock --requests 200 --concurrency 16
+    python benchmarks/bench_llm_providers.py --provider openai --requests 20 --concurrency 4
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.llm_providers import PROVIDERS, get_provider
+
+
+async def _bench(provider, prompt: str, requests: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await provider.acomplete(prompt)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        await provider.aclose()
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("--provider", choices=sorted(PROVIDERS), default="mock")
+    p.add_argument("--requests", type=int, default=100)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--prompt", default="Reply with the single word: ok")
+    args = p.parse_args()
+
+    provider = get_provider(args.provider)
+    try:
+        elapsed = asyncio.run(_bench(provider, args.prompt, args.requests, args.concurrency))
+    finally:
+        provider.close()
+    stats = provider.latency_stats()
+    print(f"provider={provider.name} model={provider.model} requests={args.requests} concurrency={args.concurrency}")
+    print(f"wall={elapsed:.2f}s throughput={args.requests / elapsed:.1f} req/s")
+    for key, value in stats.items():
+        print(f"{key}={value}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
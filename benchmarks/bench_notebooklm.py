@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Wall time of NotebookLM artifact generation, one after another vs all at once, against the local fake backend.
+Job durations are NotebookLM-like (audio 20 min, others a few) multiplied by --scale; nothing leaves the machine:
+
+    python benchmarks/bench_notebooklm.py --scale 0.001
+    python benchmarks/bench_notebooklm.py --scale 0.001 --failure-rate 0.3 --artifacts audio,quiz
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from agents import notebooklm_agent
+from utils.notebooklm_client import FakeNotebookLMBackend
+
+
+async def _sequential(fake, notebook_id: str, artifacts: list[str], logger) -> list[dict]:
+    return [await notebooklm_agent._generate_artifact(fake, notebook_id, kind, logger) for kind in artifacts]
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("--scale", type=float, default=0.001, help="Multiplier on simulated job durations (default 0.001)")
+    p.add_argument("--failure-rate", type=float, default=0.0, help="Chance each job fails and is retried")
+    p.add_argument("--artifacts", default=None, help="Comma list (default all)")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    artifacts = notebooklm_agent.selected_artifacts(args.artifacts)
+    notebooklm_agent.ARTIFACT_RETRY_BACKOFF *= args.scale
+    notebooklm_agent.NOTEBOOKLM_OUTPUTS = Path(tempfile.mkdtemp(prefix="bench_notebooklm_"))
+    notebooklm_agent.NOTEBOOKLM_OUTPUTS.mkdir(parents=True, exist_ok=True)
+    logger = logging.getLogger("bench_notebooklm")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print(f"artifacts={','.join(artifacts)} scale={args.scale} failure_rate={args.failure_rate}")
+    for label, run in (("sequential", _sequential), ("concurrent", notebooklm_agent._generate_artifacts)):
+        fake = FakeNotebookLMBackend.scaled(args.scale, failure_rate=args.failure_rate, seed=args.seed)
+        started = time.perf_counter()
+        results = asyncio.run(run(fake, "bench", artifacts, logger))
+        elapsed = time.perf_counter() - started
+        ok = sum(r["status"] == "ok" for r in results)
+        attempts = sum(r["attempts"] for r in results)
+        print(f"{label}: wall={elapsed:.2f}s ok={ok}/{len(results)} attempts={attempts}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
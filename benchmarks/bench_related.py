@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Related-video index build time on a synthetic corpus: a full build, then an incremental update that adds
+and changes a few videos (only their rows are vectorized; only affected neighbour lists are searched again):
+
+    python benchmarks/bench_related.py --videos 10000 --words 2000
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.related import RelatedIndex
+
+
+def synthetic_corpus(videos: int, words: int, topics: int = 50, seed: int = 0) -> dict[str, str]:
+    """Texts drawn mostly from one of `topics` vocabularies, so every video has genuinely similar ones."""
+    rng = random.Random(seed)
+    vocab = [f"term{i:05d}" for i in range(topics * 200)]
+    texts = {}
+    for i in range(videos):
+        topic = vocab[(i % topics) * 200:(i % topics + 1) * 200]
+        texts[f"vid{i:06d}"] = " ".join(rng.choice(topic if rng.random() < 0.5 else vocab) for _ in range(words))
+    return texts
+
+
+def _docs(texts: dict[str, str]) -> dict:
+    return {video_id: (str(hash(text)), lambda text=text: text) for video_id, text in texts.items()}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("--videos", type=int, default=10000)
+    p.add_argument("--words", type=int, default=2000, help="words per synthetic transcript")
+    p.add_argument("--added", type=int, default=20, help="videos added (and changed) in the incremental step")
+    p.add_argument("--k", type=int, default=5)
+    args = p.parse_args()
+
+    texts = synthetic_corpus(args.videos, args.words)
+    path = Path(tempfile.mkdtemp()) / "related.npz"
+    for label in ("full", "incremental", "unchanged"):
+        if label == "incremental":
+            more = synthetic_corpus(args.added * 2, args.words, seed=1)
+            new = dict(list(more.items())[: args.added])
+            texts.update({f"new{i:06d}": text for i, text in enumerate(new.values())})
+            texts.update(zip(list(texts)[: args.added], list(more.values())[args.added:]))
+        started = time.perf_counter()
+        stats = RelatedIndex(path, k=args.k).update(_docs(texts))
+        elapsed = time.perf_counter() - started
+        print(
+            f"{label:<11} {elapsed:8.2f} s  videos={stats['videos']}  vectorized={stats['vectorized']}  "
+            f"rows_searched={stats['rows_searched']}"
+        )
+    print(f"index size: {path.stat().st_size / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Throughput, prompt tokens and lost words of the VTT cleaner against the previous line-by-line version.
+Tokens are compared with the raw cue text (every cue's payload, tags stripped), which is what rolling
+auto-captions put in the prompt without collapsing. Pass real auto-caption .vtt files (e.g. ones kept with
+TRANSCRIPT_FETCH_MODE=tempfile; --manual for uploaded subtitles); with none, synthetic auto-caption tracks
+are generated in both rolling styles (two-line roll-up and word-by-word growth), where the spoken words are
+known and dropped (or duplicated) words are counted too:
+
+    python benchmarks/bench_vtt_cleaner.py path/to/*.en.vtt
+    python benchmarks/bench_vtt_cleaner.py --cues 5000 --repeat 5
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.chunking import estimate_tokens
+from utils.vtt_cleaner import clean_vtt
+
+
+def legacy_clean_vtt(vtt_text: str) -> str:
+    """The cleaner before the cue parser: per-line regexes and a global seen-set of lines."""
+    seen = set()
+    result = []
+    for line in vtt_text.split("\n"):
+        line = line.strip()
+        if not line or line.startswith("WEBVTT") or "-->" in line or line.isdigit():
+            continue
+        line = re.sub(r"<[^>]+>", "", line)
+        line = re.sub(r"&amp;", "&", line)
+        line = re.sub(r"&#39;", "'", line)
+        if line and line not in seen:
+            seen.add(line)
+            result.append(line)
+    return " ".join(result)
+
+
+def _ts(seconds: float) -> str:
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+
+# Lines a speaker really says more than once; the legacy seen-set dropped every repeat after the first.
+STOCK_PHRASES = ["yes", "thank you so much", "okay so", "right right", "let me show you"]
+
+
+def synthetic_auto_captions(cues: int, style: str = "rollup", seed: int = 0) -> tuple[str, int]:
+    """
+    (VTT text, number of spoken words) of a synthetic auto-caption track. About one caption line in
+    twelve is a stock phrase the speaker repeats during the video.
+    "rollup": two-line cues where line 1 repeats the previous line, with inline word timings (YouTube).
+    "growing": each cue repeats the previous cue's text and adds a word or two (live/ASR exports).
+    """
+    rng = random.Random(seed)
+    vocab = [w.strip(".,") for w in (__doc__ or "").split() if w.isalpha()] + ["it's", "R&amp;D", "don&#39;t"]
+    out = ["WEBVTT", "Kind: captions", "Language: en", ""]
+    t, previous, spoken = 0.0, "", 0
+    for _ in range(cues):
+        if style == "growing":
+            line = previous if previous.count(" ") < 12 else ""
+            added = rng.choice(STOCK_PHRASES) if rng.random() < 1 / 12 else " ".join(
+                rng.choice(vocab) for _ in range(rng.randint(1, 2))
+            )
+            line = (line + " " + added).strip()
+            out += [f"{_ts(t)} --> {_ts(t + 0.8)}", line, ""]
+            previous, t, spoken = line, t + 0.8, spoken + len(added.split())
+            continue
+        if rng.random() < 1 / 12:
+            words = rng.choice(STOCK_PHRASES).split()
+        else:
+            words = [rng.choice(vocab) for _ in range(rng.randint(4, 9))]
+        spoken += len(words)
+        timed = words[0] + "".join(f"<{_ts(t + 0.3 * (i + 1))}><c> {w}</c>" for i, w in enumerate(words[1:]))
+        out += [f"{_ts(t)} --> {_ts(t + 2.5)} align:start position:0%", previous or " ", timed, ""]
+        previous = " ".join(words)
+        out += [f"{_ts(t + 2.5)} --> {_ts(t + 2.51)} align:start position:0%", previous, " ", ""]
+        t += 2.51
+    return "\n".join(out), spoken
+
+
+def _bench(fn, texts: list[str], repeat: int) -> tuple[float, list[str]]:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        outputs = [fn(t) for t in texts]
+        best = min(best, time.perf_counter() - started)
+    return best, outputs
+
+
+def _report(label: str, texts: list[str], repeat: int, auto_captions: bool, spoken: int | None = None) -> None:
+    size_mb = sum(len(t.encode("utf-8")) for t in texts) / 1e6
+    print(f"[{label}] files={len(texts)} input={size_mb:.2f} MB" + (f" spoken_words={spoken}" if spoken else ""))
+
+    raw = sum(estimate_tokens(clean_vtt(t)) for t in texts)
+    print(f"{'raw_cues':<11} {'':>20}  est_tokens={raw}")
+    results = {}
+    cleaners = (("legacy", legacy_clean_vtt), ("cue_parser", lambda t: clean_vtt(t, auto_captions=auto_captions)))
+    for name, fn in cleaners:
+        elapsed, outputs = _bench(fn, texts, repeat)
+        tokens = sum(estimate_tokens(o) for o in outputs)
+        words = sum(len(o.split()) for o in outputs)
+        results[name] = tokens
+        lost = f"  vs_spoken={words - spoken:+d} words" if spoken else ""
+        print(
+            f"{name:<11} {elapsed * 1000:8.1f} ms  {size_mb / elapsed:7.1f} MB/s  words={words}  "
+            f"est_tokens={tokens}{lost}"
+        )
+    if raw:
+        print(f"prompt tokens saved vs raw cue text: {1 - results['cue_parser'] / raw:.1%}")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    p.add_argument("files", nargs="*", type=Path)
+    p.add_argument("--manual", action="store_true", help="the files are uploaded subtitles, not auto-captions")
+    p.add_argument("--cues", type=int, default=2000, help="synthetic cues when no files are given")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    if args.files:
+        texts = [f.read_text(encoding="utf-8", errors="replace") for f in args.files]
+        _report("files", texts, args.repeat, auto_captions=not args.manual)
+        return 0
+    for style in ("rollup", "growing"):
+        vtt, spoken = synthetic_auto_captions(args.cues, style)
+        _report(style, [vtt], args.repeat, auto_captions=True, spoken=spoken)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
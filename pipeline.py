@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 """
-Orchestrator: run transcript → enrichment (OpenAI/Gemini) → notebooklm → obsidian.
-Supports --resume (skip existing files) and --only <agent>.
+Orchestrator: run transcript → enrichment (OpenAI/Gemini) → related videos → notebooklm → obsidian.
+Supports --resume (rebuild only stale outputs), --plan (dry run of what --resume would rebuild),
+--only <agent>, --stream (per-video transcript → enrichment → note) and --sync (only new/changed videos).
+`pipeline.py search "<query>"` searches transcripts and enriched notes.
 """
 import argparse
 import json
+import sqlite3
+import time
 from datetime import datetime
 from pathlib import Path
 
@@ -15,7 +19,10 @@ load_dotenv()
 from rich.console import Console
 from rich.table import Table
 
+from utils.llm_usage import get_run_usage
 from utils.logger import setup_logger
+from utils.run_stats import get_event, get_run_stats, record_stats
+from utils.state_store import STATE_DB_PATH, get_state_store
 
 DATA_DIR = Path(__file__).resolve().parent / "data"
 MANIFEST_PATH = DATA_DIR / "manifest.json"
@@ -27,17 +34,209 @@ def parse_args():
     p.add_argument("--resume", action="store_true", help="Skip videos that already have output files")
     p.add_argument(
         "--only",
-        choices=["transcripts", "enrichment", "notebooklm", "obsidian"],
+        choices=["transcripts", "enrichment", "related", "notebooklm", "obsidian"],
         default=None,
         help="Run only this agent (enrichment = OpenAI or Gemini)",
     )
-    return p.parse_args()
+    p.add_argument(
+        "--transcript-workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Parallel transcript workers (default TRANSCRIPT_WORKERS or 4); rate is capped by TRANSCRIPT_RPS",
+    )
+    p.add_argument(
+        "--enrichment-concurrency",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Starting number of in-flight LLM requests (default ENRICHMENT_CONCURRENCY); adapts on 429s",
+    )
+    p.add_argument(
+        "--batch",
+        action="store_true",
+        help="Enrichment: submit all pending prompts as one batch job (BATCH_BACKEND) and poll for results",
+    )
+    p.add_argument(
+        "--budget-usd",
+        type=float,
+        default=None,
+        metavar="USD",
+        help="Enrichment: stop before LLM spending would exceed this (pending videos stay queued for --resume)",
+    )
+    p.add_argument(
+        "--max-tokens",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Enrichment: stop before input + output tokens would exceed N",
+    )
+    p.add_argument(
+        "--queue-order",
+        choices=["playlist", "shortest", "newest"],
+        default=None,
+        help="Order of pending enrichments, which decides what a budget covers (default ENRICHMENT_QUEUE_ORDER)",
+    )
+    p.add_argument(
+        "--artifacts",
+        default=None,
+        metavar="LIST",
+        help="NotebookLM: comma list of artifacts to generate, e.g. audio,quiz (default NOTEBOOKLM_ARTIFACTS or all)",
+    )
+    p.add_argument(
+        "--stream",
+        action="store_true",
+        help="Move each video through transcript → enrichment → note as soon as it is ready; NotebookLM runs after",
+    )
+    p.add_argument(
+        "--plan",
+        action="store_true",
+        help="Dry run: list which transcripts, enrichments and notes --resume would rebuild and why (no network)",
+    )
+    p.add_argument(
+        "--sync",
+        action="store_true",
+        help="Diff the playlist against the last snapshot and only process added, changed or failed videos",
+    )
+    commands = p.add_subparsers(dest="command", metavar="search")
+    search = commands.add_parser("search", help="Full-text search over transcripts and enriched notes")
+    search.add_argument("query", help='Words to find (all must match, as prefixes), or an FTS5 query like "a b" OR c')
+    search.add_argument("--limit", type=int, default=10, help="Max videos to return (default 10)")
+    search.add_argument("--note", action="store_true", help="Also write a 'Search results' note to the notes folder")
+    args = p.parse_args()
+    if args.stream and (args.only or args.batch):
+        p.error("--stream runs every stage and cannot be combined with --only or --batch")
+    if args.stream and args.queue_order:
+        p.error("--queue-order does not apply to --stream: videos are enriched as their transcripts arrive")
+    if args.artifacts is not None:
+        from agents.notebooklm_agent import selected_artifacts
+        try:
+            selected_artifacts(args.artifacts)
+        except ValueError as e:
+            p.error(str(e))
+    return args
+
+
+def print_plan(console: Console) -> int:
+    """
+    Show what a --resume run would rebuild, from the state store and the current code/config alone:
+    one indexed query per stage plus a stat() per recorded output, no network.
+    """
+    from agents.gemini_agent import enrichment_recipe, estimate_enrichment
+    from agents.obsidian_agent import note_recipe
+    from agents.related_agent import related_recipe
+    from agents.transcript_agent import transcript_recipe
+    from utils.deps import plan_stage
+    from utils.llm_providers import configured_provider
+
+    if not STATE_DB_PATH.exists() and not MANIFEST_PATH.exists():
+        console.print("[yellow]Nothing recorded yet — the first run builds everything.[/yellow]")
+        return 0
+    store = get_state_store()
+    playlist_title = store.get_meta("playlist_title") or "YouTube Playlist"
+    notebook_id = store.get_meta("notebooklm_notebook_id") or ""
+    try:
+        enrichment = enrichment_recipe(*configured_provider())
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        return 1
+    stages = [
+        ("transcripts", None, transcript_recipe()),
+        ("enrichment", "transcripts", enrichment),
+        ("related", "enrichment", related_recipe()),
+        ("obsidian", "related", note_recipe(playlist_title, notebook_id)),
+    ]
+
+    summary = Table(title="Rebuild plan (--resume)")
+    summary.add_column("Stage", style="cyan")
+    summary.add_column("Rebuild", style="yellow")
+    summary.add_column("Fresh", style="green")
+    details = Table(title="Stale artifacts")
+    details.add_column("Stage", style="cyan")
+    details.add_column("Video")
+    details.add_column("Reason", style="yellow")
+
+    upstream: set[str] = set()
+    to_enrich: list[str] = []
+    for stage, after, recipe in stages:
+        view = store.stage_view(stage, after)
+        titles = {row["video_id"]: row["title"] or "Unknown" for row in view}
+        plan = plan_stage(view, recipe, upstream)
+        if stage == "enrichment":
+            to_enrich = list(plan)
+        summary.add_row(stage, str(len(plan)), str(len(view) - len(plan)))
+        for video_id, reason in plan.items():
+            details.add_row(stage, f"{video_id} — {titles[video_id]}", reason)
+        upstream = set(plan)
+
+    console.print(summary)
+    if details.row_count:
+        console.print(details)
+    if to_enrich:
+        model = configured_provider()[1]
+        records = {v["id"]: v for v in store.to_manifest()["videos"]}
+        estimate = estimate_enrichment([records.get(video_id, {"id": video_id}) for video_id in to_enrich], model)
+        cost = f"~${estimate['cost_usd']:.4f}" if estimate["cost_usd"] is not None else "cost unknown (no price)"
+        console.print(
+            f"Enrichment estimate ({model}): {estimate['videos']} video(s), ~{estimate['prompt_tokens']:,} input + "
+            f"~{estimate['completion_tokens']:,} output tokens, {cost}. "
+            "[dim]Local estimate; cached prompts and near-duplicates cost nothing.[/dim]"
+        )
+    console.print("[dim]New playlist entries are not known until the playlist is fetched (--sync).[/dim]")
+    return 0
+
+
+def run_search(args, console: Console) -> int:
+    """`pipeline.py search "<query>"`: bring the index up to date (only changed records), then query it."""
+    from rich.markup import escape
+
+    from utils.corpus import get_corpus
+    from utils.search_index import MATCH_END, MATCH_START, SearchIndex
+
+    index = SearchIndex()
+    updated = index.update(get_corpus())
+    started = time.perf_counter()
+    try:
+        results = index.search(args.query, args.limit)
+    except sqlite3.OperationalError as e:
+        console.print(f"[red]Invalid search query: {e}[/red]")
+        return 1
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        index.close()
+
+    table = Table(title=f"Search: {args.query}")
+    table.add_column("#", style="dim")
+    table.add_column("Video", style="cyan")
+    table.add_column("Title")
+    table.add_column("Matched in", style="green")
+    table.add_column("Snippet")
+    for n, hit in enumerate(results, 1):
+        snippet = escape(hit["snippet"]).replace(MATCH_START, "[bold yellow]").replace(MATCH_END, "[/bold yellow]")
+        fields = ", ".join(hit["fields"])
+        if hit["start"] is not None:
+            fields += f" @ {int(hit['start']) // 60}:{int(hit['start']) % 60:02d}"
+        table.add_row(str(n), hit["video_id"], escape(hit["title"]), fields, snippet)
+    console.print(table)
+    console.print(
+        f"[dim]{len(results)} video(s) in {elapsed_ms:.1f} ms "
+        f"(index: {updated['indexed']} record(s) updated in {updated['elapsed_ms']} ms)[/dim]"
+    )
+    if args.note and results:
+        from agents.obsidian_agent import write_search_note
+        console.print(f"[dim]Search results note: {write_search_note(args.query, results)}[/dim]")
+    return 0
 
 
 def main():
     args = parse_args()
     console = Console()
     logger = setup_logger()
+    if args.command == "search":
+        return run_search(args, console)
+    if args.plan:
+        return print_plan(console)
+    started = time.monotonic()
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     manifest = None
@@ -55,30 +254,52 @@ def main():
             raise
 
     try:
+        # 1-2. Streaming: transcripts, enrichment and per-video notes overlap; NotebookLM + index stay barriers.
+        if args.stream:
+            from agents.streaming import run_streaming_pipeline
+            manifest = run(
+                "stream", run_streaming_pipeline, args.resume,
+                transcript_workers=args.transcript_workers,
+                enrichment_concurrency=args.enrichment_concurrency,
+                sync=args.sync,
+                budget_usd=args.budget_usd,
+                max_tokens=args.max_tokens,
+            )
         # 1. Transcripts
-        if args.only is None or args.only == "transcripts":
+        elif args.only is None or args.only == "transcripts":
             from agents.transcript_agent import run_transcript_agent
-            manifest = run("transcripts", run_transcript_agent, args.resume)
+            manifest = run(
+                "transcripts", run_transcript_agent, args.resume, workers=args.transcript_workers, sync=args.sync
+            )
         elif MANIFEST_PATH.exists():
             manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
 
-        if manifest is None and (args.only in ("enrichment", "notebooklm", "obsidian") or args.only is None):
+        if manifest is None and args.only in (None, "enrichment", "related", "notebooklm", "obsidian"):
             if not MANIFEST_PATH.exists():
                 console.print("[red]No manifest found. Run without --only or run transcripts first.[/red]")
                 return 1
             manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
 
         # 2. Enrichment (OpenAI or Gemini)
-        if args.only is None or args.only == "enrichment":
+        if not args.stream and (args.only is None or args.only == "enrichment"):
             from agents.gemini_agent import run_gemini_agent
-            manifest = run("enrichment", run_gemini_agent, manifest, args.resume)
+            manifest = run(
+                "enrichment", run_gemini_agent, manifest, args.resume,
+                concurrency=args.enrichment_concurrency, batch=args.batch, sync=args.sync,
+                budget_usd=args.budget_usd, max_tokens=args.max_tokens, order=args.queue_order,
+            )
+
+        # 3. Related videos (notes link to them, so it also runs with --only obsidian)
+        if args.only in (None, "related", "obsidian"):
+            from agents.related_agent import run_related_agent
+            manifest = run("related", run_related_agent, manifest)
 
-        # 3. NotebookLM
+        # 4. NotebookLM
         if args.only is None or args.only == "notebooklm":
             from agents.notebooklm_agent import run_notebooklm_agent
-            manifest = run("notebooklm", run_notebooklm_agent, manifest)
+            manifest = run("notebooklm", run_notebooklm_agent, manifest, artifacts=args.artifacts)
 
-        # 4. Obsidian
+        # 5. Obsidian
         if args.only is None or args.only == "obsidian":
             from agents.obsidian_agent import run_obsidian_agent
             run("obsidian", run_obsidian_agent, manifest)
@@ -89,6 +310,21 @@ def main():
         if manifest is None and MANIFEST_PATH.exists():
             manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
 
+    # Superseded records pile up in the append-only corpus pack; rewrite it once they outweigh live ones.
+    from utils.corpus import get_corpus
+    corpus = get_corpus()
+    compacted = corpus.maybe_compact()
+    record_stats("corpus", **corpus.stats(), compacted=compacted)
+    from utils.search_index import SearchIndex
+    search_index = SearchIndex()
+    record_stats("search_index", **search_index.update(corpus))
+    search_index.close()
+
+    wall_time = time.monotonic() - started
+    first_note = get_event("first_note")
+    time_to_first_note = f"{first_note - started:.1f}s" if first_note else "—"
+    record_stats("pipeline", wall_time_seconds=round(wall_time, 1), time_to_first_note=time_to_first_note)
+
     # Run report
     report_lines = [
         "# Pipeline Run Report",
@@ -96,6 +332,8 @@ def main():
         f"**Date:** {datetime.now().isoformat()}",
         f"**Resume:** {args.resume}",
         f"**Only:** {args.only or 'all'}",
+        f"**Stream:** {args.stream}",
+        f"**Sync:** {args.sync}",
         "",
         "## Agents run",
         "",
@@ -116,6 +354,13 @@ def main():
             f"- **Failed:** {failed}",
             "",
         ])
+        if manifest.get("removed_videos"):
+            report_lines.append("### Removed from playlist")
+            report_lines.append("")
+            for v in manifest["removed_videos"]:
+                removed_at = datetime.fromtimestamp(v["removed_at"]).isoformat(timespec="minutes")
+                report_lines.append(f"- {v['id']} — {v['title']} (removed {removed_at})")
+            report_lines.append("")
         if failed:
             report_lines.append("### Failed videos")
             report_lines.append("")
@@ -124,6 +369,94 @@ def main():
                     report_lines.append(f"- {v.get('id', '?')} — {v.get('reason', 'unknown')}")
             report_lines.append("")
 
+    # Per-stage status counts straight from the state store (data/state.sqlite)
+    stage_counts = get_state_store().counts() if STATE_DB_PATH.exists() else {}
+    if stage_counts:
+        report_lines.extend(["## Stage status", "", "| Stage | OK | Failed | Running |", "|-------|----|--------|---------|"])
+        for stage, counts in stage_counts.items():
+            report_lines.append(
+                f"| {stage} | {counts.get('ok', 0)} | {counts.get('failed', 0)} | {counts.get('running', 0)} |"
+            )
+        report_lines.append("")
+
+    run_stats = get_run_stats()
+    if run_stats:
+        report_lines.append("## Stage stats")
+        report_lines.append("")
+        for stage, values in run_stats.items():
+            report_lines.append(f"### {stage}")
+            report_lines.append("")
+            for key, value in values.items():
+                if not isinstance(value, list):
+                    report_lines.append(f"- **{key}:** {value}")
+            report_lines.append("")
+
+    usage = get_run_usage()
+    per_video = usage.per_video()
+    if per_video:
+        totals = usage.totals()
+        titles = {v.get("id"): v.get("title") for v in (manifest or {}).get("videos", [])}
+        report_lines.append("## LLM usage")
+        report_lines.append("")
+        report_lines.append(
+            f"**This run:** {totals['calls']} calls, {totals['prompt_tokens']:,} input + "
+            f"{totals['completion_tokens']:,} output tokens, ${totals['cost_usd']:.4f}"
+        )
+        report_lines.append("")
+        report_lines.append(
+            f"**Prompt cache:** {totals['cached_tokens']:,} of {totals['prompt_tokens']:,} input tokens "
+            f"({totals['cached_ratio']:.0%}) served from the provider's prefix cache"
+        )
+        report_lines.append("")
+        report_lines.append("| Video | Calls | Input tokens | Cached | Output tokens | Cost (USD) |")
+        report_lines.append("|---|---|---|---|---|---|")
+        for video_id, row in sorted(per_video.items(), key=lambda item: -item[1]["cost_usd"]):
+            video = (titles.get(video_id) or video_id).replace("|", "\\|")
+            cached = row["cached_tokens"] / row["prompt_tokens"] if row["prompt_tokens"] else 0
+            report_lines.append(
+                f"| {video} | {row['calls']} | {row['prompt_tokens']:,} | {cached:.0%} "
+                f"| {row['completion_tokens']:,} | {row['cost_usd']:.4f} |"
+            )
+        report_lines.append("")
+
+    first_sections = run_stats.get("enrichment", {}).get("first_section_seconds", [])
+    if first_sections:
+        titles = {v.get("id"): v.get("title") for v in (manifest or {}).get("videos", [])}
+        report_lines.append("## Time to first section")
+        report_lines.append("")
+        report_lines.append("| Video | First section (s) |")
+        report_lines.append("|---|---|")
+        for video_id, seconds in sorted(first_sections, key=lambda item: -item[1]):
+            video = (titles.get(video_id) or video_id).replace("|", "\\|")
+            report_lines.append(f"| {video} | {seconds:.2f} |")
+        report_lines.append("")
+
+    artifacts = run_stats.get("notebooklm", {}).get("artifacts", [])
+    if artifacts:
+        report_lines.append("## NotebookLM artifacts")
+        report_lines.append("")
+        report_lines.append("| Artifact | Status | Attempts | Seconds | Size (bytes) | Error |")
+        report_lines.append("|---|---|---|---|---|---|")
+        for row in artifacts:
+            error = (row["error"] or "").replace("|", "\\|")[:120]
+            report_lines.append(
+                f"| {row['artifact']} | {row['status']} | {row['attempts']} | {row['seconds']:.1f} "
+                f"| {row['bytes']:,} | {error} |"
+            )
+        report_lines.append("")
+
+    reused = run_stats.get("near_duplicates", {}).get("pairs", [])
+    if reused:
+        report_lines.append("## Near-duplicate reuse")
+        report_lines.append("")
+        report_lines.append("| Video | Reused enrichment of | Similarity | Est. prompt tokens saved |")
+        report_lines.append("|---|---|---|---|")
+        for pair in reused:
+            video = (pair["title"] or pair["video_id"]).replace("|", "\\|")
+            original = (pair["duplicate_title"] or pair["duplicate_of"]).replace("|", "\\|")
+            report_lines.append(f"| {video} | {original} | {pair['similarity']:.2f} | {pair['est_prompt_tokens']} |")
+        report_lines.append("")
+
     if errors:
         report_lines.append("## Errors")
         report_lines.append("")
@@ -145,6 +478,8 @@ def main():
         table.add_row("Videos", str(len(videos)))
         table.add_row("OK", str(ok))
         table.add_row("Failed", str(failed))
+        table.add_row("Time to first note", time_to_first_note)
+        table.add_row("Wall time", f"{wall_time:.1f}s")
         console.print(table)
 
     return 0 if not errors else 1
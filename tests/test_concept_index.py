@@ -0,0 +1,57 @@
+"""utils/concept_index.py: which wikilinks end up as one concept."""
+from utils.concept_index import ConceptIndex, concept_key
+
+
+class _Corpus:
+    """The two corpus calls ConceptIndex.update() makes, over {video id: enriched record}."""
+
+    def __init__(self, records: dict[str, dict]):
+        self.records = records
+
+    def hashes(self, kind: str) -> dict:
+        return {(kind, video_id): str(hash(str(record))) for video_id, record in self.records.items()}
+
+    def get(self, kind: str, video_id: str) -> dict | None:
+        return self.records.get(video_id)
+
+
+def _record(*links: str) -> dict:
+    return {"gemini_sections": {"Related Concepts": " ".join(f"[[{link}]]" for link in links)}}
+
+
+def _groups(tmp_path, *videos: tuple[str, ...]) -> tuple[list[set[str]], dict]:
+    """Concepts (as sets of surface forms) and match counts after indexing one video per tuple of links."""
+    index = ConceptIndex(tmp_path / "concepts.sqlite")
+    counts = index.update(_Corpus({f"v{i}": _record(*links) for i, links in enumerate(videos)}))
+    groups = [{c["name"], *c["aliases"]} for c in index.concepts().values()]
+    index.close()
+    return sorted(groups, key=sorted), counts
+
+
+def test_concept_key_normalises_case_articles_plurals_and_accents():
+    assert concept_key("The Central Banks") == concept_key("central bank") == "central bank"
+    assert concept_key("Policies") == "policy"
+    assert concept_key("Πληθωρισμός") == concept_key("πληθωρισμος")
+    assert concept_key("Analysis") == "analysis"
+
+
+def test_plural_and_greek_accent_forms_share_a_key(tmp_path):
+    groups, counts = _groups(tmp_path, ("Central Bank", "Πληθωρισμός"), ("central banks", "πληθωρισμος"))
+    assert groups == [{"Central Bank", "central banks"}, {"Πληθωρισμός", "πληθωρισμος"}]
+    assert counts["exact"] == 2
+
+
+def test_acronym_matches_its_expansion_in_either_order(tmp_path):
+    groups, counts = _groups(tmp_path, ("ETFs",), ("Exchange-Traded Fund (ETF)",), ("exchange traded funds",))
+    assert groups == [{"ETFs", "Exchange-Traded Fund (ETF)", "exchange traded funds"}]
+    assert (counts["acronym"], counts["exact"]) == (1, 1)
+
+    groups, counts = _groups(tmp_path / "reverse", ("Exchange Traded Funds",), ("ETF",))
+    assert groups == [{"ETF", "Exchange Traded Funds"}]
+    assert counts["acronym"] == 1
+
+
+def test_fuzzy_match_catches_typos_only(tmp_path):
+    groups, counts = _groups(tmp_path, ("Keynesian Economics",), ("Keynesian econmics",), ("Inflation", "inflation rates"))
+    assert groups == [{"Inflation"}, {"Keynesian Economics", "Keynesian econmics"}, {"inflation rates"}]
+    assert counts["fuzzy"] == 1
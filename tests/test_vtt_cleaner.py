@@ -0,0 +1,66 @@
+"""utils/vtt_cleaner.py on a YouTube auto-caption track (rolling cues) and an uploaded subtitle track."""
+from pathlib import Path
+
+from utils.vtt_cleaner import clean_vtt, parse_vtt
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+AUTO = (FIXTURES / "auto_captions.en.vtt").read_text(encoding="utf-8")
+MANUAL = (FIXTURES / "manual_captions.en.vtt").read_text(encoding="utf-8")
+
+
+def test_auto_captions_read_once():
+    assert clean_vtt(AUTO, auto_captions=True) == (
+        "so today we're going to talk about the history of the printing press and why it matters "
+        "yes yes it really does so R&D didn't stop there there was more"
+    )
+
+
+def test_auto_captions_segments_carry_cue_times():
+    text, segments = parse_vtt(AUTO, auto_captions=True)
+    assert text == clean_vtt(AUTO, auto_captions=True)
+    assert segments[:2] == [
+        {"start": 0.16, "end": 2.55, "text": "so today we're going to talk about the"},
+        {"start": 2.56, "end": 5.11, "text": "history of the printing press and"},
+    ]
+    assert len(segments) == 5  # the 10 ms transition cues add nothing
+
+
+def test_auto_captions_streamed_lines_match_whole_file():
+    lines = iter(AUTO.splitlines(keepends=True))
+    assert parse_vtt(lines, auto_captions=True) == parse_vtt(AUTO, auto_captions=True)
+
+
+def test_manual_captions_keep_every_cue():
+    assert clean_vtt(MANUAL) == (
+        'Yes. Yes. I went to the the store and then then I left. '
+        'Tom & Jerry said "café" twice: "café" twice: the end.'
+    )
+
+
+def test_manual_captions_with_crlf_line_endings():
+    assert clean_vtt(MANUAL.replace("\n", "\r\n")) == clean_vtt(MANUAL)
+
+
+def test_auto_captions_keep_single_words_repeated_at_cue_boundaries():
+    vtt = (
+        "WEBVTT\n\n"
+        "00:00:01.000 --> 00:00:02.000\nI went to the\n\n"
+        "00:00:02.000 --> 00:00:03.000\nthe store and then\n\n"
+        "00:00:03.000 --> 00:00:04.000\nthen I left\n"
+    )
+    assert clean_vtt(vtt, auto_captions=True) == "I went to the the store and then then I left"
+
+
+def test_auto_captions_collapse_a_multi_word_roll():
+    vtt = (
+        "WEBVTT\n\n"
+        "00:00:01.000 --> 00:00:02.000\nthe history of the printing press\n\n"
+        "00:00:02.000 --> 00:00:03.000\nof the printing press changed Europe\n"
+    )
+    assert clean_vtt(vtt, auto_captions=True) == "the history of the printing press changed Europe"
+    assert clean_vtt(vtt) == "the history of the printing press of the printing press changed Europe"
+
+
+def test_empty_input():
+    assert clean_vtt(None) == ""
+    assert parse_vtt("WEBVTT\n\n") == ("", [])
@@ -0,0 +1,54 @@
+"""Split long transcripts into sentence-aligned, token-budgeted windows for map-reduce enrichment."""
+import re
+
+# Sentence ends: . ! ? … and the Greek question mark (U+037E, often typed as ';').
+_SENTENCE_END = re.compile(r"(?<=[.!?…;;])\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate: ~4 chars/token for ASCII, ~2 for other scripts
+    (Greek tokenizes roughly twice as densely as English on OpenAI/Gemini tokenizers).
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if c < "\x80")
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s for s in _SENTENCE_END.split(text.strip()) if s]
+
+
+def _split_oversized(sentence: str, max_tokens: int) -> list[str]:
+    """Auto-captions often have no punctuation at all; fall back to word windows for a runaway 'sentence'."""
+    pieces, current, current_tokens = [], [], 0
+    for word in _WHITESPACE.split(sentence):
+        word_tokens = estimate_tokens(word)
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_transcript(text: str, max_tokens: int) -> list[str]:
+    """Greedily pack whole sentences into windows of at most ~max_tokens each."""
+    chunks, current, current_tokens = [], [], 0
+    for sentence in split_sentences(text):
+        sentence_tokens = estimate_tokens(sentence)
+        parts = _split_oversized(sentence, max_tokens) if sentence_tokens > max_tokens else [sentence]
+        for part in parts:
+            part_tokens = estimate_tokens(part)
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
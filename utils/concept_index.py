@@ -0,0 +1,301 @@
+"""
+Concept index (data/concepts.sqlite): every [[wikilink]] the LLM put in the enriched sections, grouped into
+concepts so that "ETFs", "Exchange-Traded Fund (ETF)" and "exchange traded funds" point at one concept note,
+as do "Πληθωρισμός" and "πληθωρισμος". Links are matched by a normalised key (accents, case, articles,
+plurals), then by acronym, then fuzzily (typos, hyphenation) against a few blocked candidates of about the
+same length, so "Inflation" and "inflation rates" stay separate concepts. Only enriched records whose hash
+changed are re-read.
+"""
+import difflib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.deps import digest
+from utils.search_index import fold
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CONCEPTS_DB_PATH = DATA_DIR / "concepts.sqlite"
+
+FUZZY_RATIO = 0.88  # difflib ratio above which two keys are the same concept (typos, hyphenation)
+BLOCK_PREFIX = 4  # keys are only compared when they share a token starting with the same 4 letters
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS concepts (
+    id INTEGER PRIMARY KEY,
+    acronym TEXT
+);
+CREATE INDEX IF NOT EXISTS concepts_acronym ON concepts(acronym);
+CREATE TABLE IF NOT EXISTS aliases (
+    key TEXT PRIMARY KEY,
+    concept_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    video_id TEXT NOT NULL,
+    surface TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (video_id, surface)
+);
+CREATE INDEX IF NOT EXISTS links_key ON links(key);
+CREATE TABLE IF NOT EXISTS sources (
+    video_id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rendered (
+    video_id TEXT PRIMARY KEY,
+    digest TEXT
+);
+CREATE TABLE IF NOT EXISTS concept_notes (
+    concept_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+WIKILINK = re.compile(r"\[\[([^\]|#]+)([#|][^\]]*)?\]\]")
+_PAREN = re.compile(r"\(([^)]*)\)")
+_NON_WORD = re.compile(r"[\W_]+")
+_UNSAFE = re.compile(r'[\\/*?:"<>|#^\[\]]')
+_ARTICLES = {"the", "a", "an", "ο", "η", "το", "οι", "τα"}
+
+
+def _singular(token: str) -> str:
+    """English plural → singular for the common regular forms; other words (Greek included) are left alone."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("sses", "xes", "ches", "shes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")) and token.isascii():
+        return token[:-1]
+    return token
+
+
+def concept_key(name: str) -> str:
+    """Normalised form used to match links: no accents, case, punctuation, leading article or plural."""
+    tokens = _NON_WORD.sub(" ", fold(_PAREN.sub(" ", name)).casefold()).split()
+    if len(tokens) > 1 and tokens[0] in _ARTICLES:
+        tokens = tokens[1:]
+    return " ".join(_singular(t) for t in tokens)
+
+
+def _acronym(name: str) -> str | None:
+    """"ETF" for "ETF", "etfs" or "Exchange-Traded Fund (ETF)"; None when the link is not or has no acronym."""
+    inner = _PAREN.search(name)
+    candidate = inner.group(1) if inner else name
+    key = concept_key(candidate)
+    if 2 <= len(key) <= 6 and " " not in key and (inner or candidate.strip().rstrip("s").isupper()):
+        return key
+    return None
+
+
+def _initials(key: str) -> str:
+    """"etf" for "exchange traded fund"; empty under three words, where initials collide too easily."""
+    tokens = key.split()
+    return "".join(t[0] for t in tokens) if len(tokens) >= 3 else ""
+
+
+def display_name(surface: str) -> str:
+    """A link target that is also a valid note filename."""
+    return re.sub(r"\s+", " ", _UNSAFE.sub("", surface)).strip()
+
+
+def extract_links(record: dict) -> list[str]:
+    """Distinct [[wikilink]] targets in an enriched record's sections, in order of appearance."""
+    seen: dict[str, None] = {}
+    for text in (record.get("gemini_sections") or {}).values():
+        for match in WIKILINK.finditer(text or ""):
+            surface = match.group(1).strip()
+            if surface and concept_key(surface):
+                seen.setdefault(surface, None)
+    return list(seen)
+
+
+def _resolution_digest(pairs) -> str:
+    return digest(*sorted(set(pairs)))
+
+
+def links_digest(surfaces, concepts: dict[str, str]) -> str:
+    """Hash of how a note's links resolve: changes when any of them is renamed to a different concept name."""
+    return _resolution_digest((s, concepts.get(concept_key(s), s)) for s in surfaces)
+
+
+class ConceptIndex:
+    """Wikilink → concept assignments, kept across runs. A key keeps its concept once assigned."""
+
+    def __init__(self, path: Path | None = None):
+        path = path or CONCEPTS_DB_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._keys: dict[str, int] | None = None
+        self._blocks: dict[str, set[str]] = {}
+        self._acronyms: dict[str, int] = {}
+        self._by_initials: dict[str, int] = {}
+
+    def _load_matchers(self) -> None:
+        """Key, block (token prefix) and acronym lookups, built once per process from the aliases table."""
+        self._keys = dict(self._conn.execute("SELECT key, concept_id FROM aliases"))
+        for key, concept_id in self._keys.items():
+            self._add_blocks(key, concept_id)
+        self._acronyms = dict(self._conn.execute("SELECT acronym, id FROM concepts WHERE acronym IS NOT NULL"))
+
+    def _add_blocks(self, key: str, concept_id: int) -> None:
+        for token in key.split():
+            if len(token) >= BLOCK_PREFIX:
+                self._blocks.setdefault(token[:BLOCK_PREFIX], set()).add(key)
+        if _initials(key):
+            self._by_initials.setdefault(_initials(key), concept_id)
+
+    def _match(self, key: str, acronym: str | None) -> tuple[int | None, str]:
+        """(existing concept id or None, how it matched) for a key not seen before."""
+        # "ETF" ↔ "Exchange-Traded Fund (ETF)" ↔ "exchange traded funds", whichever arrives first.
+        if acronym and (acronym in self._acronyms or acronym in self._by_initials):
+            return self._acronyms.get(acronym) or self._by_initials[acronym], "acronym"
+        if _initials(key) in self._acronyms:
+            return self._acronyms[_initials(key)], "acronym"
+        candidates = set()
+        for token in key.split():
+            candidates |= self._blocks.get(token[:BLOCK_PREFIX], set())
+        best, best_ratio = None, FUZZY_RATIO
+        for candidate in candidates:
+            if abs(len(candidate) - len(key)) > max(2, len(key) // 8):
+                continue
+            ratio = difflib.SequenceMatcher(None, key, candidate).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        return (self._keys[best], "fuzzy") if best else (None, "new")
+
+    def _assign(self, surface: str, counts: dict[str, int]) -> str:
+        key = concept_key(surface)
+        if key in self._keys:
+            counts["exact"] += 1
+            return key
+        acronym = _acronym(surface)
+        concept_id, how = self._match(key, acronym)
+        if concept_id is None:
+            concept_id = self._conn.execute("INSERT INTO concepts (acronym) VALUES (?)", (acronym,)).lastrowid
+        elif acronym and acronym not in self._acronyms:
+            self._conn.execute("UPDATE concepts SET acronym = COALESCE(acronym, ?) WHERE id = ?", (acronym, concept_id))
+        if acronym:
+            self._acronyms.setdefault(acronym, concept_id)
+        self._conn.execute("INSERT INTO aliases (key, concept_id) VALUES (?, ?)", (key, concept_id))
+        self._keys[key] = concept_id
+        self._add_blocks(key, concept_id)
+        counts[how] += 1
+        return key
+
+    def update(self, corpus) -> dict:
+        """Re-extract links from enriched records whose hash changed since the last update; drop vanished ones."""
+        started = time.monotonic()
+        current = {video_id: sha for (_, video_id), sha in corpus.hashes("enriched").items()}
+        counts = {"videos_read": 0, "videos_removed": 0, "exact": 0, "acronym": 0, "fuzzy": 0, "new": 0}
+        with self._lock, self._conn:
+            if self._keys is None:
+                self._load_matchers()
+            indexed = dict(self._conn.execute("SELECT video_id, sha256 FROM sources"))
+            for video_id, sha in current.items():
+                if indexed.get(video_id) == sha:
+                    continue
+                record = corpus.get("enriched", video_id)
+                if record is None:
+                    continue
+                self._conn.execute("DELETE FROM links WHERE video_id = ?", (video_id,))
+                self._conn.executemany(
+                    "INSERT INTO links (video_id, surface, key) VALUES (?, ?, ?)",
+                    [(video_id, s, self._assign(s, counts)) for s in extract_links(record)],
+                )
+                self._conn.execute("INSERT OR REPLACE INTO sources (video_id, sha256) VALUES (?, ?)", (video_id, sha))
+                counts["videos_read"] += 1
+            for video_id in indexed.keys() - current.keys():
+                self._conn.execute("DELETE FROM links WHERE video_id = ?", (video_id,))
+                self._conn.execute("DELETE FROM sources WHERE video_id = ?", (video_id,))
+                counts["videos_removed"] += 1
+        counts["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return counts
+
+    def concepts(self, video_ids=None) -> dict[int, dict]:
+        """
+        {concept id: {"name", "aliases", "videos"}} over the links of `video_ids` (default: all). The name is
+        the surface form used by most videos (ties: the longest, which is rarely the typo or the abbreviation),
+        cleaned to be a valid filename.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT a.concept_id, l.surface, l.video_id FROM links l JOIN aliases a ON a.key = l.key "
+                "ORDER BY a.concept_id, l.surface"
+            ).fetchall()
+        wanted = set(video_ids) if video_ids is not None else None
+        out: dict[int, dict] = {}
+        for concept_id, surface, video_id in rows:
+            if wanted is not None and video_id not in wanted:
+                continue
+            concept = out.setdefault(concept_id, {"forms": {}, "videos": []})
+            concept["forms"][surface] = concept["forms"].get(surface, 0) + 1
+            if video_id not in concept["videos"]:
+                concept["videos"].append(video_id)
+        for concept in out.values():
+            forms = concept.pop("forms")
+            concept["name"] = display_name(min(forms, key=lambda s: (-forms[s], -len(s), s))) or "Untitled"
+            concept["aliases"] = sorted({f for f in forms if f != concept["name"]})
+        return out
+
+    def canonical_map(self, concepts: dict[int, dict] | None = None) -> dict[str, str]:
+        """{link key: concept name} for rewriting links in notes."""
+        concepts = self.concepts() if concepts is None else concepts
+        with self._lock:
+            keys = self._conn.execute("SELECT key, concept_id FROM aliases").fetchall()
+        return {key: concepts[concept_id]["name"] for key, concept_id in keys if concept_id in concepts}
+
+    def note_digests(self, canonical: dict[str, str]) -> dict[str, tuple[str, str | None]]:
+        """{video id: (links_digest() its note needs now, digest it was last written with)}."""
+        with self._lock:
+            links = self._conn.execute("SELECT video_id, surface, key FROM links").fetchall()
+            rendered = dict(self._conn.execute("SELECT video_id, digest FROM rendered"))
+        pairs: dict[str, list[tuple[str, str]]] = {}
+        for video_id, surface, key in links:
+            pairs.setdefault(video_id, []).append((surface, canonical.get(key, surface)))
+        return {
+            video_id: (_resolution_digest(pairs.get(video_id, [])), rendered.get(video_id))
+            for video_id in pairs.keys() | rendered.keys()
+        }
+
+    def mark_rendered(self, video_id: str, links_hash: str | None) -> None:
+        """Record how a note's links were resolved when it was written (None: not canonicalised)."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO rendered (video_id, digest) VALUES (?, ?)", (video_id, links_hash))
+
+    def concept_notes(self) -> dict[int, tuple[str, str]]:
+        """{concept id: (note name, digest)} of the concept notes written so far."""
+        with self._lock:
+            return {cid: (name, d) for cid, name, d in self._conn.execute("SELECT * FROM concept_notes")}
+
+    def set_concept_notes(self, written: dict[int, tuple[str, str]], removed) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO concept_notes (concept_id, name, digest) VALUES (?, ?, ?)",
+                [(cid, name, d) for cid, (name, d) in written.items()],
+            )
+            self._conn.executemany("DELETE FROM concept_notes WHERE concept_id = ?", [(cid,) for cid in removed])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_index: ConceptIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_concept_index() -> ConceptIndex:
+    """Process-wide concept index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ConceptIndex()
+        return _index
@@ -0,0 +1,265 @@
+"""
+Transcript and enriched-record storage. Transcripts are written once, as gzip-compressed JSON
+(data/transcripts/{id}.json.gz); enriched records point at them instead of copying the text.
+Every record is also appended to a packed corpus (data/corpus.pack) with a fixed-width offset index
+(data/corpus.idx), so stages and analysis scripts can read everything in one memory-mapped pass
+instead of opening thousands of small files.
+"""
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterator
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+TRANSCRIPTS_DIR = DATA_DIR / "transcripts"
+ENRICHED_DIR = DATA_DIR / "enriched"
+CORPUS_PACK_PATH = DATA_DIR / "corpus.pack"
+CORPUS_INDEX_PATH = DATA_DIR / "corpus.idx"
+
+KINDS = ("transcript", "enriched")
+
+# Index entry: video id (NUL-padded), kind (index into KINDS), 3 pad bytes, pack offset, compressed
+# length, sha256 of the uncompressed record. Later entries for the same (kind, id) supersede earlier ones.
+_ENTRY = struct.Struct("<32sB3xQI32s")
+
+
+def dumps(obj: dict) -> bytes:
+    """Compact UTF-8 JSON: the on-disk form of every stored record."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_gz(path: Path, body: bytes) -> None:
+    """gzip with a fixed header timestamp, so identical records produce identical files (and hashes)."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(gzip.compress(body, mtime=0))
+    os.replace(tmp, path)
+
+
+def read_record(path: str | Path) -> dict:
+    """Load a stored record: .json.gz, or plain .json written before compressed storage."""
+    path = Path(path)
+    raw = path.read_bytes()
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
+
+
+def transcript_path(video_id: str) -> Path:
+    """Where a video's transcript lives: the compressed file, or a legacy plain .json if only that exists."""
+    path = TRANSCRIPTS_DIR / f"{video_id}.json.gz"
+    legacy = TRANSCRIPTS_DIR / f"{video_id}.json"
+    return legacy if legacy.exists() and not path.exists() else path
+
+
+def load_transcript(record: dict) -> dict:
+    """
+    Transcript payload for a manifest entry or an enriched record, following `transcript_path` /
+    `transcript_ref`. Enriched records written before references get their inline transcript back.
+    """
+    if "transcript" in record:
+        return record
+    ref = record.get("transcript_path") or record.get("transcript_ref")
+    video_id = record.get("id") or record.get("video_id")
+    return read_record(ref or transcript_path(video_id))
+
+
+class CorpusPack:
+    """
+    Append-only packed corpus. Each record is its own gzip member, so the pack is also a valid
+    multi-member .gz stream of JSON lines; the index gives random access by (kind, video id).
+    """
+
+    def __init__(self, pack_path: Path, index_path: Path):
+        self.pack_path = pack_path
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], tuple[int, int, bytes]] = {}
+        self._dead_bytes = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        if not self.index_path.exists():
+            return
+        pack_size = self.pack_path.stat().st_size if self.pack_path.exists() else 0
+        with open(self.index_path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % _ENTRY.size
+        if usable != len(data):
+            # Drop a torn trailing entry, or every later append would be misaligned.
+            with open(self.index_path, "r+b") as f:
+                f.truncate(usable)
+        for raw_id, kind, offset, length, sha in _ENTRY.iter_unpack(data[:usable]):
+            if offset + length > pack_size or kind >= len(KINDS):
+                continue  # index entry written, pack bytes lost: skip
+            key = (KINDS[kind], raw_id.rstrip(b"\0").decode("utf-8"))
+            if key in self._entries:
+                self._dead_bytes += self._entries[key][1]
+            self._entries[key] = (offset, length, sha)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, kind: str, video_id: str, body: bytes) -> None:
+        """Add a record (compact JSON bytes); skipped if the stored version is byte-identical."""
+        sha = hashlib.sha256(body).digest()
+        member = gzip.compress(body + b"\n", mtime=0)
+        with self._lock:
+            previous = self._entries.get((kind, video_id))
+            if previous and previous[2] == sha:
+                return
+            self.pack_path.parent.mkdir(parents=True, exist_ok=True)
+            # Pack bytes first, index entry second: an interrupted append leaves no index entry to it.
+            with open(self.pack_path, "ab") as pack:
+                offset = pack.tell()
+                pack.write(member)
+            with open(self.index_path, "ab") as index:
+                index.write(_ENTRY.pack(video_id.encode("utf-8"), KINDS.index(kind), offset, len(member), sha))
+            if previous:
+                self._dead_bytes += previous[1]
+            self._entries[(kind, video_id)] = (offset, len(member), sha)
+
+    @staticmethod
+    def _decode(member: bytes, sha: bytes) -> bytes | None:
+        """A member's record bytes, or None if they do not match the index (torn write, interrupted compaction)."""
+        try:
+            body = zlib.decompress(member, wbits=31)[:-1]
+        except zlib.error:
+            return None
+        return body if hashlib.sha256(body).digest() == sha else None
+
+    def get(self, kind: str, video_id: str, sha256: str | None = None) -> dict | None:
+        """Latest record for (kind, video id); None if absent, unreadable, or its hash differs from `sha256`."""
+        entry = self._entries.get((kind, video_id))
+        if entry is None or (sha256 and entry[2].hex() != sha256):
+            return None
+        offset, length, sha = entry
+        with open(self.pack_path, "rb") as f:
+            f.seek(offset)
+            body = self._decode(f.read(length), sha)
+        return json.loads(body) if body is not None else None
+
+    def iter_records(self, kind: str | None = None) -> Iterator[tuple[str, str, dict]]:
+        """(kind, video id, record) for the latest version of every record, in one pass over an mmap of the pack."""
+        with self._lock:
+            live = sorted((*e, k) for k, e in self._entries.items() if kind is None or k[0] == kind)
+        if not live:
+            return
+        with open(self.pack_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset, length, sha, (record_kind, video_id) in live:
+                body = self._decode(mm[offset:offset + length], sha)
+                if body is not None:
+                    yield record_kind, video_id, json.loads(body)
+
+    def hashes(self, kind: str | None = None) -> dict[tuple[str, str], str]:
+        """{(kind, video id): sha256 hex} of the latest records, from the index alone."""
+        with self._lock:
+            return {k: e[2].hex() for k, e in self._entries.items() if kind is None or k[0] == kind}
+
+    def sha256(self, kind: str, video_id: str) -> str | None:
+        """sha256 hex of the latest record for (kind, video id), from the index alone."""
+        with self._lock:
+            entry = self._entries.get((kind, video_id))
+        return entry[2].hex() if entry else None
+
+    def stats(self) -> dict:
+        live = sum(e[1] for e in self._entries.values())
+        return {"records": len(self._entries), "live_bytes": live, "dead_bytes": self._dead_bytes}
+
+    def compact(self) -> None:
+        """Rewrite the pack and index with only the latest version of each record."""
+        with self._lock:
+            tmp_pack = self.pack_path.with_name(self.pack_path.name + ".tmp")
+            tmp_index = self.index_path.with_name(self.index_path.name + ".tmp")
+            entries = {}
+            with open(self.pack_path, "rb") as src, open(tmp_pack, "wb") as pack, open(tmp_index, "wb") as index:
+                for key, (offset, length, sha) in sorted(self._entries.items(), key=lambda kv: kv[1][0]):
+                    src.seek(offset)
+                    member = src.read(length)
+                    if self._decode(member, sha) is None:
+                        continue
+                    new_offset = pack.tell()
+                    pack.write(member)
+                    index.write(_ENTRY.pack(key[1].encode("utf-8"), KINDS.index(key[0]), new_offset, length, sha))
+                    entries[key] = (new_offset, length, sha)
+            # Not atomic across the two files; a crash in between only leaves entries that fail _decode().
+            os.replace(tmp_pack, self.pack_path)
+            os.replace(tmp_index, self.index_path)
+            self._entries, self._dead_bytes = entries, 0
+
+    def maybe_compact(self) -> bool:
+        """Compact once superseded records take more space than live ones."""
+        s = self.stats()
+        if s["dead_bytes"] and s["dead_bytes"] > s["live_bytes"]:
+            self.compact()
+            return True
+        return False
+
+
+def _backfill(corpus: CorpusPack) -> None:
+    """Pack transcripts and enriched records written before the corpus existed."""
+    for kind, directory in (("transcript", TRANSCRIPTS_DIR), ("enriched", ENRICHED_DIR)):
+        if not directory.exists():
+            continue
+        for path in sorted(directory.glob("*.json*")):
+            if path.name.endswith(".tmp"):
+                continue
+            try:
+                record = read_record(path)
+            except (OSError, ValueError):
+                continue
+            video_id = path.name.split(".", 1)[0]
+            body = path.read_bytes() if kind == "enriched" else dumps(record)
+            corpus.append(kind, video_id, body)
+
+
+_corpus: CorpusPack | None = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus() -> CorpusPack:
+    """Process-wide pack. The first time it is opened, existing per-video files are packed."""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            new = not CORPUS_INDEX_PATH.exists()
+            _corpus = CorpusPack(CORPUS_PACK_PATH, CORPUS_INDEX_PATH)
+            if new:
+                _backfill(_corpus)
+        return _corpus
+
+
+def save_transcript(video_id: str, payload: dict) -> Path:
+    """Write a transcript as .json.gz (removing a legacy plain .json) and append it to the corpus."""
+    TRANSCRIPTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = TRANSCRIPTS_DIR / f"{video_id}.json.gz"
+    body = dumps(payload)
+    write_gz(path, body)
+    (TRANSCRIPTS_DIR / f"{video_id}.json").unlink(missing_ok=True)
+    get_corpus().append("transcript", video_id, body)
+    return path
+
+
+def save_enriched(video_id: str, record: dict) -> tuple[Path, str]:
+    """Write an enriched record and append it to the corpus; returns (path, sha256 of what was written)."""
+    ENRICHED_DIR.mkdir(parents=True, exist_ok=True)
+    path = ENRICHED_DIR / f"{video_id}.json"
+    body = dumps(record)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(body)
+    os.replace(tmp, path)
+    get_corpus().append("enriched", video_id, body)
+    return path, hashlib.sha256(body).hexdigest()
+
+
+def load_enriched(video_id: str, sha256: str | None = None, path: Path | None = None) -> dict:
+    """An enriched record from the pack when it holds the expected version, else from its file."""
+    record = get_corpus().get("enriched", video_id, sha256) if sha256 else None
+    if record is None:
+        record = read_record(path or ENRICHED_DIR / f"{video_id}.json")
+    return record
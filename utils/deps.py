@@ -0,0 +1,64 @@
+"""
+Make-style dependency tracking. Every artifact's stage row records what it was built from:
+input_hash (upstream artifact's output hash, or the playlist fingerprint for transcripts) and
+recipe_hash (the code and config that produced it). An artifact is stale when either differs from
+what the current tree would use, or its output file is gone.
+"""
+import hashlib
+import inspect
+from functools import lru_cache
+from pathlib import Path
+
+
+def digest(*parts) -> str:
+    """Stable sha256 over str() of each part (None included), NUL-separated."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def source_hash(obj) -> str:
+    """sha256 of a function's or module's source code: editing it invalidates what it produced."""
+    return hashlib.sha256(inspect.getsource(obj).encode("utf-8")).hexdigest()
+
+
+def stale_reason(row: dict, recipe_hash: str) -> str | None:
+    """
+    Why a stage_view() row must be rebuilt, or None if it is fresh. Rows from before dependency
+    tracking (no stored hashes) count as fresh; StateStore.adopt() stamps them.
+    """
+    status = row.get("status")
+    if status is None:
+        return "new"
+    if status != "ok":
+        return status
+    if row.get("recipe_hash") and row["recipe_hash"] != recipe_hash:
+        return "code/config changed"
+    if row.get("input_hash") and row.get("expected_input") and row["input_hash"] != row["expected_input"]:
+        return "input changed"
+    if row.get("output_path") and not Path(row["output_path"]).exists():
+        return "output missing"
+    return None
+
+
+def plan_stage(view: list[dict], recipe_hash: str, upstream_rebuilds: set[str] | None = None) -> dict[str, str]:
+    """
+    {video_id: reason} for every video whose artifact would be rebuilt. A video whose upstream artifact
+    is being rebuilt is rebuilt too; one whose upstream failed is left out (nothing to build from).
+    """
+    upstream_rebuilds = upstream_rebuilds or set()
+    plan = {}
+    for row in view:
+        video_id = row["video_id"]
+        if video_id in upstream_rebuilds:
+            plan[video_id] = "upstream rebuilds"
+            continue
+        if row.get("upstream_status") != "ok":
+            continue
+        reason = stale_reason(row, recipe_hash)
+        if reason:
+            plan[video_id] = reason
+    return plan
@@ -0,0 +1,149 @@
+"""
+Publishing files into the vault without rewriting what has not changed. A file whose size and mtime (or,
+failing that, content hash) match the source is left alone, so Obsidian Sync / iCloud do not re-upload it.
+Changed files are transferred with the cheapest method the filesystem allows (reflink, then
+copy_file_range, then sendfile, then a chunked copy; a hardlink on request) into a temp file that is
+renamed over the destination.
+"""
+import errno
+import hashlib
+import os
+from pathlib import Path
+
+CHUNK_SIZE = 1 << 20
+FICLONE = 0x40049409  # Linux ioctl: share the source's extents (btrfs, XFS, bcachefs)
+
+# errnos meaning "this method is not available here", after which the next one is tried
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EPERM, errno.EBADF}
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_unchanged(src: Path, dest: Path) -> bool:
+    """
+    True when dest already holds src's content: same file, or same size and mtime, or same size and hash.
+    A hash match copies src's mtime onto dest, so the next check stops at stat().
+    """
+    try:
+        d = dest.stat()
+    except FileNotFoundError:
+        return False
+    s = src.stat()
+    if (s.st_dev, s.st_ino) == (d.st_dev, d.st_ino):
+        return True
+    if s.st_size != d.st_size:
+        return False
+    if s.st_mtime_ns == d.st_mtime_ns:
+        return True
+    if file_sha256(src) != file_sha256(dest):
+        return False
+    os.utime(dest, ns=(d.st_atime_ns, s.st_mtime_ns))
+    return True
+
+
+def _reflink(src_fd: int, dst_fd: int, size: int) -> None:
+    import fcntl
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int) -> None:
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src_fd, dst_fd, size - copied)
+        if n == 0:
+            break
+        copied += n
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        n = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if n == 0:
+            break
+        offset += n
+
+
+def _stream(src_fd: int, dst_fd: int, size: int) -> None:
+    while chunk := os.read(src_fd, CHUNK_SIZE):
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+_TRANSFERS = [
+    ("reflink", _reflink, lambda: hasattr(os, "uname") and os.uname().sysname == "Linux"),
+    ("copy_file_range", _copy_file_range, lambda: hasattr(os, "copy_file_range")),
+    ("sendfile", _sendfile, lambda: hasattr(os, "sendfile") and os.uname().sysname == "Linux"),
+    ("stream", _stream, lambda: True),
+]
+
+
+def _copy_into(src: Path, tmp: Path, size: int) -> str:
+    """Copy src into a new file at tmp with the first method that works; returns its name."""
+    for name, transfer, available in _TRANSFERS:
+        if not available():
+            continue
+        with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+            try:
+                transfer(fsrc.fileno(), fdst.fileno(), size)
+            except OSError as e:
+                if name == "stream" or e.errno not in _UNSUPPORTED:
+                    raise
+                continue
+            if os.fstat(fdst.fileno()).st_size == size:
+                return name
+    raise OSError(f"Could not copy {src} to {tmp}")
+
+
+def publish_file(src: Path, dest: Path, hardlink: bool = False) -> tuple[str, int]:
+    """
+    Make dest a copy of src unless it already is one. Returns (method, bytes): "unchanged" with the bytes
+    skipped, or how the bytes were written ("hardlink", "reflink", "copy_file_range", "sendfile",
+    "stream"). Readers of dest see the old file or the new one, never a partial write. `hardlink` shares
+    src's inode instead of copying (same filesystem only; an edit to either file then shows in both).
+    """
+    size = src.stat().st_size
+    if is_unchanged(src, dest):
+        return "unchanged", size
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        method = None
+        if hardlink:
+            try:
+                os.link(src, tmp)
+                method = "hardlink"
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED and e.errno != errno.EMLINK:
+                    raise
+        if method is None:
+            method = _copy_into(src, tmp, size)
+            s = src.stat()
+            os.utime(tmp, ns=(s.st_atime_ns, s.st_mtime_ns))  # lets the next is_unchanged() stop at stat()
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return method, size
+
+
+def publish_bytes(data: bytes, dest: Path) -> bool:
+    """Write data to dest (atomically) unless it already holds exactly that; returns whether it wrote."""
+    try:
+        if dest.stat().st_size == len(data) and dest.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, dest)
+    return True
@@ -0,0 +1,258 @@
+"""
+Offline batch submission for enrichment: one JSONL file of chat requests in, one result per custom_id out.
+OpenAIBatchBackend uses the OpenAI Batch API; LocalBatchBackend is a file-based stand-in with the
+same interface so the submit → poll → fan-out flow can run without network.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable
+
+from utils.chunking import estimate_tokens
+from utils.llm_providers import canned_enrichment
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+BATCH_DIR = DATA_DIR / "batches"
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def batch_request_line(custom_id: str, model: str, prompt: str) -> dict:
+    """One request line in the OpenAI batch JSONL format (also what LocalBatchBackend reads)."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model, "messages": [{"role": "user", "content": prompt}]},
+    }
+
+
+def _text_from_result_line(line: dict) -> tuple[str, str | None]:
+    """(custom_id, response text or None if that request failed) from one batch output line."""
+    custom_id = line.get("custom_id", "")
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code", 200) != 200:
+        return custom_id, None
+    choices = (response.get("body") or {}).get("choices") or []
+    if not choices:
+        return custom_id, None
+    return custom_id, ((choices[0].get("message") or {}).get("content") or "").strip()
+
+
+def _usage_from_result_line(line: dict) -> tuple[int, int, int] | None:
+    """(prompt, completion, cached prompt) tokens the API reported for one batch output line, if any."""
+    usage = ((line.get("response") or {}).get("body") or {}).get("usage")
+    if not usage:
+        return None
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0, cached
+
+
+class BatchBackend(ABC):
+    """
+    Submit a JSONL request file as one job, poll it, and collect {custom_id: text or None};
+    results() also fills `usage` ({custom_id: (prompt, completion, cached prompt tokens)}) where reported.
+    """
+
+    name = "base"
+    usage: dict[str, tuple[int, int, int]]
+
+    @abstractmethod
+    def submit(self, requests_path: Path) -> str:
+        ...
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """One of: "pending", "completed", "failed"."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> dict[str, str | None]:
+        ...
+
+
+class OpenAIBatchBackend(BatchBackend):
+    name = "openai"
+
+    _PENDING = {"validating", "in_progress", "finalizing", "cancelling"}
+
+    def __init__(self, api_key: str | None = None):
+        from openai import OpenAI
+        self._client = OpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY"))
+        self.usage = {}
+
+    def submit(self, requests_path: Path) -> str:
+        with open(requests_path, "rb") as f:
+            uploaded = self._client.files.create(file=f, purpose="batch")
+        batch = self._client.batches.create(
+            input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window="24h"
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        batch = self._client.batches.retrieve(batch_id)
+        if batch.status in self._PENDING:
+            return "pending"
+        return "completed" if batch.status == "completed" else "failed"
+
+    def results(self, batch_id: str) -> dict[str, str | None]:
+        batch = self._client.batches.retrieve(batch_id)
+        out: dict[str, str | None] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for raw in self._client.files.content(file_id).text.splitlines():
+                if raw.strip():
+                    line = json.loads(raw)
+                    custom_id, text = _text_from_result_line(line)
+                    out[custom_id] = text
+                    if _usage_from_result_line(line):
+                        self.usage[custom_id] = _usage_from_result_line(line)
+        return out
+
+
+def _canned_response(body: dict) -> str:
+    """Default LocalBatchBackend answer: the same canned enrichment the mock provider serves."""
+    return canned_enrichment(body["messages"][-1]["content"])
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based fake: submit() copies the JSONL into BATCH_DIR/local/, and once `delay` seconds have
+    passed the first status() call "runs" it, writing an OpenAI-shaped output file via `responder`.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        root: Path | None = None,
+        responder: Callable[[dict], str] | None = None,
+        delay: float | None = None,
+    ):
+        self.root = root or BATCH_DIR / "local"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.responder = responder or _canned_response
+        self.delay = float(os.environ.get("LOCAL_BATCH_DELAY", "0")) if delay is None else delay
+        self.usage = {}
+
+    def submit(self, requests_path: Path) -> str:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        (self.root / f"{batch_id}.input.jsonl").write_bytes(Path(requests_path).read_bytes())
+        (self.root / f"{batch_id}.submitted").write_text(str(time.time()), encoding="utf-8")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        output = self.root / f"{batch_id}.output.jsonl"
+        if output.exists():
+            return "completed"
+        input_path = self.root / f"{batch_id}.input.jsonl"
+        if not input_path.exists():
+            return "failed"
+        submitted = float((self.root / f"{batch_id}.submitted").read_text(encoding="utf-8"))
+        if time.time() - submitted < self.delay:
+            return "pending"
+        lines = []
+        for raw in input_path.read_text(encoding="utf-8").splitlines():
+            if not raw.strip():
+                continue
+            request = json.loads(raw)
+            try:
+                content = self.responder(request["body"])
+                usage = {
+                    "prompt_tokens": estimate_tokens(request["body"]["messages"][-1]["content"]),
+                    "completion_tokens": estimate_tokens(content),
+                }
+                lines.append({
+                    "custom_id": request["custom_id"],
+                    "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage},
+                    },
+                    "error": None,
+                })
+            except Exception as e:
+                lines.append({"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}})
+        output.write_text("\n".join(json.dumps(l, ensure_ascii=False) for l in lines), encoding="utf-8")
+        return "completed"
+
+    def results(self, batch_id: str) -> dict[str, str | None]:
+        output = self.root / f"{batch_id}.output.jsonl"
+        out: dict[str, str | None] = {}
+        for raw in output.read_text(encoding="utf-8").splitlines():
+            if raw.strip():
+                line = json.loads(raw)
+                custom_id, text = _text_from_result_line(line)
+                out[custom_id] = text
+                if _usage_from_result_line(line):
+                    self.usage[custom_id] = _usage_from_result_line(line)
+        return out
+
+
+BATCH_BACKENDS = {
+    "openai": OpenAIBatchBackend,
+    "local": LocalBatchBackend,
+}
+
+
+def get_batch_backend(name: str | None = None) -> BatchBackend:
+    """Backend from BATCH_BACKEND (openai or local)."""
+    name = (name or os.environ.get("BATCH_BACKEND", "openai")).strip().lower()
+    if name not in BATCH_BACKENDS:
+        raise ValueError(f"Unknown BATCH_BACKEND {name!r}; choose one of: {', '.join(BATCH_BACKENDS)}")
+    return BATCH_BACKENDS[name]()
+
+
+def run_batch(
+    backend: BatchBackend,
+    prompts: dict[str, str],
+    model: str,
+    label: str,
+    poll_seconds: float,
+    logger,
+    usage: dict | None = None,
+) -> dict[str, str | None]:
+    """
+    Write `prompts` ({custom_id: prompt}) as one JSONL file, submit it and poll until done.
+    Token usage reported per request is added to `usage` ({custom_id: (prompt, completion, cached)}) if given.
+    The active batch id is kept in BATCH_DIR/active_{label}.json so an interrupted run resumes polling
+    the same job instead of paying for a second submission.
+    """
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    requests_path = BATCH_DIR / f"{label}.requests.jsonl"
+    body = "\n".join(json.dumps(batch_request_line(cid, model, p), ensure_ascii=False) for cid, p in prompts.items())
+    body_hash = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    active_path = BATCH_DIR / f"active_{label}.json"
+
+    batch_id = None
+    if active_path.exists():
+        active = json.loads(active_path.read_text(encoding="utf-8"))
+        if active.get("backend") == backend.name and active.get("requests_sha256") == body_hash:
+            batch_id = active["batch_id"]
+            logger.info("Resuming %s batch %s (%s requests)", backend.name, batch_id, len(prompts))
+    if batch_id is None:
+        requests_path.write_text(body, encoding="utf-8")
+        batch_id = backend.submit(requests_path)
+        active_path.write_text(
+            json.dumps({"backend": backend.name, "batch_id": batch_id, "requests_sha256": body_hash}),
+            encoding="utf-8",
+        )
+        logger.info("Submitted %s batch %s with %s requests", backend.name, batch_id, len(prompts))
+
+    while True:
+        status = backend.status(batch_id)
+        if status == "completed":
+            break
+        if status == "failed":
+            active_path.unlink(missing_ok=True)
+            raise RuntimeError(f"Batch {batch_id} failed on {backend.name}")
+        time.sleep(poll_seconds)
+
+    results = backend.results(batch_id)
+    if usage is not None:
+        usage.update(backend.usage)
+    active_path.unlink(missing_ok=True)
+    return results
@@ -0,0 +1,110 @@
+"""
+Content-addressed on-disk cache of LLM responses (SQLite), bounded by total size with LRU eviction.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+LLM_CACHE_PATH = DATA_DIR / "llm_cache.sqlite"
+DEFAULT_MAX_MB = 200
+
+
+def cache_key(provider: str, model: str, prompt: str) -> str:
+    """Hash of everything that determines the response: a changed transcript, prompt or model is a new key."""
+    h = hashlib.sha256()
+    for part in (provider, model, prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Maps hash(provider, model, prompt) -> response text. Safe to share between worker threads.
+    When the stored responses exceed `max_bytes`, least-recently-used entries are evicted. The stored size
+    is summed once on open and kept up to date by put() and eviction, so a put() does not rescan the table.
+    """
+
+    def __init__(self, path: Path = LLM_CACHE_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, provider: str, model: str, prompt: str) -> str | None:
+        key = cache_key(provider, model, prompt)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, provider: str, model: str, prompt: str, response: str) -> None:
+        if not response:
+            return
+        key = cache_key(provider, model, prompt)
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used rows until the stored bytes fit in max_bytes. Caller holds the lock."""
+        while self._total_bytes > self.max_bytes:
+            oldest = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 64").fetchall()
+            if not oldest:
+                self._total_bytes = 0
+                return
+            for key, size in oldest:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_llm_cache() -> LLMCache | None:
+    """Cache configured from env: LLM_CACHE=off disables it, LLM_CACHE_MAX_MB bounds its size."""
+    if os.environ.get("LLM_CACHE", "on").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    max_mb = float(os.environ.get("LLM_CACHE_MAX_MB", str(DEFAULT_MAX_MB)))
+    return LLMCache(LLM_CACHE_PATH, int(max_mb * 1024 * 1024))
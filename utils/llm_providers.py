@@ -0,0 +1,474 @@
+"""
+LLM provider backends behind one interface, each holding long-lived, connection-pooled clients.
+Selection is config-driven (LLM_PROVIDER, else OpenAI if OPENAI_API_KEY, else Gemini); "mock" serves
+canned responses from a local HTTP server for offline runs and latency benchmarks. astream() delivers a
+response as it is generated (OpenAI and Gemini token streams; the mock server streams NDJSON).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import httpx
+
+from utils.chunking import estimate_tokens
+
+DEFAULT_MAX_CONNECTIONS = 32
+
+
+def _pool_limits() -> httpx.Limits:
+    n = int(os.environ.get("LLM_MAX_CONNECTIONS", str(DEFAULT_MAX_CONNECTIONS)))
+    return httpx.Limits(max_connections=n, max_keepalive_connections=n)
+
+
+class LLMProvider(ABC):
+    """
+    Base class: subclasses implement _complete (blocking) and may override _acomplete (asyncio), each returning
+    (text, usage) where usage is (prompt tokens, completion tokens, cached prompt tokens) as reported by the API,
+    or None. Cached tokens are the part of the prompt the provider served from its prefix cache.
+    complete()/acomplete() time every request so providers can be compared on the same footing.
+    Async clients are tied to the event loop that built them: await aclose() before that loop ends.
+    """
+
+    name = "base"
+    model_env = ""
+    default_model = ""
+
+    @classmethod
+    def configured_model(cls) -> str:
+        """Model this provider would use, from its env var (e.g. OPENAI_MODEL) — without building a client."""
+        return os.environ.get(cls.model_env, cls.default_model).strip() or cls.default_model
+
+    def __init__(self, model: str):
+        self.model = model
+        self.latencies: list[float] = []
+        self._latency_lock = threading.Lock()
+        self._aclient = None
+        self._aclient_loop = None
+
+    @abstractmethod
+    def _new_async_client(self):
+        """A new async client for the running event loop (see _async_client)."""
+
+    async def _async_client(self):
+        # httpx.AsyncClient connections belong to one event loop; rebuild if a new asyncio.run() is in charge.
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            await self.aclose()
+            self._aclient = self._new_async_client()
+            self._aclient_loop = loop
+        return self._aclient
+
+    @abstractmethod
+    def _complete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        ...
+
+    async def _acomplete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        return await asyncio.to_thread(self._complete, prompt)
+
+    async def _astream(
+        self, prompt: str, on_delta: Callable[[str], None]
+    ) -> tuple[str, tuple[int, int, int] | None]:
+        # Providers without a token stream hand over the whole response as one delta.
+        text, usage = await self._acomplete(prompt)
+        on_delta(text)
+        return text, usage
+
+    def _record(self, started: float) -> None:
+        with self._latency_lock:
+            self.latencies.append(time.perf_counter() - started)
+
+    def complete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        started = time.perf_counter()
+        try:
+            return self._complete(prompt)
+        finally:
+            self._record(started)
+
+    async def acomplete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        started = time.perf_counter()
+        try:
+            return await self._acomplete(prompt)
+        finally:
+            self._record(started)
+
+    async def astream(
+        self, prompt: str, on_delta: Callable[[str], None]
+    ) -> tuple[str, tuple[int, int, int] | None]:
+        """Like acomplete, but calls on_delta with each piece of text as it arrives."""
+        started = time.perf_counter()
+        try:
+            text, usage = await self._astream(prompt, on_delta)
+            return text.strip(), usage
+        finally:
+            self._record(started)
+
+    def latency_stats(self) -> dict:
+        """Per-request latency summary in milliseconds (empty if nothing was sent)."""
+        with self._latency_lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return {}
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return {
+            "latency_p50_ms": round(statistics.median(samples) * 1000, 1),
+            "latency_p95_ms": round(p95 * 1000, 1),
+            "latency_max_ms": round(samples[-1] * 1000, 1),
+        }
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        """Close the async client (and its pooled connections) built for the running event loop."""
+        client, self._aclient, self._aclient_loop = self._aclient, None, None
+        if client is None:
+            return
+        try:
+            # httpx.AsyncClient has aclose(); AsyncOpenAI's equivalent is close().
+            await (client.aclose() if hasattr(client, "aclose") else client.close())
+        except RuntimeError:
+            pass  # left over from an event loop that is already closed; its connections went with it
+
+
+def _openai_usage(response) -> tuple[int, int, int] | None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+    model_env = "OPENAI_MODEL"
+    default_model = "gpt-4o-mini"
+
+    def __init__(self, model: str | None = None, api_key: str | None = None):
+        super().__init__(model or self.configured_model())
+        try:
+            from openai import AsyncOpenAI, OpenAI
+        except ImportError:
+            raise ImportError("OpenAI is set but the 'openai' package is missing. Run: pip install openai")
+        self._api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self._async_cls = AsyncOpenAI
+        self._client = OpenAI(api_key=self._api_key, http_client=httpx.Client(limits=_pool_limits()))
+
+    def _new_async_client(self):
+        return self._async_cls(api_key=self._api_key, http_client=httpx.AsyncClient(limits=_pool_limits()))
+
+    def _complete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        r = self._client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return (r.choices[0].message.content or "").strip(), _openai_usage(r)
+
+    async def _acomplete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        r = await (await self._async_client()).chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return (r.choices[0].message.content or "").strip(), _openai_usage(r)
+
+    async def _astream(
+        self, prompt: str, on_delta: Callable[[str], None]
+    ) -> tuple[str, tuple[int, int, int] | None]:
+        stream = await (await self._async_client()).chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            stream_options={"include_usage": True},  # usage arrives on a final chunk without choices
+        )
+        pieces, usage = [], None
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+                on_delta(pieces[-1])
+            if getattr(chunk, "usage", None) is not None:
+                usage = _openai_usage(chunk)
+        return "".join(pieces), usage
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def _gemini_text(response) -> str:
+    text = getattr(response, "text", None) or ""
+    if not text and getattr(response, "candidates", None):
+        c = response.candidates[0]
+        if getattr(c, "content", None) and c.content.parts:
+            text = getattr(c.content.parts[0], "text", None) or ""
+    return text.strip()
+
+
+def _gemini_usage(response) -> tuple[int, int, int] | None:
+    meta = getattr(response, "usage_metadata", None)
+    if meta is None:
+        return None
+    # Thinking models bill their thoughts as output tokens too.
+    output = (getattr(meta, "candidates_token_count", 0) or 0) + (getattr(meta, "thoughts_token_count", 0) or 0)
+    cached = getattr(meta, "cached_content_token_count", 0) or 0
+    return getattr(meta, "prompt_token_count", 0) or 0, output, cached
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    model_env = "GEMINI_MODEL"
+    default_model = "gemini-2.0-flash"
+
+    def __init__(self, model: str | None = None, api_key: str | None = None):
+        super().__init__(model or self.configured_model())
+        from google import genai
+        self._genai = genai
+        self._api_key = api_key or os.environ.get("GEMINI_API_KEY")
+        # One pooled sync client for the whole run; the async side gets one per event loop.
+        self._client = genai.Client(api_key=self._api_key)
+
+    def _new_async_client(self):
+        return self._genai.Client(api_key=self._api_key).aio
+
+    def _complete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        r = self._client.models.generate_content(model=self.model, contents=prompt)
+        return _gemini_text(r), _gemini_usage(r)
+
+    async def _acomplete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        r = await (await self._async_client()).models.generate_content(model=self.model, contents=prompt)
+        return _gemini_text(r), _gemini_usage(r)
+
+    async def _astream(
+        self, prompt: str, on_delta: Callable[[str], None]
+    ) -> tuple[str, tuple[int, int, int] | None]:
+        pieces, usage = [], None
+        aio = await self._async_client()
+        async for chunk in await aio.models.generate_content_stream(model=self.model, contents=prompt):
+            text = getattr(chunk, "text", None) or ""
+            if text:
+                pieces.append(text)
+                on_delta(text)
+            if getattr(chunk, "usage_metadata", None) is not None:
+                usage = _gemini_usage(chunk)  # running totals; the last chunk's are final
+        return "".join(pieces), usage
+
+    def close(self) -> None:
+        self._client.close()
+
+
+_CANNED_SECTIONS = {
+    "Summary": "Canned summary ({} prompt chars).",
+    "Key Ideas": "- Idea one\n- Idea two",
+    "Takeaways & Action Items": "- Takeaway",
+    "Notable Quotes": "> Quote",
+    "Related Concepts": "[[Mock Concept]]",
+}
+
+
+def canned_enrichment(prompt: str) -> str:
+    """
+    A well-formed enrichment for offline backends: one canned section per "## " heading the prompt's
+    request (the part after its last "---" line, see REQUEST_TEMPLATE in gemini_agent) asks for.
+    """
+    request = prompt.rsplit("\n---\n", 1)[-1]
+    headings = [line[3:].strip() for line in request.splitlines() if line.startswith("## ")] or list(_CANNED_SECTIONS)
+    return "\n\n".join(
+        f"## {h}\n" + _CANNED_SECTIONS.get(h, f"- Canned {h.lower()}").format(len(prompt)) for h in headings
+    )
+
+
+MOCK_CACHE_BLOCK_CHARS = 512
+MOCK_STREAM_PIECES = 8
+
+
+class _PrefixCache:
+    """
+    Simulated provider prefix cache: a prompt's longest leading run of whole blocks already seen in an
+    earlier prompt counts as cached, as OpenAI and Gemini report for repeated prompt prefixes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen: set[bytes] = set()
+
+    def cached_chars(self, prompt: str) -> int:
+        h = hashlib.blake2b(digest_size=16)
+        keys = []
+        for start in range(0, len(prompt) - MOCK_CACHE_BLOCK_CHARS + 1, MOCK_CACHE_BLOCK_CHARS):
+            h.update(prompt[start:start + MOCK_CACHE_BLOCK_CHARS].encode("utf-8"))
+            keys.append(h.copy().digest())
+        with self._lock:
+            hits = 0
+            while hits < len(keys) and keys[hits] in self._seen:
+                hits += 1
+            self._seen.update(keys)
+        return hits * MOCK_CACHE_BLOCK_CHARS
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so the client's connection pool is actually exercised
+    latency = 0.0
+    prefix_cache: _PrefixCache
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = body.get("prompt", "")
+        text = canned_enrichment(prompt)
+        if body.get("stream"):
+            self._stream(text, self._usage(prompt, text))
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        payload = json.dumps({"text": text, "usage": self._usage(prompt, text)}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _usage(self, prompt: str, text: str) -> dict:
+        # Usage as an API would report it, counted with the same local estimate the budget uses.
+        return {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(text),
+            "prompt_tokens_details": {
+                "cached_tokens": estimate_tokens(prompt[: self.prefix_cache.cached_chars(prompt)]),
+            },
+        }
+
+    def _stream(self, text: str, usage: dict) -> None:
+        """NDJSON: {"delta": ...} lines spread over the simulated latency, then {"usage": ...}."""
+        size = -(-len(text) // MOCK_STREAM_PIECES) or 1
+        lines = [json.dumps({"delta": text[i:i + size]}) + "\n" for i in range(0, len(text), size)]
+        lines.append(json.dumps({"usage": usage}) + "\n")
+        encoded = [line.encode("utf-8") for line in lines]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(sum(len(line) for line in encoded)))
+        self.end_headers()
+        try:
+            for line in encoded:
+                if self.latency:
+                    time.sleep(self.latency / len(encoded))
+                self.wfile.write(line)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client stopped reading mid-stream
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(latency_ms: float = 0.0) -> tuple[ThreadingHTTPServer, str]:
+    """Serve canned responses on 127.0.0.1 (random port) from a daemon thread; returns (server, base URL)."""
+    handler = type("MockHandler", (_MockHandler,), {"latency": latency_ms / 1000, "prefix_cache": _PrefixCache()})
+    server_cls = type("MockServer", (ThreadingHTTPServer,), {"request_queue_size": 128, "daemon_threads": True})
+    server = server_cls(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _mock_result(body: dict) -> tuple[str, tuple[int, int, int] | None]:
+    usage = body.get("usage")
+    if not usage:
+        return body["text"].strip(), None
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return body["text"].strip(), (usage["prompt_tokens"], usage["completion_tokens"], cached)
+
+
+class MockProvider(LLMProvider):
+    """
+    Talks HTTP to a canned-response server: MOCK_LLM_URL if set, otherwise one started in-process
+    (with MOCK_LLM_LATENCY_MS of simulated latency). Same pooled-client code path as a real provider.
+    """
+
+    name = "mock"
+    model_env = "MOCK_MODEL"
+    default_model = "mock-1"
+
+    def __init__(self, model: str | None = None, base_url: str | None = None):
+        super().__init__(model or self.configured_model())
+        self._server = None
+        base_url = base_url or os.environ.get("MOCK_LLM_URL", "").strip()
+        if not base_url:
+            self._server, base_url = start_mock_server(float(os.environ.get("MOCK_LLM_LATENCY_MS", "0")))
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.Client(limits=_pool_limits(), timeout=60)
+
+    def _new_async_client(self):
+        return httpx.AsyncClient(limits=_pool_limits(), timeout=60)
+
+    def _complete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        r = self._client.post(f"{self.base_url}/v1/complete", json={"model": self.model, "prompt": prompt})
+        r.raise_for_status()
+        return _mock_result(r.json())
+
+    async def _acomplete(self, prompt: str) -> tuple[str, tuple[int, int, int] | None]:
+        r = await (await self._async_client()).post(f"{self.base_url}/v1/complete", json={"model": self.model, "prompt": prompt})
+        r.raise_for_status()
+        return _mock_result(r.json())
+
+    async def _astream(
+        self, prompt: str, on_delta: Callable[[str], None]
+    ) -> tuple[str, tuple[int, int, int] | None]:
+        pieces, usage = [], None
+        body = {"model": self.model, "prompt": prompt, "stream": True}
+        async with (await self._async_client()).stream("POST", f"{self.base_url}/v1/complete", json=body) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get("delta"):
+                    pieces.append(event["delta"])
+                    on_delta(event["delta"])
+                if event.get("usage"):
+                    usage = _mock_result({"text": "", "usage": event["usage"]})[1]
+        return "".join(pieces), usage
+
+    def close(self) -> None:
+        self._client.close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "gemini": GeminiProvider,
+    "mock": MockProvider,
+}
+
+
+def provider_name(name: str | None = None) -> str:
+    """
+    Provider from LLM_PROVIDER (openai, gemini, mock). If unset: OpenAI when OPENAI_API_KEY is set,
+    else Gemini when GEMINI_API_KEY is set.
+    """
+    name = (name or os.environ.get("LLM_PROVIDER", "")).strip().lower()
+    if not name:
+        if os.environ.get("OPENAI_API_KEY", "").strip():
+            name = "openai"
+        elif os.environ.get("GEMINI_API_KEY", "").strip():
+            name = "gemini"
+        else:
+            raise ValueError("Set OPENAI_API_KEY (recommended) or GEMINI_API_KEY in .env")
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r}; choose one of: {', '.join(PROVIDERS)}")
+    return name
+
+
+def configured_provider() -> tuple[str, str]:
+    """(provider name, model) the next run would use, without connecting anywhere."""
+    name = provider_name()
+    return name, PROVIDERS[name].configured_model()
+
+
+def get_provider(name: str | None = None) -> LLMProvider:
+    """Build the configured provider (see provider_name)."""
+    return PROVIDERS[provider_name(name)]()
@@ -0,0 +1,211 @@
+"""
+LLM token accounting: per-call usage as reported by the provider, its cost in USD, a local pre-estimate
+for prompts that have not been sent yet, and a run budget (--budget-usd / --max-tokens) that admits
+videos in queue order while they still fit.
+"""
+import os
+import threading
+
+from utils.chunking import estimate_tokens
+
+# USD per 1M (input, output) tokens, standard tier; the longest matching model prefix wins.
+# LLM_PRICE_INPUT_PER_M / LLM_PRICE_OUTPUT_PER_M override these (e.g. for a model not listed here).
+PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "mock": (0.0, 0.0),
+}
+# Share of the input price charged for prompt tokens served from the provider's prefix cache.
+CACHED_INPUT_FACTOR = {
+    "gpt-4o": 0.5,
+    "gpt-4.1": 0.25,
+    "gpt-3.5": 1.0,
+    "gemini": 0.25,
+}
+# The OpenAI Batch API bills half the standard rate.
+BATCH_PRICE_FACTOR = 0.5
+# Output tokens of one enrichment response (docs/COST_51_VIDEOS.md: ~41k output tokens for 51 videos).
+EST_OUTPUT_TOKENS = 800
+
+
+class BudgetExhausted(RuntimeError):
+    """Raised instead of starting an LLM call once the run's budget is spent."""
+
+
+def model_prices(model: str) -> tuple[float, float] | None:
+    """(input, output) USD per 1M tokens for a model, or None if it is unknown and not overridden."""
+    override_in = os.environ.get("LLM_PRICE_INPUT_PER_M", "").strip()
+    override_out = os.environ.get("LLM_PRICE_OUTPUT_PER_M", "").strip()
+    if override_in or override_out:
+        return float(override_in or 0), float(override_out or 0)
+    matches = [prefix for prefix in PRICES_PER_MILLION if model.startswith(prefix)]
+    return PRICES_PER_MILLION[max(matches, key=len)] if matches else None
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float | None:
+    """USD for one call; `cached_tokens` (part of prompt_tokens) are billed at the model's cached-input rate."""
+    prices = model_prices(model)
+    if prices is None:
+        return None
+    matches = [prefix for prefix in CACHED_INPUT_FACTOR if model.startswith(prefix)]
+    cached_factor = CACHED_INPUT_FACTOR[max(matches, key=len)] if matches else 1.0
+    billed_input = prompt_tokens - cached_tokens + cached_tokens * cached_factor
+    return (billed_input * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def estimate_job(prompts: list[str], reduce_overhead: str = "", extra_outputs: int = 0) -> tuple[int, int]:
+    """
+    (input, output) token estimate for one video: every prompt plus, when there are several (map-reduce),
+    a reduce call whose input is the part responses, plus `extra_outputs` further calls on the same prefix
+    as the last one (counted in full, although the provider may serve most of it from its cache).
+    Purely local; nothing is sent.
+    """
+    prompt_tokens = sum(estimate_tokens(p) for p in prompts)
+    calls = len(prompts)
+    base = prompt_tokens
+    if calls > 1:
+        base = estimate_tokens(reduce_overhead) + calls * EST_OUTPUT_TOKENS
+        prompt_tokens += base
+        calls += 1
+    prompt_tokens += extra_outputs * base
+    calls += extra_outputs
+    return prompt_tokens, calls * EST_OUTPUT_TOKENS
+
+
+class RunUsage:
+    """Tokens and cost of this process's LLM calls, per video. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._videos: dict[str, list] = {}
+
+    def add(
+        self, video_id: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int, cost: float | None
+    ) -> None:
+        with self._lock:
+            totals = self._videos.setdefault(video_id, [0, 0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += prompt_tokens
+            totals[2] += completion_tokens
+            totals[3] += cached_tokens
+            totals[4] += cost or 0.0
+
+    def per_video(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                video_id: {
+                    "calls": c,
+                    "prompt_tokens": p,
+                    "completion_tokens": o,
+                    "cached_tokens": cached,
+                    "cost_usd": round(usd, 6),
+                }
+                for video_id, (c, p, o, cached, usd) in self._videos.items()
+            }
+
+    def totals(self) -> dict:
+        """Run totals, plus cached_ratio: the share of prompt tokens served from the provider's prefix cache."""
+        videos = self.per_video().values()
+        totals = {
+            key: round(sum(v[key] for v in videos), 6) if key == "cost_usd" else sum(v[key] for v in videos)
+            for key in ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+        }
+        prompt_tokens = totals["prompt_tokens"]
+        totals["cached_ratio"] = round(totals["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0
+        return totals
+
+
+_run_usage = RunUsage()
+
+
+def get_run_usage() -> RunUsage:
+    """Usage recorded in this process (written into data/run_report.md by pipeline.py)."""
+    return _run_usage
+
+
+class Budget:
+    """
+    A spending cap for one enrichment run, in USD and/or total tokens. Videos are admitted in queue order
+    against their estimates (reserve); once a video is done its reservation is replaced by what it actually
+    used (settle). Estimates are scaled by the actual/estimated prompt-token ratio seen so far in the run,
+    so a tokenizer that counts Greek more densely than estimate_tokens does not overshoot the cap.
+    Used from one thread (the enrichment event loop, or the batch path).
+    """
+
+    def __init__(
+        self, model: str, max_usd: float | None = None, max_tokens: int | None = None, price_factor: float = 1.0
+    ):
+        if max_usd is not None and model_prices(model) is None:
+            raise ValueError(
+                f"No price known for model {model!r}; set LLM_PRICE_INPUT_PER_M and LLM_PRICE_OUTPUT_PER_M "
+                "to use --budget-usd"
+            )
+        self.model = model
+        self.max_usd = max_usd
+        self.max_tokens = max_tokens
+        self.price_factor = price_factor  # e.g. BATCH_PRICE_FACTOR when the calls go through the Batch API
+        self.spent_tokens = 0
+        self.spent_usd = 0.0
+        self._reserved_tokens = 0
+        self._reserved_usd = 0.0
+        self._estimated_prompt = 0
+        self._actual_prompt = 0
+        self.admitted = 0
+
+    def _scaled(self, estimate: tuple[int, int]) -> tuple[int, int, float]:
+        ratio = self._actual_prompt / self._estimated_prompt if self._estimated_prompt else 1.0
+        prompt_tokens = int(estimate[0] * max(ratio, 1.0))
+        usd = (cost_usd(self.model, prompt_tokens, estimate[1]) or 0.0) * self.price_factor
+        return prompt_tokens, estimate[1], usd
+
+    def reserve(self, estimate: tuple[int, int]) -> tuple[int, float] | None:
+        """
+        Admit a video if its (scaled) estimate fits what is left: returns the reservation to settle() later,
+        or None if it does not fit.
+        """
+        prompt_tokens, completion_tokens, usd = self._scaled(estimate)
+        tokens = prompt_tokens + completion_tokens
+        over_tokens = (
+            self.max_tokens is not None and self.spent_tokens + self._reserved_tokens + tokens > self.max_tokens
+        )
+        over_usd = self.max_usd is not None and self.spent_usd + self._reserved_usd + usd > self.max_usd
+        if over_tokens or over_usd:
+            return None
+        self._reserved_tokens += tokens
+        self._reserved_usd += usd
+        self.admitted += 1
+        return tokens, usd
+
+    def charge(self, estimated_prompt: int, prompt_tokens: int, completion_tokens: int, cost: float | None) -> None:
+        """Count one call's actual usage (and how far off its prompt estimate was)."""
+        self.spent_tokens += prompt_tokens + completion_tokens
+        self.spent_usd += cost or 0.0
+        self._estimated_prompt += estimated_prompt
+        self._actual_prompt += prompt_tokens
+
+    def settle(self, reservation: tuple[int, float]) -> None:
+        """Drop a finished (or failed) video's reservation; its calls were already charged."""
+        self._reserved_tokens -= reservation[0]
+        self._reserved_usd -= reservation[1]
+
+    def exhausted(self) -> bool:
+        """True once actual spending has reached a cap: no further call may start."""
+        return (self.max_tokens is not None and self.spent_tokens >= self.max_tokens) or (
+            self.max_usd is not None and self.spent_usd >= self.max_usd
+        )
+
+    def stats(self) -> dict:
+        stats = {"budget_videos_admitted": self.admitted}
+        if self.max_usd is not None:
+            stats.update(budget_usd=self.max_usd, budget_spent_usd=round(self.spent_usd, 4))
+        if self.max_tokens is not None:
+            stats.update(budget_tokens=self.max_tokens, budget_spent_tokens=self.spent_tokens)
+        return stats
@@ -0,0 +1,179 @@
+"""
+Near-duplicate transcripts (reuploads, mirrors, the same episode in two playlists): a MinHash signature of
+each transcript's word 5-gram shingles, indexed by LSH bands in data/near_dup.sqlite. A lookup only compares
+signatures that share a band bucket, so it costs the same for 50 or 50,000 indexed videos.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("Near-duplicate detection needs numpy. Install with: pip install numpy")
+
+from utils.search_index import fold
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+NEAR_DUP_DB_PATH = DATA_DIR / "near_dup.sqlite"
+
+NUM_PERM = 128
+BANDS = 32  # 32 bands x 4 rows: pairs with Jaccard >= 0.6 share a bucket with probability > 0.98
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+
+_WORD = re.compile(r"\w+")
+_rng = np.random.default_rng(20240101)  # fixed seed: signatures must stay comparable across runs
+_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_NGRAM = np.uint64(0x100000001B3)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    video_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    shingles INTEGER NOT NULL,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    video_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_bucket ON bands(band, bucket);
+CREATE INDEX IF NOT EXISTS bands_video ON bands(video_id);
+"""
+
+
+def shingles(text: str) -> np.ndarray:
+    """Distinct 64-bit hashes of the text's word 5-grams (accents and case folded)."""
+    words = _WORD.findall(fold(text).casefold())
+    hashed = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    if len(hashed) < SHINGLE_WORDS:
+        return np.unique(hashed)
+    n = len(hashed) - SHINGLE_WORDS + 1
+    combined = np.zeros(n, dtype=np.uint64)
+    for j in range(SHINGLE_WORDS):  # polynomial rolling combination, wrapping mod 2**64
+        combined = combined * _NGRAM + hashed[j:j + n]
+    return np.unique(combined)
+
+
+def signature(text: str) -> tuple[np.ndarray, int]:
+    """(MinHash signature as NUM_PERM uint32, number of shingles). Multiply-shift hashing, all permutations at once."""
+    s = shingles(text)
+    if not len(s):
+        return np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32), 0
+    hashed = (_A[:, None] * s[None, :] + _B[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32), len(s)
+
+
+def _buckets(sig: np.ndarray) -> list[tuple[int, int]]:
+    return [
+        (band, int.from_bytes(hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest(),
+                              "little", signed=True))
+        for band in range(BANDS)
+    ]
+
+
+class NearDupIndex:
+    """Persistent MinHash/LSH index: one signature per video, keyed by the transcript hash it was computed from."""
+
+    def __init__(self, path: Path | None = None):
+        path = path or NEAR_DUP_DB_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def sources(self) -> dict[str, str]:
+        """{video id: transcript hash its signature was computed from}."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT video_id, source FROM signatures"))
+
+    def add(self, video_id: str, source: str, text: str) -> None:
+        """(Re)index a transcript; a no-op when `source` (its hash) has not changed."""
+        with self._lock:
+            row = self._conn.execute("SELECT source FROM signatures WHERE video_id = ?", (video_id,)).fetchone()
+        if row and row[0] == source:
+            return
+        sig, n = signature(text)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bands WHERE video_id = ?", (video_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures (video_id, source, shingles, signature) VALUES (?, ?, ?, ?)",
+                (video_id, source, n, sig.tobytes()),
+            )
+            if n:
+                self._conn.executemany(
+                    "INSERT INTO bands (band, bucket, video_id) VALUES (?, ?, ?)",
+                    [(band, bucket, video_id) for band, bucket in _buckets(sig)],
+                )
+
+    def update(self, corpus) -> dict:
+        """Fingerprint every transcript in a CorpusPack whose hash changed since it was last fingerprinted."""
+        started = time.monotonic()
+        current = {video_id: sha for (_, video_id), sha in corpus.hashes("transcript").items()}
+        known = self.sources()
+        counts = {"fingerprinted": 0, "removed": 0}
+        for video_id, sha in current.items():
+            if known.get(video_id) == sha:
+                continue
+            record = corpus.get("transcript", video_id)
+            if record is not None:
+                self.add(video_id, sha, record.get("transcript", ""))
+                counts["fingerprinted"] += 1
+        for video_id in known.keys() - current.keys():
+            self.remove(video_id)
+            counts["removed"] += 1
+        counts["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return counts
+
+    def remove(self, video_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bands WHERE video_id = ?", (video_id,))
+            self._conn.execute("DELETE FROM signatures WHERE video_id = ?", (video_id,))
+
+    def similar(self, video_id: str, threshold: float) -> list[tuple[str, float]]:
+        """[(video id, estimated Jaccard similarity)] of indexed videos at or above threshold, most similar first."""
+        with self._lock:
+            row = self._conn.execute("SELECT signature FROM signatures WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                return []
+            candidates = self._conn.execute(
+                "SELECT s.video_id, s.signature FROM signatures s WHERE s.video_id IN ("
+                "SELECT DISTINCT b2.video_id FROM bands b1 JOIN bands b2 "
+                "ON b2.band = b1.band AND b2.bucket = b1.bucket AND b2.video_id != b1.video_id "
+                "WHERE b1.video_id = ?)",
+                (video_id,),
+            ).fetchall()
+        if not candidates:
+            return []
+        sig = np.frombuffer(row[0], dtype=np.uint32)
+        others = np.frombuffer(b"".join(c[1] for c in candidates), dtype=np.uint32).reshape(len(candidates), NUM_PERM)
+        scores = (others == sig).mean(axis=1)
+        hits = [(candidates[i][0], round(float(scores[i]), 3)) for i in np.flatnonzero(scores >= threshold)]
+        return sorted(hits, key=lambda hit: -hit[1])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_index: NearDupIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_near_dup_index() -> NearDupIndex:
+    """Process-wide near-duplicate index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDupIndex()
+        return _index
@@ -11,6 +11,15 @@ def safe_filename(index: int, title: str, max_len: int = 80) -> str:
     return f"{index:02d} - {safe[:max_len]}.md"
 
 
+def note_names(videos: list[dict]) -> dict[str, tuple[str, str]]:
+    """{video id: (note name without .md, title)} for playlist-ordered videos, numbered as their notes are."""
+    return {
+        v["id"]: (safe_filename(i, v.get("title") or "Unknown")[:-3], v.get("title") or "Unknown")
+        for i, v in enumerate(videos, 1)
+        if v.get("id")
+    }
+
+
 def format_note(
     title: str,
     playlist_title: str,
@@ -22,10 +31,18 @@ def format_note(
     notebook_id: str,
     gemini_notes: str,
     playlist_slug: str,
+    related_videos: list[tuple[str, str]] | None = None,
 ) -> str:
-    """Produce a full Obsidian note with YAML frontmatter and gemini content."""
+    """
+    Produce a full Obsidian note with YAML frontmatter and gemini content.
+    related_videos: (note name, title) pairs listed as wikilinks under "## Related Videos".
+    """
     today = date.today().isoformat()
     date_str = upload_date if isinstance(upload_date, str) else str(upload_date)
+    related = ""
+    if related_videos:
+        links = "\n".join(f"- [[{name}|{related_title}]]" for name, related_title in related_videos)
+        related = f"\n\n## Related Videos\n\n{links}"
 
     frontmatter = f"""---
 title: "{title.replace('"', '\\"')}"
@@ -52,7 +69,7 @@ tags:
 
 ---
 
-{gemini_notes}
+{gemini_notes}{related}
 
 ---
 *Auto-generated from Greek transcript using AI (OpenAI or Gemini)*
@@ -0,0 +1,252 @@
+"""
+NotebookLM backends behind one small async interface: the notebooklm-py client (browser session from
+`notebooklm login`) or a local fake that simulates slow and failing source ingestion and artifact jobs,
+for offline runs and benchmarks. Selected with NOTEBOOKLM_BACKEND (notebooklm or fake).
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+# Artifacts a notebook can generate, in the order they are reported.
+ARTIFACTS = ("audio", "mindmap", "quiz", "flashcards")
+
+# Source states as returned by list_sources().
+SOURCE_READY = "ready"
+SOURCE_ERROR = "error"
+SOURCE_PROCESSING = "processing"
+
+
+class UnsupportedArtifact(RuntimeError):
+    """Raised by a backend that cannot produce an artifact at all; retrying will not help."""
+
+
+class NotebookLMBackend(ABC):
+    """
+    Interface used by agents/notebooklm_agent.py; an async context manager. Source methods work on
+    YouTube URLs; artifact methods take one of ARTIFACTS. generate() returns a task id to wait() for,
+    or None when the artifact is ready as soon as generate() returns. generate() and download() raise
+    UnsupportedArtifact for an artifact the backend cannot produce.
+    """
+
+    name = "base"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    @abstractmethod
+    async def create_notebook(self, name: str) -> str:
+        ...
+
+    @abstractmethod
+    async def add_source(self, notebook_id: str, url: str) -> str:
+        """Submit a URL without waiting for NotebookLM to process it; returns the source id."""
+
+    @abstractmethod
+    async def list_sources(self, notebook_id: str) -> list[tuple[str, str | None, str]]:
+        """[(source id, url, SOURCE_READY / SOURCE_ERROR / SOURCE_PROCESSING)] of every source in the notebook."""
+
+    @abstractmethod
+    async def delete_source(self, notebook_id: str, source_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def generate(self, notebook_id: str, kind: str) -> str | None:
+        ...
+
+    @abstractmethod
+    async def wait(self, notebook_id: str, task_id: str, timeout: float) -> None:
+        """Return once the job is done; raise on failure or after `timeout` seconds."""
+
+    @abstractmethod
+    async def download(self, notebook_id: str, kind: str, path: Path) -> None:
+        ...
+
+
+class NotebookLMPyBackend(NotebookLMBackend):
+    """notebooklm-py, logged in from the stored browser session."""
+
+    name = "notebooklm"
+
+    def __init__(self):
+        try:
+            import notebooklm
+        except ImportError:
+            raise ImportError("notebooklm-py is required. Install with: pip install 'notebooklm-py[browser]'")
+        self._lib = notebooklm
+        self._client = None
+
+    async def __aenter__(self):
+        self._client = await (await self._lib.NotebookLMClient.from_storage()).__aenter__()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._client.__aexit__(*exc)
+
+    async def create_notebook(self, name: str) -> str:
+        return (await self._client.notebooks.create(name)).id
+
+    async def add_source(self, notebook_id: str, url: str) -> str:
+        return (await self._client.sources.add_url(notebook_id, url, wait=False)).id
+
+    async def list_sources(self, notebook_id: str) -> list[tuple[str, str | None, str]]:
+        states = {
+            self._lib.SourceStatus.READY: SOURCE_READY,
+            self._lib.SourceStatus.ERROR: SOURCE_ERROR,
+        }
+        return [
+            (s.id, getattr(s, "url", None), states.get(getattr(s, "status", None), SOURCE_PROCESSING))
+            for s in await self._client.sources.list(notebook_id)
+        ]
+
+    async def delete_source(self, notebook_id: str, source_id: str) -> None:
+        await self._client.sources.delete(notebook_id, source_id)
+
+    async def generate(self, notebook_id: str, kind: str) -> str | None:
+        artifacts = self._client.artifacts
+        if kind == "audio":
+            status = await artifacts.generate_audio(notebook_id, instructions="Create an engaging overview in English")
+        elif kind == "mindmap":
+            await artifacts.generate_mind_map(notebook_id)
+            return None
+        elif kind == "quiz":
+            # Library enums (QuizDifficulty.HARD, QuizQuantity.MORE), not strings.
+            status = await artifacts.generate_quiz(notebook_id, difficulty=self._lib.QuizDifficulty.HARD)
+        elif kind == "flashcards":
+            status = await artifacts.generate_flashcards(notebook_id, quantity=self._lib.QuizQuantity.MORE)
+        else:
+            raise ValueError(f"Unknown artifact {kind!r}")
+        return status.task_id
+
+    async def wait(self, notebook_id: str, task_id: str, timeout: float) -> None:
+        await self._client.artifacts.wait_for_completion(notebook_id, task_id, timeout=timeout)
+
+    async def download(self, notebook_id: str, kind: str, path: Path) -> None:
+        artifacts = self._client.artifacts
+        if kind == "audio":
+            await artifacts.download_audio(notebook_id, str(path))
+        elif kind == "mindmap":
+            if not hasattr(artifacts, "download_mind_map"):
+                raise UnsupportedArtifact("this notebooklm-py version cannot download mind maps")
+            await artifacts.download_mind_map(notebook_id, str(path))
+        elif kind == "quiz":
+            await artifacts.download_quiz(notebook_id, str(path), output_format="json")
+        elif kind == "flashcards":
+            await artifacts.download_flashcards(notebook_id, str(path), output_format="json")
+        else:
+            raise ValueError(f"Unknown artifact {kind!r}")
+
+
+class FakeNotebookLMBackend(NotebookLMBackend):
+    """
+    In-memory NotebookLM: sources become ready after about `source_seconds`, artifact jobs finish after
+    about `artifact_seconds[kind]` (defaults are NotebookLM-like durations), and each source or job fails
+    with probability `failure_rate`. from_env() reads NOTEBOOKLM_FAKE_SCALE (multiplies every duration,
+    default 0.001) and NOTEBOOKLM_FAKE_FAILURE_RATE.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        source_seconds: float = 120.0,
+        artifact_seconds: dict[str, float] | None = None,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.source_seconds = source_seconds
+        self.artifact_seconds = artifact_seconds or {
+            "audio": 1200.0, "mindmap": 180.0, "quiz": 480.0, "flashcards": 480.0
+        }
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.notebooks: dict[str, dict[str, list]] = {}  # {notebook id: {source id: [url, ready_at, failed]}}
+        self._tasks: dict[str, tuple[str, float, bool]] = {}  # {task id: (kind, done_at, failed)}
+        self.calls: dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "FakeNotebookLMBackend":
+        return cls.scaled(
+            float(os.environ.get("NOTEBOOKLM_FAKE_SCALE", "0.001")),
+            failure_rate=float(os.environ.get("NOTEBOOKLM_FAKE_FAILURE_RATE", "0")),
+        )
+
+    @classmethod
+    def scaled(cls, scale: float, **kwargs) -> "FakeNotebookLMBackend":
+        """A fake whose default durations are multiplied by `scale`."""
+        fake = cls(**kwargs)
+        fake.source_seconds *= scale
+        fake.artifact_seconds = {kind: s * scale for kind, s in fake.artifact_seconds.items()}
+        return fake
+
+    def _count(self, call: str) -> None:
+        self.calls[call] = self.calls.get(call, 0) + 1
+
+    async def create_notebook(self, name: str) -> str:
+        self._count("create_notebook")
+        notebook_id = f"fake-notebook-{next(self._ids)}"
+        self.notebooks[notebook_id] = {}
+        return notebook_id
+
+    async def add_source(self, notebook_id: str, url: str) -> str:
+        self._count("add_source")
+        source_id = f"fake-source-{next(self._ids)}"
+        ready_at = time.monotonic() + self.source_seconds * self._rng.uniform(0.5, 1.5)
+        self.notebooks.setdefault(notebook_id, {})[source_id] = [url, ready_at, self._rng.random() < self.failure_rate]
+        return source_id
+
+    async def list_sources(self, notebook_id: str) -> list[tuple[str, str | None, str]]:
+        self._count("list_sources")
+        now = time.monotonic()
+        return [
+            (source_id, url, SOURCE_PROCESSING if now < ready_at else SOURCE_ERROR if failed else SOURCE_READY)
+            for source_id, (url, ready_at, failed) in self.notebooks.get(notebook_id, {}).items()
+        ]
+
+    async def delete_source(self, notebook_id: str, source_id: str) -> None:
+        self._count("delete_source")
+        self.notebooks.get(notebook_id, {}).pop(source_id, None)
+
+    async def generate(self, notebook_id: str, kind: str) -> str | None:
+        self._count(f"generate_{kind}")
+        task_id = f"fake-task-{next(self._ids)}"
+        seconds = self.artifact_seconds.get(kind, 1.0) * self._rng.uniform(0.8, 1.2)
+        self._tasks[task_id] = (kind, time.monotonic() + seconds, self._rng.random() < self.failure_rate)
+        return task_id
+
+    async def wait(self, notebook_id: str, task_id: str, timeout: float) -> None:
+        kind, done_at, failed = self._tasks[task_id]
+        remaining = done_at - time.monotonic()
+        if remaining > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError(f"{kind} generation timed out after {timeout:.0f}s")
+        await asyncio.sleep(max(0.0, remaining))
+        if failed:
+            raise RuntimeError(f"{kind} generation failed")
+
+    async def download(self, notebook_id: str, kind: str, path: Path) -> None:
+        self._count(f"download_{kind}")
+        sources = sorted(url for url, _, _ in self.notebooks.get(notebook_id, {}).values())
+        if kind == "audio":
+            path.write_bytes(b"ID3" + json.dumps(sources).encode("utf-8"))
+        else:
+            path.write_text(json.dumps({"artifact": kind, "sources": sources}), encoding="utf-8")
+
+
+NOTEBOOKLM_BACKENDS = {"notebooklm": NotebookLMPyBackend, "fake": FakeNotebookLMBackend.from_env}
+
+
+def get_notebooklm_backend(name: str | None = None) -> NotebookLMBackend:
+    """Backend from NOTEBOOKLM_BACKEND (notebooklm or fake)."""
+    name = (name or os.environ.get("NOTEBOOKLM_BACKEND", "notebooklm")).strip().lower()
+    if name not in NOTEBOOKLM_BACKENDS:
+        raise ValueError(f"Unknown NOTEBOOKLM_BACKEND {name!r}; choose one of: {', '.join(NOTEBOOKLM_BACKENDS)}")
+    return NOTEBOOKLM_BACKENDS[name]()
@@ -0,0 +1,121 @@
+"""Process-wide rate limiting shared by concurrent pipeline workers."""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at `rate` tokens per second and banks at most `burst`.
+    Every worker calls acquire() before hitting the remote service; pause() stalls all of them
+    at once (e.g. after a 429) instead of each worker sleeping on its own.
+    A rate <= 0 disables throttling but still honours pauses.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available and the bucket is not paused."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> bool:
+        """
+        Stop handing out tokens for `seconds`. Returns True if this call started the pause,
+        False if the bucket was already paused (so only one worker logs/backs off per 429 wave).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return False
+            self._paused_until = now + seconds
+            # Resume with an empty bucket so the pool doesn't burst straight back into a 429.
+            self._tokens = 0.0
+            self._updated = self._paused_until
+            return True
+
+    @property
+    def paused(self) -> bool:
+        with self._lock:
+            return time.monotonic() < self._paused_until
+
+
+class AIMDConcurrency:
+    """
+    asyncio in-flight limit under AIMD control: the window grows by one slot per window of
+    successes (additive increase) and halves on a rate-limit signal (multiplicative decrease).
+    A rate limit also pauses new requests for everyone until its Retry-After has passed.
+    `min_interval` optionally spaces request starts (e.g. a free-tier RPM cap).
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, min_interval: float = 0.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.min_interval = max(0.0, min_interval)
+        self.in_flight = 0
+        self.peak = 0
+        self.decreases = 0
+        self._paused_until = 0.0
+        self._next_start = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.in_flight >= int(self.limit):
+                    wait = None
+                elif now < self._next_start:
+                    wait = self._next_start - now
+                else:
+                    self.in_flight += 1
+                    self.peak = max(self.peak, self.in_flight)
+                    self._next_start = now + self.min_interval
+                    return
+                if wait is None:
+                    await self._cond.wait()
+                else:
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+
+    async def release(self, rate_limited: bool = False, retry_after: float = 0.0, success: bool = True) -> None:
+        """
+        Return a slot. Pass rate_limited=True (with the server's retry hint) when the request got a 429, and
+        success=False when it failed otherwise: the slot is freed without growing the window.
+        """
+        async with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if rate_limited:
+                # Requests already in flight will hit the same limit; halve once per back-off window.
+                if now >= self._paused_until:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.decreases += 1
+                self._paused_until = max(self._paused_until, now + retry_after)
+            elif success:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
@@ -0,0 +1,222 @@
+"""
+Related videos: transcript + enriched sections → hashed TF-IDF → sparse random projection to a small
+dense vector per video (data/related.npz). Neighbours are the top-k cosine similarities, found with blocked
+matrix products and argpartition, so nothing loops over pairs of videos in Python.
+Updates are incremental: only new or changed videos are tokenized, and only rows whose neighbour list could
+have changed are searched again; everything else is merged against the new columns. IDF weights are frozen
+between full rebuilds, which happen once the corpus has grown by REBUILD_GROWTH.
+"""
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Callable
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("Related videos need numpy. Install with: pip install numpy")
+
+from utils.search_index import fold
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+RELATED_INDEX_PATH = DATA_DIR / "related.npz"
+
+TERM_BITS = 20  # terms are hashed into 2**20 buckets for document frequencies
+DIMS = 512  # projected vector size
+NONZEROS = 4  # buckets each term is spread over (sparse Johnson-Lindenstrauss projection)
+BLOCK_ROWS = 1024  # similarity rows computed per matrix product: BLOCK_ROWS x n float32 at a time
+REBUILD_GROWTH = 0.2  # refresh IDF (full rebuild) once the corpus is 20% larger than at the last one
+MIN_TOKEN_LEN = 3
+
+_WORD = re.compile(r"\w+")
+_TERM_MASK = (1 << TERM_BITS) - 1
+# Odd multipliers of the projection hash, one per nonzero.
+_MULTIPLIERS = np.array([0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F], dtype=np.uint64)[:NONZEROS]
+_DIM_SHIFT = np.uint64(32 - (DIMS.bit_length() - 1))  # top bits of the 32-bit hash pick the dimension
+
+
+def term_counts(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """(hashed term ids, counts) of a text: accents and case folded, tokens shorter than MIN_TOKEN_LEN dropped."""
+    tokens = [t for t in _WORD.findall(fold(text).lower()) if len(t) >= MIN_TOKEN_LEN]
+    ids = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint32, count=len(tokens))
+    terms, counts = np.unique(ids & _TERM_MASK, return_counts=True)
+    return terms.astype(np.uint32), counts.astype(np.float32)
+
+
+def _idf(docs: list[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    """Smoothed IDF per term bucket: log((1 + n) / (1 + df)) + 1."""
+    df = np.bincount(
+        np.concatenate([terms for terms, _ in docs]) if docs else np.zeros(0, np.uint32), minlength=1 << TERM_BITS
+    )
+    return (np.log((1 + len(docs)) / (1 + df)) + 1).astype(np.float32)
+
+
+def vectorize(docs: list[tuple[np.ndarray, np.ndarray]], idf: np.ndarray) -> np.ndarray:
+    """
+    L2-normalised (len(docs), DIMS) float32 matrix. Each term's sublinear TF-IDF weight is added, with a
+    hashed sign, to NONZEROS hashed dimensions; one bincount builds the whole matrix.
+    """
+    if not docs:
+        return np.zeros((0, DIMS), np.float32)
+    terms = np.concatenate([t for t, _ in docs]).astype(np.uint64)
+    counts = np.concatenate([c for _, c in docs])
+    rows = np.repeat(np.arange(len(docs), dtype=np.int64), [len(t) for t, _ in docs])
+    weights = (1 + np.log(counts)) * idf[terms]
+    hashed = (terms[:, None] * _MULTIPLIERS[None, :]) & 0xFFFFFFFF  # (terms, NONZEROS)
+    dims = (hashed >> _DIM_SHIFT).astype(np.int64)
+    signs = np.where((hashed >> np.uint64(16)) & np.uint64(1), 1.0, -1.0)
+    flat = (rows[:, None] * DIMS + dims).ravel()
+    matrix = np.bincount(flat, weights=(signs * weights[:, None]).ravel(), minlength=len(docs) * DIMS)
+    matrix = matrix.reshape(len(docs), DIMS).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def _select(ids: np.ndarray, scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Best k candidates per row (by score, descending); padded with -1 / -inf when a row has fewer."""
+    if scores.shape[1] < k:
+        pad = k - scores.shape[1]
+        ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        ids, scores = np.take_along_axis(ids, part, 1), np.take_along_axis(scores, part, 1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ids, scores = np.take_along_axis(ids, order, 1), np.take_along_axis(scores, order, 1)
+    return np.where(np.isfinite(scores), ids, -1).astype(np.int32), scores.astype(np.float32)
+
+
+def top_k(vectors: np.ndarray, rows: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """(neighbour rows, scores) of the k most similar other vectors for each of `rows`, BLOCK_ROWS at a time."""
+    n = len(vectors)
+    out_ids = np.full((len(rows), k), -1, np.int32)
+    out_scores = np.full((len(rows), k), -np.inf, np.float32)
+    candidates = np.broadcast_to(np.arange(n, dtype=np.int32), (min(BLOCK_ROWS, len(rows)), n))
+    for start in range(0, len(rows), BLOCK_ROWS):
+        block = rows[start:start + BLOCK_ROWS]
+        sims = vectors[block] @ vectors.T
+        sims[np.arange(len(block)), block] = -np.inf  # a video is not its own neighbour
+        ids, scores = _select(candidates[:len(block)], sims, k)
+        out_ids[start:start + len(block)], out_scores[start:start + len(block)] = ids, scores
+    return out_ids, out_scores
+
+
+class RelatedIndex:
+    """Per-video vectors and top-k neighbour lists, keyed by video id, with the source hash each was built from."""
+
+    def __init__(self, path: Path | None = None, k: int = 5):
+        self.path = path or RELATED_INDEX_PATH
+        self.k = k
+        self.ids: list[str] = []
+        self.sources: list[str] = []
+        self.vectors = np.zeros((0, DIMS), np.float32)
+        self.neighbours = np.zeros((0, k), np.int32)
+        self.scores = np.zeros((0, k), np.float32)
+        self.idf: np.ndarray | None = None
+        self.built_size = 0
+        if self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        with np.load(self.path, allow_pickle=False) as f:
+            if f["vectors"].shape[1] != DIMS or f["neighbours"].shape[1] != self.k:
+                return  # projection or k changed: start over
+            self.ids, self.sources = f["ids"].tolist(), f["sources"].tolist()
+            self.vectors, self.neighbours, self.scores = f["vectors"], f["neighbours"], f["scores"]
+            self.idf, self.built_size = f["idf"], int(f["built_size"])
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f, ids=np.array(self.ids, dtype=str), sources=np.array(self.sources, dtype=str),
+                vectors=self.vectors, neighbours=self.neighbours, scores=self.scores,
+                idf=self.idf, built_size=np.int64(self.built_size),
+            )
+        os.replace(tmp, self.path)
+
+    def all_neighbours(self, min_score: float = 0.0) -> dict[str, list[tuple[str, float]]]:
+        """{video id: [(neighbour id, cosine similarity)]}, best first, at most k, scoring at least min_score."""
+        return {
+            video_id: [
+                (self.ids[j], round(float(s), 4)) for j, s in zip(ids, scores) if j >= 0 and s >= min_score
+            ]
+            for video_id, ids, scores in zip(self.ids, self.neighbours.tolist(), self.scores.tolist())
+        }
+
+    def _rebuild(self, docs: dict[str, tuple[str, Callable[[], str]]]) -> None:
+        self.ids = list(docs)
+        self.sources = [source for source, _ in docs.values()]
+        terms = [term_counts(load()) for _, load in docs.values()]
+        self.idf = _idf(terms)
+        self.vectors = vectorize(terms, self.idf)
+        self.neighbours, self.scores = top_k(self.vectors, np.arange(len(self.ids)), self.k)
+        self.built_size = len(self.ids)
+
+    def update(self, docs: dict[str, tuple[str, Callable[[], str]]]) -> dict:
+        """
+        Bring the index in line with `docs` ({video id: (source hash, text loader)}); loaders are only
+        called for videos that are new or whose source hash changed. Returns counts for the run report.
+        """
+        if self.idf is None or len(docs) > self.built_size * (1 + REBUILD_GROWTH):
+            self._rebuild(docs)
+            self.save()
+            return {"videos": len(self.ids), "vectorized": len(self.ids), "rows_searched": len(self.ids), "full": True}
+
+        position = {video_id: i for i, video_id in enumerate(self.ids)}
+        keep = np.array([video_id in docs for video_id in self.ids], dtype=bool)
+        changed = [
+            video_id for video_id, source in zip(self.ids, self.sources)
+            if video_id in docs and docs[video_id][0] != source
+        ]
+        added = [video_id for video_id in docs if video_id not in position]
+        if keep.all() and not changed and not added:
+            return {"videos": len(self.ids), "vectorized": 0, "rows_searched": 0, "full": False}
+
+        # Drop removed videos and renumber neighbour references; lists that lost an entry are searched again.
+        remap = np.full(len(self.ids) + 1, -1, np.int32)  # last slot maps the -1 padding to itself
+        remap[:-1][keep] = np.arange(int(keep.sum()), dtype=np.int32)
+        old_neighbours = self.neighbours[keep]
+        neighbours = remap[old_neighbours]
+        lost = ((neighbours < 0) & (old_neighbours >= 0)).any(axis=1)
+        self.ids = [video_id for video_id, k in zip(self.ids, keep) if k]
+        self.sources = [source for source, k in zip(self.sources, keep) if k]
+        position = {video_id: i for i, video_id in enumerate(self.ids)}
+
+        touched_ids = changed + added
+        new_vectors = vectorize([term_counts(docs[video_id][1]()) for video_id in touched_ids], self.idf)
+        self.vectors = np.concatenate([self.vectors[keep], new_vectors[len(changed):]])
+        self.vectors[[position[video_id] for video_id in changed]] = new_vectors[:len(changed)]
+        for video_id in changed:
+            self.sources[position[video_id]] = docs[video_id][0]
+        self.ids.extend(added)
+        self.sources.extend(docs[video_id][0] for video_id in added)
+        touched = np.array([position.get(video_id, -1) for video_id in changed] + list(
+            range(len(self.ids) - len(added), len(self.ids))
+        ), dtype=np.int64)
+
+        n = len(self.ids)
+        neighbours = np.concatenate([neighbours, np.full((len(added), self.k), -1, np.int32)])
+        scores = np.concatenate([self.scores[keep], np.full((len(added), self.k), -np.inf, np.float32)])
+        # A row must be searched again if it is new/changed, lost a neighbour, or listed a changed video
+        # (whose score may have dropped). Every other row only needs the touched columns merged in.
+        dirty = np.zeros(n, dtype=bool)
+        dirty[touched] = True
+        dirty[: len(lost)] |= lost
+        dirty |= np.isin(neighbours, touched).any(axis=1)
+        clean = np.flatnonzero(~dirty)
+        for start in range(0, len(clean), BLOCK_ROWS):
+            block = clean[start:start + BLOCK_ROWS]
+            sims = self.vectors[block] @ self.vectors[touched].T
+            neighbours[block], scores[block] = _select(
+                np.concatenate([neighbours[block], np.broadcast_to(touched.astype(np.int32), sims.shape)], axis=1),
+                np.concatenate([scores[block], sims], axis=1),
+                self.k,
+            )
+        rows = np.flatnonzero(dirty)
+        neighbours[rows], scores[rows] = top_k(self.vectors, rows, self.k)
+        self.neighbours, self.scores = neighbours, scores
+        self.save()
+        return {"videos": n, "vectorized": len(touched_ids), "rows_searched": len(rows), "full": False}
@@ -0,0 +1,44 @@
+"""Per-run counters recorded by agents and written by pipeline.py into data/run_report.md."""
+import threading
+import time
+
+_lock = threading.Lock()
+_stats: dict[str, dict] = {}
+_events: dict[str, float] = {}
+
+
+def record_stats(stage: str, **values) -> None:
+    """Set (overwrite) stat values for a stage."""
+    with _lock:
+        _stats.setdefault(stage, {}).update(values)
+
+
+def increment_stat(stage: str, key: str, amount: float = 1) -> None:
+    """Add `amount` to a counter; safe to call from worker threads."""
+    with _lock:
+        stage_stats = _stats.setdefault(stage, {})
+        stage_stats[key] = stage_stats.get(key, 0) + amount
+
+
+def append_stat(stage: str, key: str, value) -> None:
+    """Append `value` to a list stat (created on first use); safe to call from worker threads."""
+    with _lock:
+        _stats.setdefault(stage, {}).setdefault(key, []).append(value)
+
+
+def get_run_stats() -> dict[str, dict]:
+    """Snapshot of all stats recorded in this process, keyed by stage."""
+    with _lock:
+        return {stage: dict(values) for stage, values in _stats.items()}
+
+
+def mark_event(name: str) -> None:
+    """Remember when `name` first happened (time.monotonic()); later calls for the same name are ignored."""
+    with _lock:
+        _events.setdefault(name, time.monotonic())
+
+
+def get_event(name: str) -> float | None:
+    """Monotonic timestamp recorded by mark_event, or None if it has not happened in this process."""
+    with _lock:
+        return _events.get(name)
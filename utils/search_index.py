@@ -0,0 +1,199 @@
+"""
+Full-text search over transcripts and enriched sections (SQLite FTS5, data/search.sqlite).
+Indexed from the packed corpus (utils/corpus.py) and updated incrementally: only records whose
+hash changed since the last update are re-indexed.
+"""
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+SEARCH_DB_PATH = DATA_DIR / "search.sqlite"
+
+# Snippet markers; callers turn them into **bold** (notes) or rich markup (console).
+MATCH_START, MATCH_END = "\x02", "\x03"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    field TEXT NOT NULL,
+    start REAL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_video ON documents(video_id, kind);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body, content='documents', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TABLE IF NOT EXISTS sources (
+    video_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (video_id, kind)
+);
+"""
+
+_MARKS = re.compile("[\u0300-\u036f]")  # combining diacritics left over by NFD
+_FTS_SYNTAX = re.compile(r'["*:^()]|\b(?:AND|OR|NOT|NEAR)\b')
+_WORD = re.compile(r"\w+")
+
+PASSAGE_WORDS = 150  # transcripts are indexed in passages: precise snippets, cheap to highlight
+
+
+def fold(text: str) -> str:
+    """
+    Strip accents (Greek tonos and dialytika included) without changing the token count. unicode61
+    already folds case and final sigma, but its remove_diacritics only covers Latin script.
+    """
+    return unicodedata.normalize("NFC", _MARKS.sub("", unicodedata.normalize("NFD", text)))
+
+
+def match_expression(query: str) -> str:
+    """
+    FTS5 MATCH expression for a user query. Plain words become quoted prefix terms (all must match), so
+    inflected Greek forms still hit; a query already using FTS5 syntax (quotes, AND/OR/NOT, *) is passed through.
+    """
+    query = fold(query)
+    if _FTS_SYNTAX.search(query):
+        return query
+    return " ".join(f'"{w}"*' for w in _WORD.findall(query))
+
+
+def _passages(record: dict) -> list[tuple[float | None, str]]:
+    """(start seconds or None, text) windows of ~PASSAGE_WORDS words; timed when the transcript kept segments."""
+    passages = []
+    if record.get("segments"):
+        start, words = None, []
+        for seg in record["segments"]:
+            start = seg["start"] if start is None else start
+            words.extend(seg["text"].split())
+            if len(words) >= PASSAGE_WORDS:
+                passages.append((start, " ".join(words)))
+                start, words = None, []
+        if words:
+            passages.append((start, " ".join(words)))
+        return passages
+    words = record.get("transcript", "").split()
+    return [(None, " ".join(words[i:i + PASSAGE_WORDS])) for i in range(0, len(words), PASSAGE_WORDS)]
+
+
+def _documents(kind: str, record: dict) -> list[tuple[str, float | None, str]]:
+    """(field, start, text) rows for one corpus record: transcript passages, or one row per enriched section."""
+    if kind == "transcript":
+        return [("Transcript", start, text) for start, text in _passages(record)]
+    return [(name, None, text) for name, text in (record.get("gemini_sections") or {}).items() if text]
+
+
+class SearchIndex:
+    """FTS5 index over the corpus. Original text is kept in `documents` for snippets; the index holds fold()ed text."""
+
+    def __init__(self, path: Path | None = None):
+        path = path or SEARCH_DB_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _remove(self, video_id: str, kind: str) -> None:
+        rows = self._conn.execute(
+            "SELECT id, title, body FROM documents WHERE video_id = ? AND kind = ?", (video_id, kind)
+        ).fetchall()
+        for rowid, title, body in rows:
+            # External-content FTS5: a delete must repeat exactly the values that were indexed.
+            self._conn.execute(
+                "INSERT INTO documents_fts(documents_fts, rowid, title, body) VALUES ('delete', ?, ?, ?)",
+                (rowid, fold(title), fold(body)),
+            )
+        self._conn.execute("DELETE FROM documents WHERE video_id = ? AND kind = ?", (video_id, kind))
+        self._conn.execute("DELETE FROM sources WHERE video_id = ? AND kind = ?", (video_id, kind))
+
+    def _add(self, video_id: str, kind: str, record: dict, sha256: str) -> None:
+        title = record.get("title") or ""
+        for field, start, text in _documents(kind, record):
+            cur = self._conn.execute(
+                "INSERT INTO documents (video_id, kind, field, start, title, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, kind, field, start, title, text),
+            )
+            self._conn.execute(
+                "INSERT INTO documents_fts(rowid, title, body) VALUES (?, ?, ?)",
+                (cur.lastrowid, fold(title), fold(text)),
+            )
+        self._conn.execute("INSERT INTO sources (video_id, kind, sha256) VALUES (?, ?, ?)", (video_id, kind, sha256))
+
+    def update(self, corpus) -> dict:
+        """Bring the index in line with a CorpusPack: (re)index changed records, drop vanished ones."""
+        started = time.monotonic()
+        current = corpus.hashes()
+        counts = {"indexed": 0, "removed": 0, "unchanged": 0}
+        with self._lock, self._conn:
+            indexed = {
+                (kind, video_id): sha
+                for video_id, kind, sha in self._conn.execute("SELECT video_id, kind, sha256 FROM sources")
+            }
+            for (kind, video_id), sha in current.items():
+                if indexed.get((kind, video_id)) == sha:
+                    counts["unchanged"] += 1
+                    continue
+                record = corpus.get(kind, video_id)
+                if record is None:
+                    continue
+                self._remove(video_id, kind)
+                self._add(video_id, kind, record, sha)
+                counts["indexed"] += 1
+            for kind, video_id in indexed.keys() - current.keys():
+                self._remove(video_id, kind)
+                counts["removed"] += 1
+        counts["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return counts
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """
+        Best-ranked videos for `query` (bm25, title matches weighted 4x): one result per video with its
+        best-matching field, a snippet (and the passage start time when known), plus every other field that matched.
+        Snippets are only built for the returned hits.
+        """
+        expression = match_expression(query)
+        if not expression:
+            return []
+        results: dict[str, dict] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.id, d.video_id, d.title, d.field, d.start, bm25(documents_fts, 4.0, 1.0) AS score "
+                "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                "WHERE documents_fts MATCH ? ORDER BY score",
+                (expression,),
+            )
+            for rowid, video_id, title, field, start, score in rows:
+                hit = results.get(video_id)
+                if hit is None:
+                    if len(results) == limit:
+                        continue
+                    results[video_id] = {
+                        "video_id": video_id, "title": title, "field": field, "start": start,
+                        "score": round(-score, 3), "fields": [field], "_rowid": rowid,
+                    }
+                elif field not in hit["fields"]:
+                    hit["fields"].append(field)
+            if results:
+                best = {hit.pop("_rowid"): hit for hit in results.values()}
+                snippets = self._conn.execute(
+                    "SELECT rowid, snippet(documents_fts, 1, ?, ?, '…', 16) FROM documents_fts "
+                    f"WHERE documents_fts MATCH ? AND rowid IN ({','.join('?' * len(best))})",
+                    (MATCH_START, MATCH_END, expression, *best),
+                )
+                for rowid, snippet in snippets:
+                    best[rowid]["snippet"] = snippet
+        return list(results.values())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
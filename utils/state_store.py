@@ -0,0 +1,534 @@
+"""
+Pipeline state in SQLite (data/state.sqlite): one row per video and one row per (video, stage) with
+status, reason, attempt count, timestamps and content hashes. Every update is its own small transaction,
+so a crash mid-stage keeps all progress so far. data/manifest.json is written from here as an export view.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+STATE_DB_PATH = DATA_DIR / "state.sqlite"
+MANIFEST_PATH = DATA_DIR / "manifest.json"
+TRANSCRIPTS_DIR = DATA_DIR / "transcripts"
+ENRICHED_DIR = DATA_DIR / "enriched"
+
+STAGES = ("transcripts", "enrichment", "related", "notebooklm", "obsidian")
+# Stages that decide a video's overall manifest "status"; related/notebooklm/obsidian rows are informational.
+STATUS_STAGES = ("transcripts", "enrichment")
+
+# Manifest-level keys kept in the meta table.
+META_KEYS = ("playlist_url", "playlist_title", "notebooklm_notebook_id")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    title TEXT,
+    url TEXT,
+    position INTEGER,
+    in_playlist INTEGER NOT NULL DEFAULT 1,
+    fingerprint TEXT,
+    removed_at REAL,
+    extra TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stage_status (
+    video_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    reason TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    input_hash TEXT,
+    recipe_hash TEXT,
+    output_hash TEXT,
+    output_path TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens INTEGER,
+    cost_usd REAL,
+    PRIMARY KEY (video_id, stage)
+);
+CREATE INDEX IF NOT EXISTS stage_status_stage_status ON stage_status(stage, status);
+CREATE TABLE IF NOT EXISTS stream_partials (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_ADDED_COLUMNS = {
+    "videos": (("fingerprint", "TEXT"), ("removed_at", "REAL")),
+    "stage_status": (
+        ("recipe_hash", "TEXT"),
+        ("output_path", "TEXT"),
+        ("prompt_tokens", "INTEGER"),
+        ("completion_tokens", "INTEGER"),
+        ("cached_tokens", "INTEGER"),
+        ("cost_usd", "REAL"),
+    ),
+}
+
+
+def file_sha256(path: Path | str) -> str | None:
+    """Hex sha256 of a file's bytes, or None if it cannot be read."""
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+class StateStore:
+    """Thread-safe: one connection guarded by a lock, shared by worker threads and the asyncio engine."""
+
+    def __init__(self, path: Path = STATE_DB_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            # Columns added after the first release of the schema.
+            for table, added in _ADDED_COLUMNS.items():
+                columns = {r[1] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+                for name, decl in added:
+                    if name not in columns:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+    # --- meta ---
+
+    def get_meta(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- videos ---
+
+    def _upsert_video(self, video_id: str, title=None, url=None, position=None, **fields) -> None:
+        """Caller holds the lock and the transaction. None values leave existing columns unchanged."""
+        now = time.time()
+        row = self._conn.execute("SELECT extra FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO videos (video_id, title, url, position, extra, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, title, url, position, json.dumps(fields, ensure_ascii=False), now),
+            )
+            return
+        extra = {**json.loads(row[0]), **fields}
+        self._conn.execute(
+            "UPDATE videos SET title = COALESCE(?, title), url = COALESCE(?, url), "
+            "position = COALESCE(?, position), extra = ?, updated_at = ? WHERE video_id = ?",
+            (title, url, position, json.dumps(extra, ensure_ascii=False), now, video_id),
+        )
+
+    def upsert_video(self, video_id: str, title=None, url=None, position=None, **fields) -> None:
+        """Insert or update a video; extra keyword fields (e.g. transcript_path) are merged into its record."""
+        with self._lock, self._conn:
+            self._upsert_video(video_id, title, url, position, **fields)
+
+    def add_videos(self, records: list[dict]) -> None:
+        """Insert manifest records (id, title, url) that the store does not know yet; existing rows are untouched."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO videos (video_id, title, url, updated_at) VALUES (?, ?, ?, ?)",
+                [(r["id"], r.get("title"), r.get("url"), now) for r in records if r.get("id")],
+            )
+
+    def sync_playlist(
+        self,
+        playlist_url: str,
+        playlist_title: str,
+        entries: list[dict],
+        fingerprints: dict[str, str] | None = None,
+    ) -> dict[str, list[str]]:
+        """
+        Record the current playlist listing and diff it against the last snapshot.
+        Positions follow `entries`. Videos no longer listed are marked removed (kept, but left out of the
+        manifest); a video whose fingerprint changed gets all its stage rows marked "stale" so every stage
+        redoes it. Returns {"added", "changed", "removed", "unchanged"} lists of video ids.
+        """
+        fingerprints = fingerprints or {}
+        now = time.time()
+        diff: dict[str, list[str]] = {"added": [], "changed": [], "removed": [], "unchanged": []}
+        with self._lock, self._conn:
+            previous = {
+                r[0]: (r[1], r[2])
+                for r in self._conn.execute("SELECT video_id, in_playlist, fingerprint FROM videos")
+            }
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('playlist_url', ?)", (playlist_url,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('playlist_title', ?)", (playlist_title,)
+            )
+            self._conn.execute("UPDATE videos SET position = NULL")
+            listed = set()
+            for i, entry in enumerate(entries):
+                video_id = entry.get("id")
+                if not video_id or video_id in listed:
+                    continue
+                listed.add(video_id)
+                fingerprint = fingerprints.get(video_id)
+                in_playlist, old_fingerprint = previous.get(video_id, (0, None))
+                if not in_playlist:
+                    diff["added"].append(video_id)
+                elif fingerprint and old_fingerprint and fingerprint != old_fingerprint:
+                    diff["changed"].append(video_id)
+                    self._conn.execute(
+                        "UPDATE stage_status SET status = 'stale', reason = 'playlist_entry_changed', updated_at = ? "
+                        "WHERE video_id = ?",
+                        (now, video_id),
+                    )
+                else:
+                    diff["unchanged"].append(video_id)
+                self._upsert_video(video_id, entry.get("title"), entry.get("url"), i)
+                self._conn.execute(
+                    "UPDATE videos SET in_playlist = 1, removed_at = NULL, "
+                    "fingerprint = COALESCE(?, fingerprint) WHERE video_id = ?",
+                    (fingerprint, video_id),
+                )
+            for video_id, (in_playlist, _) in previous.items():
+                if in_playlist and video_id not in listed:
+                    diff["removed"].append(video_id)
+                    self._conn.execute(
+                        "UPDATE videos SET in_playlist = 0, removed_at = ?, updated_at = ? WHERE video_id = ?",
+                        (now, now, video_id),
+                    )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('playlist_synced_at', ?)", (str(now),)
+            )
+        return diff
+
+    # --- stage status ---
+
+    def begin(self, video_id: str, stage: str) -> None:
+        """Mark a stage as running and count the attempt."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO videos (video_id, updated_at) VALUES (?, ?)", (video_id, now))
+            self._conn.execute(
+                "INSERT INTO stage_status (video_id, stage, status, attempts, started_at, updated_at) "
+                "VALUES (?, ?, 'running', 1, ?, ?) "
+                "ON CONFLICT (video_id, stage) DO UPDATE SET status = 'running', reason = NULL, "
+                "attempts = attempts + 1, started_at = excluded.started_at, updated_at = excluded.updated_at",
+                (video_id, stage, now, now),
+            )
+
+    def finish(
+        self,
+        video_id: str,
+        stage: str,
+        status: str,
+        reason: str | None = None,
+        input_hash: str | None = None,
+        output_hash: str | None = None,
+        recipe_hash: str | None = None,
+        output_path: str | None = None,
+    ) -> None:
+        """
+        Set a stage's final status ("ok" or "failed") with the hashes of what it consumed (input_hash),
+        the code/config that produced it (recipe_hash) and what it wrote (output_hash at output_path).
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO videos (video_id, updated_at) VALUES (?, ?)", (video_id, now))
+            self._conn.execute(
+                "INSERT INTO stage_status (video_id, stage, status, reason, attempts, updated_at, "
+                "input_hash, output_hash, recipe_hash, output_path) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (video_id, stage) DO UPDATE SET status = excluded.status, reason = excluded.reason, "
+                "updated_at = excluded.updated_at, "
+                "input_hash = COALESCE(excluded.input_hash, input_hash), "
+                "output_hash = COALESCE(excluded.output_hash, output_hash), "
+                "recipe_hash = COALESCE(excluded.recipe_hash, recipe_hash), "
+                "output_path = COALESCE(excluded.output_path, output_path)",
+                (video_id, stage, status, reason, now, input_hash, output_hash, recipe_hash, output_path),
+            )
+
+    def add_usage(
+        self,
+        video_id: str,
+        stage: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cost_usd: float | None,
+        cached_tokens: int = 0,
+    ) -> None:
+        """Add one LLM call's tokens and cost to a stage's running totals (kept across attempts and re-runs)."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO videos (video_id, updated_at) VALUES (?, ?)", (video_id, now))
+            self._conn.execute(
+                "INSERT INTO stage_status (video_id, stage, status, updated_at, prompt_tokens, completion_tokens, "
+                "cached_tokens, cost_usd) VALUES (?, ?, 'running', ?, ?, ?, ?, ?) "
+                "ON CONFLICT (video_id, stage) DO UPDATE SET "
+                "prompt_tokens = COALESCE(prompt_tokens, 0) + excluded.prompt_tokens, "
+                "completion_tokens = COALESCE(completion_tokens, 0) + excluded.completion_tokens, "
+                "cached_tokens = COALESCE(cached_tokens, 0) + excluded.cached_tokens, "
+                "cost_usd = COALESCE(cost_usd, 0) + COALESCE(excluded.cost_usd, 0)",
+                (video_id, stage, now, prompt_tokens, completion_tokens, cached_tokens, cost_usd),
+            )
+
+    # --- streamed response checkpoints ---
+
+    def get_partial(self, key: str) -> str | None:
+        """The checkpointed beginning of an unfinished streamed LLM response (key: llm_cache.cache_key)."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM stream_partials WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_partial(self, key: str, partial: str) -> None:
+        """Checkpoint the complete part of a response still being streamed."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stream_partials (key, response, updated_at) VALUES (?, ?, ?)",
+                (key, partial, time.time()),
+            )
+
+    def drop_partial(self, key: str) -> None:
+        """Forget a checkpoint once its response is complete."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM stream_partials WHERE key = ?", (key,))
+
+    def get_status(self, video_id: str, stage: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM stage_status WHERE video_id = ? AND stage = ?", (video_id, stage)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def ids_with_status(self, stage: str, status: str = "ok") -> set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id FROM stage_status WHERE stage = ? AND status = ?", (stage, status)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def pending(self, stage: str, after: str | None = None) -> list[str]:
+        """
+        Playlist videos (in order) whose `stage` is not "ok" yet; with `after`, only those whose
+        upstream stage is "ok" (e.g. pending("enrichment", after="transcripts")).
+        """
+        sql = (
+            "SELECT v.video_id FROM videos v "
+            "LEFT JOIN stage_status s ON s.video_id = v.video_id AND s.stage = ? "
+        )
+        params: list = [stage]
+        if after:
+            sql += "JOIN stage_status u ON u.video_id = v.video_id AND u.stage = ? AND u.status = 'ok' "
+            params.append(after)
+        sql += "WHERE v.in_playlist = 1 AND (s.status IS NULL OR s.status != 'ok') ORDER BY v.position"
+        with self._lock:
+            return [r[0] for r in self._conn.execute(sql, params).fetchall()]
+
+    def stage_view(self, stage: str, after: str | None = None, video_id: str | None = None) -> list[dict]:
+        """
+        One row per playlist video (in order; or just `video_id`) with its `stage` row and, for dependency
+        checks, the expected input: the upstream stage's output hash if `after` is given, else the playlist
+        fingerprint. Keys: video_id, title, status, input_hash, recipe_hash, output_hash, output_path,
+        expected_input, upstream_status.
+        """
+        upstream = (
+            "u.output_hash AS expected_input, u.status AS upstream_status "
+            if after else "v.fingerprint AS expected_input, 'ok' AS upstream_status "
+        )
+        sql = (
+            "SELECT v.video_id, v.title, s.status, s.input_hash, s.recipe_hash, s.output_hash, s.output_path, "
+            + upstream
+            + "FROM videos v LEFT JOIN stage_status s ON s.video_id = v.video_id AND s.stage = ? "
+        )
+        params: list = [stage]
+        if after:
+            sql += "LEFT JOIN stage_status u ON u.video_id = v.video_id AND u.stage = ? "
+            params.append(after)
+        if video_id is not None:
+            sql += "WHERE v.video_id = ?"
+            params.append(video_id)
+        else:
+            sql += "WHERE v.in_playlist = 1 ORDER BY v.position IS NULL, v.position, v.rowid"
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    def adopt(self, stage: str, recipe_hash: str, after: str | None = None) -> int:
+        """
+        Stamp "ok" rows written before dependency tracking (no recipe/input hash) with the current recipe
+        and expected input, so they count as fresh now and go stale on the next real change.
+        """
+        expected = (
+            "(SELECT u.output_hash FROM stage_status u WHERE u.video_id = stage_status.video_id AND u.stage = ?)"
+            if after else "(SELECT v.fingerprint FROM videos v WHERE v.video_id = stage_status.video_id)"
+        )
+        params = ([after] if after else []) + [recipe_hash, stage]
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                f"UPDATE stage_status SET input_hash = COALESCE(input_hash, {expected}), "
+                "recipe_hash = COALESCE(recipe_hash, ?) "
+                "WHERE stage = ? AND status = 'ok' AND (recipe_hash IS NULL OR input_hash IS NULL)",
+                params,
+            )
+            return cur.rowcount
+
+    def counts(self) -> dict[str, dict[str, int]]:
+        """{stage: {status: n}} over videos currently in the playlist."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.stage, s.status, COUNT(*) FROM stage_status s "
+                "JOIN videos v ON v.video_id = s.video_id AND v.in_playlist = 1 GROUP BY s.stage, s.status"
+            ).fetchall()
+        out: dict[str, dict[str, int]] = {}
+        for stage, status, n in rows:
+            out.setdefault(stage, {})[status] = n
+        return out
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM videos LIMIT 1").fetchone() is None
+
+    # --- manifest view ---
+
+    def to_manifest(self) -> dict:
+        """The manifest.json shape: playlist meta + one record per playlist video, in playlist order."""
+        with self._lock:
+            meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+            videos = self._conn.execute(
+                "SELECT video_id, title, url, extra FROM videos WHERE in_playlist = 1 "
+                "ORDER BY position IS NULL, position, rowid"
+            ).fetchall()
+            removed = self._conn.execute(
+                "SELECT video_id, title, removed_at FROM videos WHERE in_playlist = 0 AND removed_at IS NOT NULL "
+                "ORDER BY removed_at"
+            ).fetchall()
+            stages: dict[str, dict[str, tuple]] = {}
+            usage: dict[str, dict] = {}
+            for video_id, stage, status, reason, prompt_tokens, completion_tokens, cached, cost in self._conn.execute(
+                "SELECT video_id, stage, status, reason, prompt_tokens, completion_tokens, cached_tokens, cost_usd "
+                "FROM stage_status"
+            ):
+                stages.setdefault(video_id, {})[stage] = (status, reason)
+                if prompt_tokens or completion_tokens:
+                    totals = usage.setdefault(
+                        video_id, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0}
+                    )
+                    totals["prompt_tokens"] += prompt_tokens or 0
+                    totals["completion_tokens"] += completion_tokens or 0
+                    totals["cached_tokens"] += cached or 0
+                    totals["cost_usd"] = round(totals["cost_usd"] + (cost or 0.0), 6)
+
+        manifest = {k: meta[k] for k in META_KEYS if meta.get(k)}
+        manifest["videos"] = []
+        for video_id, title, url, extra in videos:
+            per_stage = stages.get(video_id, {})
+            record = {"id": video_id, "title": title or "Unknown", "url": url or "", **json.loads(extra)}
+            status, reason = "pending", None
+            for stage in STATUS_STAGES:
+                if stage not in per_stage:
+                    continue
+                status, reason = per_stage[stage]
+                if status == "failed":
+                    break
+            record["status"] = status
+            if status == "failed" and reason:
+                record["reason"] = reason
+            record["stages"] = {stage: per_stage[stage][0] for stage in STAGES if stage in per_stage}
+            if video_id in usage:
+                record["llm_usage"] = usage[video_id]
+            manifest["videos"].append(record)
+        if removed:
+            manifest["removed_videos"] = [
+                {"id": video_id, "title": title or "Unknown", "removed_at": removed_at}
+                for video_id, title, removed_at in removed
+            ]
+        return manifest
+
+    def export_manifest(self, path: Path = MANIFEST_PATH) -> dict:
+        """Write the manifest view atomically (temp file + rename) and return it."""
+        manifest = self.to_manifest()
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+        return manifest
+
+    def import_manifest(self, manifest: dict) -> int:
+        """
+        Migrate an old manifest.json: meta, videos in order, and stage rows inferred from what is on disk
+        (transcript / enriched JSON present → ok; a failed status → failed for the first missing stage).
+        Returns the number of videos imported.
+        """
+        now = time.time()
+        imported = 0
+        with self._lock, self._conn:
+            for key in META_KEYS:
+                if manifest.get(key):
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, manifest[key]))
+            for i, v in enumerate(manifest.get("videos", [])):
+                video_id = v.get("id")
+                if not video_id:
+                    continue
+                fields = {
+                    k: val for k, val in v.items() if k not in ("id", "title", "url", "status", "reason", "stages", "llm_usage")
+                }
+                self._upsert_video(video_id, v.get("title"), v.get("url"), i, **fields)
+                transcript_path = Path(v.get("transcript_path") or TRANSCRIPTS_DIR / f"{video_id}.json")
+                for stage, path in (("transcripts", transcript_path), ("enrichment", ENRICHED_DIR / f"{video_id}.json")):
+                    if path.exists():
+                        status, reason = "ok", None
+                    elif v.get("status") == "failed":
+                        status, reason = "failed", v.get("reason")
+                    else:
+                        break
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO stage_status "
+                        "(video_id, stage, status, reason, attempts, updated_at, output_hash) VALUES (?, ?, ?, ?, 1, ?, ?)",
+                        (video_id, stage, status, reason, now, file_sha256(path) if status == "ok" else None),
+                    )
+                    if status == "failed":
+                        break
+                imported += 1
+        return imported
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: StateStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """Process-wide store. On first use, an existing data/manifest.json is migrated into an empty database."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StateStore(STATE_DB_PATH)
+            if _store.is_empty() and MANIFEST_PATH.exists():
+                try:
+                    _store.import_manifest(json.loads(MANIFEST_PATH.read_text(encoding="utf-8")))
+                except (OSError, ValueError):
+                    pass
+        return _store
+
+
+def record_status(v: dict, stage: str, status: str, reason: str | None = None, **hashes) -> None:
+    """Set a manifest entry's status/reason in place and persist it as the (video, stage) row."""
+    v["status"] = status
+    if reason is not None:
+        v["reason"] = reason
+    else:
+        v.pop("reason", None)
+    if v.get("id"):
+        get_state_store().finish(v["id"], stage, status, reason, **hashes)
@@ -1,22 +1,122 @@
-"""Convert VTT subtitle content to plain text."""
+"""
+Convert VTT subtitle content to plain text in one streaming pass over its cues.
+YouTube auto-captions roll: each cue repeats the tail of the previous one before adding new words.
+For auto-caption tracks only the words a cue adds on top of the cue before it are kept, so the text
+reads once. Uploaded (manual) subtitles do not roll, so every cue is kept as written, repeats included.
+"""
+import html
 import re
+from typing import Iterable, Iterator
 
+_TAG = re.compile(r"<[^>]*>")  # <c>, </c>, <i>, <v Speaker>, inline <00:00:01.500> word timings
+# Timing line, then the cue payload: every following line up to the first empty one. Header, NOTE/STYLE
+# blocks and cue identifiers never follow a timing line, so they are never matched.
+_CUE = re.compile(r"^[ \t]*(\S+)[ \t]+-->[ \t]+(\S+)[^\n]*(?:\n|\Z)((?:[^\n]+\n)*[^\n]*)", re.M)
 
-def clean_vtt(vtt_text: str) -> str:
-    """Strip VTT timestamps, cues, and tags; return single-line plain text."""
-    if not vtt_text or not vtt_text.strip():
-        return ""
-    lines = vtt_text.split("\n")
-    seen = set()
-    result = []
+
+def _seconds(timestamp: str) -> float:
+    """"01:02:03.456" or "02:03.456" → seconds (0.0 if malformed)."""
+    seconds = 0.0
+    try:
+        for part in timestamp.replace(",", ".").split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return 0.0
+    return seconds
+
+
+# A shorter overlap between adjacent auto-caption cues is only a roll when it spans a whole cue;
+# otherwise it is a word that happens to recur at a cue boundary ("... to the" / "the store ...").
+MIN_OVERLAP_WORDS = 3
+
+
+def _overlap(previous: list[str], words: list[str]) -> int:
+    """
+    Number of leading words of `words` that roll over from `previous`: the longest suffix of `previous`
+    that is also a prefix of `words`, if it is the whole previous cue, the whole new cue, or at least
+    MIN_OVERLAP_WORDS long. 0 otherwise.
+    """
+    if words[: len(previous)] == previous:
+        return len(previous)  # the cue grew by a word or two
+    first = words[0]
+    start = max(1, len(previous) - len(words))
+    for i in range(start, len(previous)):
+        if previous[i] == first and previous[i:] == words[: len(previous) - i]:
+            n = len(previous) - i
+            return n if n >= MIN_OVERLAP_WORDS or n == len(words) else 0
+    return 0
+
+
+def _raw_cues(vtt_text: str | Iterable[str] | None) -> Iterator[tuple[str, str, str]]:
+    """(start, end, payload) per cue: one regex scan over a string, or line by line over a stream."""
+    if vtt_text is None:
+        return iter(())
+    if isinstance(vtt_text, str):
+        if "\r" in vtt_text:
+            vtt_text = vtt_text.replace("\r\n", "\n")
+        return map(re.Match.groups, _CUE.finditer(vtt_text))
+    return _stream_cues(vtt_text)
+
+
+def _stream_cues(lines: Iterable[str]) -> Iterator[tuple[str, str, str]]:
+    start = end = None
+    text: list[str] = []
     for line in lines:
-        line = line.strip()
-        if not line or line.startswith("WEBVTT") or "-->" in line or line.isdigit():
+        line = line.rstrip("\r\n")
+        if "-->" in line:
+            if start is not None and text:
+                yield start, end, " ".join(text)
+            start, _, rest = line.partition("-->")
+            start, rest, text = start.strip(), rest.split(None, 1), []
+            end = rest[0] if rest else start
+        elif not line:
+            if start is not None and text:
+                yield start, end, " ".join(text)
+            start, text = None, []
+        elif start is not None:
+            # Auto-captions open each cue with a whitespace-only line; it does not end the cue.
+            text.append(line)
+    if start is not None and text:
+        yield start, end, " ".join(text)
+
+
+def _new_text(cues: Iterable[tuple[str, str, str]], auto_captions: bool) -> Iterator[tuple[str, str, str]]:
+    """(start, end, words this cue adds) for every cue that adds any; only auto-captions are collapsed."""
+    previous: list[str] = []
+    for start, end, raw in cues:
+        if "<" in raw:
+            raw = _TAG.sub("", raw)
+        if "&" in raw:
+            raw = html.unescape(raw)
+        words = raw.split()
+        if not words:
             continue
-        line = re.sub(r"<[^>]+>", "", line)
-        line = re.sub(r"&amp;", "&", line)
-        line = re.sub(r"&#39;", "'", line)
-        if line and line not in seen:
-            seen.add(line)
-            result.append(line)
-    return " ".join(result)
+        new = words[_overlap(previous, words):] if auto_captions and previous else words
+        previous = words
+        if new:
+            yield start, end, " ".join(new)
+
+
+def iter_segments(vtt_text: str | Iterable[str] | None, auto_captions: bool = False) -> Iterator[dict]:
+    """
+    Yield {"start", "end", "text"} (seconds, seconds, new words) for every cue that adds text.
+    Accepts the whole file as a string or any iterable of lines (e.g. a streamed HTTP response).
+    `auto_captions` collapses the rolling overlap between adjacent cues (YouTube automatic captions).
+    """
+    for start, end, text in _new_text(_raw_cues(vtt_text), auto_captions):
+        yield {"start": round(_seconds(start), 3), "end": round(_seconds(end), 3), "text": text}
+
+
+def parse_vtt(vtt_text: str | Iterable[str] | None, auto_captions: bool = False) -> tuple[str, list[dict]]:
+    """Plain text and its timestamped segments from a single pass."""
+    segments = list(iter_segments(vtt_text, auto_captions))
+    return " ".join(s["text"] for s in segments), segments
+
+
+def clean_vtt(vtt_text: str | Iterable[str] | None, auto_captions: bool = False) -> str:
+    """
+    Strip VTT timestamps, cues, and tags; return single-line plain text.
+    Accepts the whole file as a string or any iterable of lines (e.g. a streamed HTTP response).
+    `auto_captions` collapses the rolling overlap between adjacent cues (YouTube automatic captions).
+    """
+    return " ".join(text for _, _, text in _new_text(_raw_cues(vtt_text), auto_captions))